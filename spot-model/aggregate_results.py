@@ -0,0 +1,747 @@
+# aggregate_results.py
+
+'''
+This module streams the simulation results of each availability zone
+folder in chunks and summarizes their costs, times, and interrupts
+per availability zone, bid ratio, number of datasets, and number of
+nodes into one merged table, holding only a bounded quantile sketch
+per group in memory; the sketches of each result are saved next to
+it, so later summaries over any grouping of zones and bids only merge
+sketches
+
+Usage:
+    python aggregate_results.py -s <sim_dir> -o <out_csv>
+                                [-m <cost_model>] [-t <static_csvs>]
+                                [-n <num_cores>] [-k <chunk_size>]
+                                [-g <group_by>] [-z <av_zones>]
+                                [-b <bid_ratios>] [-q <quantiles>]
+                                [-d <dist_csv>]
+'''
+
+# Pick out the summary metrics of a chunk of results
+def result_metrics(stat_df, sim_df=None, cost_model='ebs'):
+    '''
+    Function to pick out the group and summary metric columns of a
+    chunk of simulation results, joining EBS stats with their
+    simulation rows by index
+
+    Parameters
+    ----------
+    stat_df : pandas.DataFrame
+        the stats rows, from <info>_stats.csv (EBS model, times in
+        minutes) or <info>_s3-stats.csv (S3 model, times in seconds)
+    sim_df : pandas.DataFrame (optional), default=None
+        the matching <info>_sim.csv rows; required for EBS stats
+    cost_model : string (optional), default='ebs'
+        the cost model of the stats, 'ebs' or 's3'
+
+    Returns
+    -------
+    metric_df : pandas.DataFrame
+        the av_zone, bid_ratio, num_datasets, and num_nodes group
+        columns and the instance_cost, num_interr, pernode_cost,
+        run_time, total_cost, total_time, and wait_time metric columns,
+        with times in seconds
+    '''
+
+    # Relative imports
+    import utils
+
+    # Init variables
+    group_cols = ['av_zone', 'bid_ratio', 'num_datasets', 'num_nodes']
+    metric_cols = {'instance_cost' : 'instance_cost',
+                   'num_interrupts' : 'num_interr',
+                   'per_node_cost' : 'pernode_cost',
+                   'run_time' : 'run_time',
+                   'total_cost' : 'total_cost',
+                   'total_time' : 'total_time',
+                   'wait_time' : 'wait_time'}
+    # EBS stats columns, and the simulation columns they are joined with
+    ebs_cols = {'Total cost' : 'total_cost', 'Instance cost' : 'instance_cost',
+                'Total time' : 'total_time', 'Run time' : 'run_time',
+                'Wait time' : 'wait_time'}
+    sim_cols = group_cols + ['num_interrupts', 'per_node_cost']
+
+    # Join the EBS stats with their simulation rows
+    if cost_model == 'ebs':
+        if not stat_df.index.equals(sim_df.index):
+            err_msg = 'Rows of the stats and simulation results do not '\
+                      'line up'
+            raise Exception(err_msg)
+        stat_df = stat_df[list(ebs_cols)].rename(columns=ebs_cols)
+        for time_col in ['total_time', 'run_time', 'wait_time']:
+            stat_df[time_col] = stat_df[time_col]*60.0
+        # Results from before cluster sizes were configurable used up
+        # to 20 nodes
+        if 'num_nodes' not in sim_df.columns:
+            sim_df = sim_df.copy()
+            sim_df['num_nodes'] = \
+                utils.cluster_size(sim_df['num_datasets'].values,
+                                   sim_df['jobs_per_node'].values)
+        stat_df = stat_df.join(sim_df[sim_cols])
+    elif cost_model != 's3':
+        err_msg = 'cost_model argument does not support %s' % cost_model
+        raise Exception(err_msg)
+
+    # Select and rename the metrics
+    metric_df = stat_df[group_cols + list(metric_cols)].\
+                rename(columns=metric_cols)
+
+    # Return the metrics
+    return metric_df
+
+
+# Add a chunk of results to the group sketches
+def sketch_metrics(metric_df, groups=None, compression=200):
+    '''
+    Function to add each row of a chunk of summary metrics to the
+    quantile sketches of its zone, bid ratio, number of datasets, and
+    number of nodes
+
+    Parameters
+    ----------
+    metric_df : pandas.DataFrame
+        the group and metric columns, as returned by result_metrics
+    groups : dictionary (optional), default=None
+        the group sketches to add to; a new dictionary if None
+    compression : integer (optional), default=200
+        the accuracy of any new quantile sketches
+
+    Returns
+    -------
+    groups : dictionary
+        maps each (av_zone, bid_ratio, num_datasets, num_nodes) key to a
+        dictionary of the quantile sketch of each summary metric
+    '''
+
+    # Relative imports
+    from quantile_sketch import new_sketch, add_values
+
+    # Init variables
+    group_cols = ['av_zone', 'bid_ratio', 'num_datasets', 'num_nodes']
+    metrics = [col for col in metric_df.columns if col not in group_cols]
+    if groups is None:
+        groups = {}
+
+    # Add each group's rows to its sketches
+    for key, group_df in metric_df.groupby(group_cols):
+        key = (str(key[0]), float(key[1]), int(key[2]), int(key[3]))
+        if key not in groups:
+            groups[key] = dict((metric, new_sketch(compression)) \
+                               for metric in metrics)
+        for metric in metrics:
+            add_values(groups[key][metric], group_df[metric].values)
+
+    # Return the group sketches
+    return groups
+
+
+# Get the sketch filepath of a stats csv
+def sketch_path(stat_csv):
+    '''
+    Function to get the filepath of the quantile sketches persisted
+    next to a stats csv
+
+    Parameters
+    ----------
+    stat_csv : string
+        filepath to the <info>_stats.csv or <info>_s3-stats.csv
+
+    Returns
+    -------
+    sketch_npz : string
+        filepath to the <info>_sketch.npz or <info>_s3-sketch.npz
+    '''
+
+    # Return the sketch path
+    return stat_csv[:-len('stats.csv')] + 'sketch.npz'
+
+
+# Persist the sketches of a simulation's results
+def save_result_sketches(stat_csv, stat_df, sim_df=None, cost_model='ebs'):
+    '''
+    Function to sketch a simulation's results and save the sketches
+    next to its stats csv, so summaries can later be merged from the
+    sketches instead of rescanning the results
+
+    Parameters
+    ----------
+    stat_csv : string
+        filepath the stats were written to
+    stat_df : pandas.DataFrame
+        the stats dataframe
+    sim_df : pandas.DataFrame (optional), default=None
+        the simulation dataframe; required for EBS stats
+    cost_model : string (optional), default='ebs'
+        the cost model of the stats, 'ebs' or 's3'
+
+    Returns
+    -------
+    groups : dictionary
+        the sketches saved, as returned by sketch_metrics
+    '''
+
+    # Relative imports
+    from quantile_sketch import save_sketches
+
+    # Sketch and save the results
+    groups = sketch_metrics(result_metrics(stat_df, sim_df, cost_model))
+    save_sketches(sketch_path(stat_csv), groups)
+
+    # Return the sketches
+    return groups
+
+
+# Stream a stats csv into group sketches
+def sketch_stats_csv(stat_csv, cost_model='ebs', chunk_size=100000,
+                     compression=200):
+    '''
+    Function to stream a stats csv, joined with its simulation csv by
+    index, into quantile sketches of each summary metric per zone, bid
+    ratio, number of datasets, and number of nodes; the sketches are
+    saved next to the csv so it doesn't need to be read again
+
+    Parameters
+    ----------
+    stat_csv : string
+        filepath to the <info>_stats.csv or <info>_s3-stats.csv
+    cost_model : string (optional), default='ebs'
+        the cost model of the stats, 'ebs' or 's3'
+    chunk_size : integer (optional), default=100000
+        the number of csv rows to read at a time
+    compression : integer (optional), default=200
+        the accuracy of the quantile sketches
+
+    Returns
+    -------
+    groups : dictionary
+        the sketches, as returned by sketch_metrics
+    '''
+
+    # Import packages
+    import pandas as pd
+
+    # Relative imports
+    from quantile_sketch import save_sketches
+
+    # Init variables
+    groups = {}
+    # Parse floats exactly, to match the sketches of the written results
+    stat_reader = pd.read_csv(stat_csv, index_col=0, chunksize=chunk_size,
+                              float_precision='round_trip')
+    sim_chunk = None
+    if cost_model == 'ebs':
+        sim_csv = stat_csv[:-len('_stats.csv')] + '_sim.csv'
+        sim_reader = pd.read_csv(sim_csv, index_col=0, chunksize=chunk_size,
+                                 float_precision='round_trip')
+
+    # Join each stats chunk with its simulation rows and sketch it
+    for stat_chunk in stat_reader:
+        if cost_model == 'ebs':
+            sim_chunk = next(sim_reader)
+        sketch_metrics(result_metrics(stat_chunk, sim_chunk, cost_model),
+                       groups, compression)
+
+    # Save the sketches
+    save_sketches(sketch_path(stat_csv), groups)
+
+    # Return the sketches
+    return groups
+
+
+# Summarize the results of one availability zone folder
+def aggregate_zone(zone_dir, cost_model='ebs', chunk_size=100000,
+                   compression=200):
+    '''
+    Function to merge the quantile sketches of every result in an
+    availability zone folder; results without up-to-date sketches
+    (including ones saved before the number of nodes was a group
+    field) are streamed from their csvs and their sketches saved
+
+    Parameters
+    ----------
+    zone_dir : string
+        file path to the availability zone folder of results
+    cost_model : string (optional), default='ebs'
+        the cost model of the stats to summarize, 'ebs' for the
+        <info>_stats.csv of spot_price_model.main (times in minutes)
+        or 's3' for the <info>_s3-stats.csv of
+        market_outcomes.recost (times in seconds)
+    chunk_size : integer (optional), default=100000
+        the number of csv rows to read at a time
+    compression : integer (optional), default=200
+        the accuracy of the quantile sketches
+
+    Returns
+    -------
+    groups : dictionary
+        maps each (av_zone, bid_ratio, num_datasets, num_nodes) key to a
+        dictionary of the quantile sketch of each summary metric, with
+        times in seconds
+    '''
+
+    # Import packages
+    import glob
+    import os
+
+    # Relative imports
+    from quantile_sketch import load_sketches
+
+    # Init variables
+    if cost_model == 'ebs':
+        stats_suffix = '_stats.csv'
+    elif cost_model == 's3':
+        stats_suffix = '_s3-stats.csv'
+    else:
+        err_msg = 'cost_model argument does not support %s' % cost_model
+        raise Exception(err_msg)
+    stat_csvs = sorted(glob.glob(os.path.join(zone_dir, '*' + stats_suffix)))
+    groups_list = []
+    num_streamed = 0
+
+    # Load each result's sketches, or stream its csvs
+    for stat_csv in stat_csvs:
+        sketch_npz = sketch_path(stat_csv)
+        groups = None
+        if os.path.exists(sketch_npz) and \
+           os.path.getmtime(sketch_npz) >= os.path.getmtime(stat_csv):
+            groups = load_sketches(sketch_npz)
+        if groups is not None:
+            groups_list.append(groups)
+        else:
+            groups_list.append(sketch_stats_csv(stat_csv, cost_model,
+                                                chunk_size, compression))
+            num_streamed += 1
+    print 'Aggregated %d results in %s, %d streamed from csv' % \
+          (len(stat_csvs), zone_dir, num_streamed)
+
+    # Merge the sketches of the folder
+    groups = merge_groups(groups_list)
+
+    # Return the group sketches
+    return groups
+
+
+# Merge group sketches from several folders
+def merge_groups(groups_list):
+    '''
+    Function to merge the group sketches of several aggregate_zone
+    calls, combining any groups they share
+
+    Parameters
+    ----------
+    groups_list : list
+        the group dictionaries to merge, as returned by aggregate_zone
+
+    Returns
+    -------
+    merged : dictionary
+        maps each group key to a dictionary of its merged sketches
+    '''
+
+    # Relative imports
+    from quantile_sketch import merge_sketches
+
+    # Init variables
+    merged = {}
+
+    # Merge the sketches of each group
+    for groups in groups_list:
+        for key, sketches in groups.items():
+            if key not in merged:
+                merged[key] = dict(sketches)
+                continue
+            for metric in sketches:
+                merged[key][metric] = merge_sketches([merged[key][metric],
+                                                      sketches[metric]])
+
+    # Return the merged groups
+    return merged
+
+
+# Regroup sketches by any of the group fields
+def regroup(groups, group_by, av_zones=None, bid_ratios=None):
+    '''
+    Function to merge the sketches of each zone, bid ratio, number of
+    datasets, and number of nodes into coarser groups, e.g. per region
+    and bid ratio
+
+    Parameters
+    ----------
+    groups : dictionary
+        maps each (av_zone, bid_ratio, num_datasets, num_nodes) key to a
+        dictionary of the quantile sketch of each metric
+    group_by : list
+        the fields to group by, any of 'av_zone', 'region',
+        'bid_ratio', 'num_datasets', and 'num_nodes'; an empty list
+        merges every group into one
+    av_zones : list (optional), default=None
+        only merge the groups of these availability zones; all zones
+        if None
+    bid_ratios : list (optional), default=None
+        only merge the groups of these bid ratios; all bid ratios if
+        None
+
+    Returns
+    -------
+    regrouped : dictionary
+        maps each tuple of group_by values to a dictionary of the
+        merged quantile sketch of each metric
+    '''
+
+    # Init variables
+    group_fields = ['av_zone', 'region', 'bid_ratio', 'num_datasets',
+                    'num_nodes']
+    for field in group_by:
+        if field not in group_fields:
+            err_msg = 'group_by argument does not support %s' % field
+            raise Exception(err_msg)
+    regrouped_list = {}
+
+    # Collect the groups under their new keys
+    for key, sketches in groups.items():
+        av_zone, bid_ratio, num_datasets, num_nodes = key
+        if av_zones is not None and av_zone not in av_zones:
+            continue
+        if bid_ratios is not None and bid_ratio not in bid_ratios:
+            continue
+        field_dict = {'av_zone' : av_zone, 'region' : av_zone[:-1],
+                      'bid_ratio' : bid_ratio, 'num_datasets' : num_datasets,
+                      'num_nodes' : num_nodes}
+        new_key = tuple(field_dict[field] for field in group_by)
+        regrouped_list.setdefault(new_key, []).append({new_key : sketches})
+
+    # Merge the sketches of each new group
+    regrouped = {}
+    for new_key, groups_list in regrouped_list.items():
+        regrouped.update(merge_groups(groups_list))
+
+    # Return the new groups
+    return regrouped
+
+
+# Summarize group sketches into a table
+def summarize_groups(groups, quantiles=None, group_by=None):
+    '''
+    Function to summarize the sketches of each group into a table of
+    means, medians, and quantiles, like the csvs/*_merged.csv tables
+
+    Parameters
+    ----------
+    groups : dictionary
+        maps each group key to a dictionary of the quantile sketch of
+        each metric
+    quantiles : list (optional), default=None
+        the quantiles to report beside the median, between 0 and 1;
+        defaults to [0.05, 0.25, 0.75, 0.95]
+    group_by : list (optional), default=None
+        the fields of the group keys, if the groups were merged with
+        regroup; defaults to ['av_zone', 'bid_ratio', 'num_datasets',
+        'num_nodes']
+
+    Returns
+    -------
+    summary_df : pandas.DataFrame
+        one row per group, with mean_<metric>, median_<metric>, and
+        p<percent>_<metric> columns, and the number of simulations
+    '''
+
+    # Import packages
+    import pandas as pd
+
+    # Relative imports
+    from quantile_sketch import sketch_mean, sketch_quantiles
+
+    # Init variables
+    if quantiles is None:
+        quantiles = [0.05, 0.25, 0.75, 0.95]
+    if group_by is None:
+        group_by = ['av_zone', 'bid_ratio', 'num_datasets', 'num_nodes']
+    rows = []
+
+    # Summarize each group
+    for key in sorted(groups):
+        sketches = groups[key]
+        row_dict = dict(zip(group_by, key))
+        for metric, sketch in sketches.items():
+            estimates = sketch_quantiles(sketch, [0.5] + list(quantiles))
+            row_dict['mean_%s' % metric] = sketch_mean(sketch)
+            row_dict['median_%s' % metric] = estimates[0]
+            for quant, estimate in zip(quantiles, estimates[1:]):
+                row_dict['p%g_%s' % (100*quant, metric)] = estimate
+            row_dict['num_sims'] = int(sketch['count'])
+        rows.append(row_dict)
+
+    # Order the columns like the merged tables
+    metrics = sorted(groups[sorted(groups)[0]]) if groups else []
+    summary_cols = list(group_by) + \
+                   ['mean_%s' % metric for metric in metrics] + \
+                   ['median_%s' % metric for metric in metrics] + \
+                   ['p%g_%s' % (100*quant, metric) \
+                    for quant in quantiles for metric in metrics] + \
+                   ['num_sims']
+    summary_df = pd.DataFrame(rows, columns=summary_cols)
+
+    # Return the summary table
+    return summary_df
+
+
+# Tabulate the distributions of group sketches
+def distribution_table(groups, group_by=None, num_points=101):
+    '''
+    Function to tabulate the quantile function of each metric of each
+    group, in long format, for distribution (e.g. violin) plots
+
+    Parameters
+    ----------
+    groups : dictionary
+        maps each group key to a dictionary of the quantile sketch of
+        each metric
+    group_by : list (optional), default=None
+        the fields of the group keys, if the groups were merged with
+        regroup; defaults to ['av_zone', 'bid_ratio', 'num_datasets',
+        'num_nodes']
+    num_points : integer (optional), default=101
+        the number of evenly spaced quantiles, from 0 to 1, to tabulate
+
+    Returns
+    -------
+    dist_df : pandas.DataFrame
+        one row per group, metric, and quantile, with the group_by,
+        metric, quantile, and value columns
+    '''
+
+    # Import packages
+    import numpy as np
+    import pandas as pd
+
+    # Relative imports
+    from quantile_sketch import sketch_quantiles
+
+    # Init variables
+    if group_by is None:
+        group_by = ['av_zone', 'bid_ratio', 'num_datasets', 'num_nodes']
+    quantiles = np.linspace(0, 1, num_points)
+    dist_dfs = []
+
+    # Tabulate each group's metrics
+    for key in sorted(groups):
+        for metric in sorted(groups[key]):
+            metric_df = pd.DataFrame({'quantile' : quantiles,
+                                      'value' : sketch_quantiles(
+                                          groups[key][metric], quantiles)})
+            metric_df['metric'] = metric
+            for field, field_val in zip(group_by, key):
+                metric_df[field] = field_val
+            dist_dfs.append(metric_df)
+
+    # Concatenate the tables
+    dist_cols = list(group_by) + ['metric', 'quantile', 'value']
+    if dist_dfs:
+        dist_df = pd.concat(dist_dfs, ignore_index=True)[dist_cols]
+    else:
+        dist_df = pd.DataFrame(columns=dist_cols)
+
+    # Return the distribution table
+    return dist_df
+
+
+# Merge the static model into the summary table
+def merge_static(summary_df, static_csvs):
+    '''
+    Function to add the static model results of run_static_model.py to
+    the summary table, with the static-to-spot time and cost ratios
+
+    Parameters
+    ----------
+    summary_df : pandas.DataFrame
+        the summary table, as returned by summarize_groups
+    static_csvs : list
+        filepaths to the on_demand.csv static model results
+
+    Returns
+    -------
+    merged_df : pandas.DataFrame
+        the summary table with the static model columns, time_ratio,
+        and cost_ratio
+    '''
+
+    # Import packages
+    import pandas as pd
+
+    # Load the static model results
+    static_df = pd.concat([pd.read_csv(static_csv, index_col=0) \
+                           for static_csv in static_csvs],
+                          ignore_index=True)
+
+    # Join them by availability zone and number of datasets, and by
+    # number of nodes if both tables have it
+    merge_cols = ['av_zone', 'num_datasets']
+    if 'num_nodes' in summary_df.columns and 'num_nodes' in static_df.columns:
+        merge_cols.append('num_nodes')
+    merged_df = pd.merge(summary_df, static_df, how='left', on=merge_cols)
+    merged_df['time_ratio'] = merged_df['static_total_time'] / \
+                              merged_df['mean_total_time']
+    merged_df['cost_ratio'] = merged_df['static_total_cost'] / \
+                              merged_df['mean_total_cost']
+
+    # Return the merged table
+    return merged_df
+
+
+# Main routine
+def main(sim_dir, out_csv, cost_model='ebs', static_csvs=None, num_cores=1,
+         chunk_size=100000, group_by=None, av_zones=None, bid_ratios=None,
+         quantiles=None, dist_csv=None):
+    '''
+    Function to summarize every availability zone folder of a
+    simulation results directory, in parallel, into one merged csv;
+    the persisted sketches of each result are merged, so only results
+    without them are read from csv
+
+    Parameters
+    ----------
+    sim_dir : string
+        base directory of the availability zone folders of results
+    out_csv : string
+        filepath to write the merged summary csv to
+    cost_model : string (optional), default='ebs'
+        the cost model of the stats to summarize, 'ebs' or 's3'
+    static_csvs : list (optional), default=None
+        filepaths to on_demand.csv static model results to merge in;
+        group_by must include av_zone and num_datasets
+    num_cores : integer (optional), default=1
+        the number of availability zones to summarize at once
+    chunk_size : integer (optional), default=100000
+        the number of csv rows to read at a time
+    group_by : list (optional), default=None
+        the fields to summarize by, any of 'av_zone', 'region',
+        'bid_ratio', 'num_datasets', and 'num_nodes'; defaults to
+        ['av_zone', 'bid_ratio', 'num_datasets', 'num_nodes']
+    av_zones : list (optional), default=None
+        only summarize these availability zones; all zones if None
+    bid_ratios : list (optional), default=None
+        only summarize these bid ratios; all bid ratios if None
+    quantiles : list (optional), default=None
+        the quantiles to report beside the median, between 0 and 1;
+        defaults to [0.05, 0.25, 0.75, 0.95]
+    dist_csv : string (optional), default=None
+        filepath to write the quantile function of every group and
+        metric to, for distribution plots
+
+    Returns
+    -------
+    summary_df : pandas.DataFrame
+        the merged summary table
+    '''
+
+    # Import packages
+    import glob
+    import os
+
+    # Relative imports
+    import utils
+
+    # Init variables
+    if group_by is None:
+        group_by = ['av_zone', 'bid_ratio', 'num_datasets', 'num_nodes']
+    if static_csvs and not ('av_zone' in group_by and \
+                            'num_datasets' in group_by):
+        err_msg = 'Static model results can only be merged when grouping '\
+                  'by av_zone and num_datasets'
+        raise Exception(err_msg)
+    zone_dirs = sorted(zone_dir for zone_dir in \
+                       glob.glob(os.path.join(sim_dir, '*')) \
+                       if os.path.isdir(zone_dir) and \
+                       (av_zones is None or \
+                        os.path.basename(zone_dir) in av_zones))
+    task_list = [(aggregate_zone, (zone_dir, cost_model, chunk_size)) \
+                 for zone_dir in zone_dirs]
+
+    # Sketch each availability zone in parallel
+    groups_list, errors = utils.run_in_parallel(task_list, num_cores)
+    if errors:
+        err_msg = 'Failed to aggregate %s' % \
+                  ', '.join(zone_dirs[task_idx] for task_idx in sorted(errors))
+        raise Exception(err_msg)
+
+    # Summarize the groups
+    groups = regroup(merge_groups(groups_list), group_by, av_zones,
+                     bid_ratios)
+    summary_df = summarize_groups(groups, quantiles, group_by)
+    if static_csvs:
+        summary_df = merge_static(summary_df, static_csvs)
+
+    # Write to disk
+    summary_df.to_csv(out_csv)
+    print 'Wrote %d group summaries to %s' % (len(summary_df), out_csv)
+    if dist_csv:
+        distribution_table(groups, group_by).to_csv(dist_csv)
+        print 'Wrote group distributions to %s' % dist_csv
+
+    # Return the summary table
+    return summary_df
+
+
+# Make executable
+if __name__ == '__main__':
+
+    # Import packages
+    import argparse
+
+    # Init argparser
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    # Required arguments
+    parser.add_argument('-s', '--sim_dir', nargs=1, required=True,
+                        type=str, help='Base directory of the availability '\
+                                       'zone folders of results')
+    parser.add_argument('-o', '--out_csv', nargs=1, required=True,
+                        type=str, help='Filepath to write the merged '\
+                                       'summary csv to')
+
+    # Optional arguments
+    parser.add_argument('-m', '--cost_model', nargs=1, required=False,
+                        type=str, help='Cost model of the stats, '\
+                                       '\'ebs\' (default) or \'s3\'')
+    parser.add_argument('-t', '--static_csvs', nargs='+', required=False,
+                        type=str, help='Static model on_demand.csv files '\
+                                       'to merge into the summary')
+    parser.add_argument('-n', '--num_cores', nargs=1, required=False,
+                        type=int, help='Number of cores to run on')
+    parser.add_argument('-k', '--chunk_size', nargs=1, required=False,
+                        type=int, help='Number of csv rows to read at a time')
+    parser.add_argument('-g', '--group_by', nargs='+', required=False,
+                        type=str, help='Fields to summarize by, any of '\
+                                       'av_zone, region, bid_ratio, '\
+                                       'num_datasets, and num_nodes')
+    parser.add_argument('-z', '--av_zones', nargs='+', required=False,
+                        type=str, help='Availability zones to summarize')
+    parser.add_argument('-b', '--bid_ratios', nargs='+', required=False,
+                        type=float, help='Bid ratios to summarize')
+    parser.add_argument('-q', '--quantiles', nargs='+', required=False,
+                        type=float, help='Quantiles to report beside the '\
+                                       'median, between 0 and 1')
+    parser.add_argument('-d', '--dist_csv', nargs=1, required=False,
+                        type=str, help='Filepath to write each group\'s '\
+                                       'quantile functions to')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    # Init variables
+    sim_dir = args.sim_dir[0]
+    out_csv = args.out_csv[0]
+    cost_model = args.cost_model[0] if args.cost_model else 'ebs'
+    static_csvs = args.static_csvs
+    num_cores = args.num_cores[0] if args.num_cores else 1
+    chunk_size = args.chunk_size[0] if args.chunk_size else 100000
+    group_by = args.group_by
+    av_zones = args.av_zones
+    bid_ratios = args.bid_ratios
+    quantiles = args.quantiles
+    dist_csv = args.dist_csv[0] if args.dist_csv else None
+
+    # Summarize the results
+    main(sim_dir, out_csv, cost_model, static_csvs, num_cores, chunk_size,
+         group_by, av_zones, bid_ratios, quantiles, dist_csv)
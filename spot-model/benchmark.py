@@ -0,0 +1,528 @@
+# benchmark.py
+
+'''
+This module benchmarks the hot paths of the spot model offline, over
+synthetic spot histories of a chosen length, price change rate, and
+volatility: loading the history csv, simulating the market, costing
+instance uptime, the EBS and S3 cost models, and a full
+spot_price_model.main run. Each case runs in its own process so its
+peak memory is its own, and the wall time, items per second, and peak
+RSS of every case and history length are written to a csv; two result
+csvs can then be compared to flag regressions
+
+Usage:
+    python benchmark.py -o <out_csv> [-d <days> ...] [-f <changes_hr>]
+                        [-v <volatility>] [-r <repeat>] [-s <seed>]
+                        [-c <case> ...]
+    python benchmark.py -b <base_csv> -n <new_csv> [-t <threshold>]
+'''
+
+# Default job submission parameters of the main benchmark
+MAIN_PARAMS = {'proc_time' : 45, 'num_jobs' : 600, 'jobs_per' : 3,
+               'in_gb' : 0.05, 'out_gb' : 2.3, 'out_gb_dl' : 2.3,
+               'up_rate' : 18, 'down_rate' : 20, 'bid_ratio' : 1.0,
+               'instance_type' : 'c3.8xlarge', 'av_zone' : 'us-east-1a',
+               'product' : 'Linux/UNIX'}
+
+# Benchmark case names, in the order they run
+CASES = ['spothistory_from_dataframe', 'simulate_market',
+         'simulate_market_batch', 'calculate_cost', 'calculate_cost_batch',
+         'calc_ebs_model_costs', 'calc_ebs_model_costs_batch',
+         'calc_s3_model_costs', 'calc_s3_model_costs_batch', 'main']
+
+
+# Generate a synthetic spot history
+def synthetic_spot_history(days, changes_per_hour=2.0, volatility=0.1,
+                           base_price=0.3, rand_state=None,
+                           params=MAIN_PARAMS):
+    '''
+    Function to generate a synthetic spot price history with price
+    changes arriving at random and log prices wandering around a base
+    price, in the dataframe format of record_spot_price.py
+
+    Parameters
+    ----------
+    days : float
+        the length of the history (in days)
+    changes_per_hour : float (optional), default=2.0
+        the average number of price changes per hour
+    volatility : float (optional), default=0.1
+        the standard deviation of the log price step at each change
+    base_price : float (optional), default=0.3
+        the price the log price reverts to, in dollars per hour
+    rand_state : numpy.random.RandomState (optional), default=None
+        the random number generator to use; a new one if None
+    params : dictionary (optional), default=MAIN_PARAMS
+        the instance_type, product, and av_zone to label the history
+        with
+
+    Returns
+    -------
+    history_df : pandas.DataFrame
+        the synthetic history, one row per price change
+    '''
+
+    # Import packages
+    import numpy as np
+    import pandas as pd
+
+    # Init variables
+    if rand_state is None:
+        rand_state = np.random.RandomState()
+    start_time = 1420070400 # 2015-01-01 UTC
+    num_changes = max(int(days*24*changes_per_hour), 2)
+
+    # Draw the change times as a Poisson process
+    gaps = rand_state.exponential(3600.0/changes_per_hour, num_changes)
+    change_times = start_time + np.floor(np.cumsum(gaps)).astype('int64')
+    change_times = np.unique(change_times)
+
+    # Wander the log price, pulled back towards the base price
+    steps = volatility*rand_state.standard_normal(len(change_times))
+    log_prices = np.zeros(len(change_times))
+    for change_idx in range(1, len(change_times)):
+        log_prices[change_idx] = 0.95*log_prices[change_idx-1] + \
+                                 steps[change_idx]
+    prices = np.maximum(np.round(base_price*np.exp(log_prices), 4), 0.0001)
+
+    # Format like the recorded histories
+    timestamps = pd.to_datetime(change_times, unit='s')\
+                   .strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    history_df = pd.DataFrame({'Instance type' : params['instance_type'],
+                               'Product' : params['product'],
+                               'Region' : params['av_zone'][:-1],
+                               'Availability zone' : params['av_zone'],
+                               'Spot price' : prices,
+                               'Timestamp' : timestamps},
+                              columns=['Instance type', 'Product', 'Region',
+                                       'Availability zone', 'Spot price',
+                                       'Timestamp'])
+
+    # Return the history
+    return history_df
+
+
+# Time one benchmark case
+def time_case(case, csv_file, repeat=3, max_scalar=1000,
+              params=MAIN_PARAMS):
+    '''
+    Function to time a benchmark case over a synthetic history csv,
+    taking the best of several runs
+
+    Parameters
+    ----------
+    case : string
+        the benchmark case, one of CASES
+    csv_file : string
+        the filepath to the synthetic history csv
+    repeat : integer (optional), default=3
+        the number of times to run the case
+    max_scalar : integer (optional), default=1000
+        the most start times to run the one-at-a-time functions over;
+        only start times whose submission completes are used
+    params : dictionary (optional), default=MAIN_PARAMS
+        the job submission parameters, as in spot_price_model.main
+
+    Returns
+    -------
+    timing : dictionary
+        the 'num_items' run each time and their 'unit', and the best
+        and mean wall times ('wall_time', 'mean_time') in seconds
+    '''
+
+    # Import packages
+    import numpy as np
+    import os
+    import shutil
+    import tempfile
+    import time
+
+    # Relative imports
+    from pricing_catalog import load_catalog
+    import spot_price_model as spm
+    import utils
+
+    # Init variables
+    history = spm.load_spot_history(params['instance_type'],
+                                    params['product'], params['av_zone'],
+                                    csv_file)
+    spot_history, change_times, change_prices = history
+    proc_time = params['proc_time']*60.0
+    num_nodes = utils.cluster_size(params['num_jobs'], params['jobs_per'])
+    num_iter = np.ceil(params['num_jobs']/float(params['jobs_per']*num_nodes))
+    bid_price = params['bid_ratio']*\
+                spm.history_time_average(change_times, change_prices)
+    sim_starts = np.arange(change_times[0], change_times[-1]+1, 20*60)
+    catalog = load_catalog()
+
+    # Get market outcomes for the cost model cases
+    run_times, wait_times, pernode_costs, interrupts, first_iter_times, \
+    completed = spm.simulate_market_batch(sim_starts, change_times,
+                                          change_prices, proc_time,
+                                          num_iter, bid_price)
+    few_idx = np.flatnonzero(completed)[:max_scalar]
+    few_starts = sim_starts[few_idx]
+    ebs_args = (params['num_jobs'], num_nodes, params['jobs_per'],
+                params['av_zone'], params['in_gb'], params['out_gb'],
+                params['out_gb_dl'], params['up_rate'], params['down_rate'])
+    s3_args = ebs_args[:6] + ebs_args[7:]
+
+    # Set up the call of each case and what it runs over
+    if case == 'spothistory_from_dataframe':
+        num_items, unit = len(change_times), 'rows'
+        run_case = lambda: spm.spothistory_from_dataframe(
+            csv_file, params['instance_type'], params['product'],
+            params['av_zone'])
+    elif case == 'simulate_market':
+        num_items, unit = len(few_starts), 'sims'
+        run_case = lambda: [spm.simulate_market(start_time, change_times,
+                                                change_prices, proc_time,
+                                                num_iter, bid_price) \
+                            for start_time in few_starts]
+    elif case == 'simulate_market_batch':
+        num_items, unit = len(sim_starts), 'sims'
+        run_case = lambda: spm.simulate_market_batch(sim_starts,
+                                                     change_times,
+                                                     change_prices,
+                                                     proc_time, num_iter,
+                                                     bid_price)
+    elif case == 'calculate_cost':
+        num_items, unit = len(few_starts), 'costs'
+        run_case = lambda: [spm.calculate_cost(start_time, num_iter*proc_time,
+                                               change_times, change_prices) \
+                            for start_time in few_starts]
+    elif case == 'calculate_cost_batch':
+        num_items, unit = len(sim_starts), 'costs'
+        uptimes = np.repeat(num_iter*proc_time, len(sim_starts))
+        run_case = lambda: spm.calculate_cost_batch(sim_starts, uptimes,
+                                                    change_times,
+                                                    change_prices)
+    elif case in ['calc_ebs_model_costs', 'calc_s3_model_costs']:
+        cost_func = getattr(spm, case)
+        cost_args = ebs_args if 'ebs' in case else s3_args
+        num_items, unit = len(few_idx), 'costs'
+        run_case = lambda: [cost_func(run_times[sim_idx],
+                                      wait_times[sim_idx],
+                                      pernode_costs[sim_idx],
+                                      first_iter_times[sim_idx], *cost_args,
+                                      price_time=sim_starts[sim_idx],
+                                      catalog=catalog) \
+                            for sim_idx in few_idx]
+    elif case in ['calc_ebs_model_costs_batch', 'calc_s3_model_costs_batch']:
+        cost_func = getattr(spm, case)
+        cost_args = ebs_args if 'ebs' in case else s3_args
+        num_items, unit = len(sim_starts), 'costs'
+        run_case = lambda: cost_func(run_times, wait_times, pernode_costs,
+                                     first_iter_times, *cost_args,
+                                     price_time=sim_starts, catalog=catalog)
+    elif case == 'main':
+        num_items, unit = len(sim_starts), 'sims'
+        def run_case():
+            sim_dir = tempfile.mkdtemp()
+            try:
+                spm.main(sim_dir, params['proc_time'], params['num_jobs'],
+                         params['jobs_per'], params['in_gb'],
+                         params['out_gb'], params['out_gb_dl'],
+                         params['up_rate'], params['down_rate'],
+                         params['bid_ratio'], params['instance_type'],
+                         params['av_zone'], params['product'], csv_file,
+                         history=history)
+            finally:
+                shutil.rmtree(sim_dir)
+    else:
+        err_msg = 'Unknown benchmark case %s, choose from %s' % \
+                  (case, ', '.join(CASES))
+        raise Exception(err_msg)
+
+    # Time each run
+    elapsed = []
+    for repeat_idx in range(repeat):
+        start = time.time()
+        run_case()
+        elapsed.append(time.time() - start)
+
+    # Populate the timing
+    timing = {'num_items' : num_items, 'unit' : unit,
+              'wall_time' : min(elapsed),
+              'mean_time' : sum(elapsed)/len(elapsed)}
+
+    # Return the timing
+    return timing
+
+
+# Run a benchmark case in a fresh process
+def _case_worker(case, csv_file, repeat, max_scalar, result_queue):
+    '''
+    Function to time a benchmark case with its output silenced and send
+    back its timing and the peak RSS of its process
+
+    Parameters
+    ----------
+    case : string
+        the benchmark case, one of CASES
+    csv_file : string
+        the filepath to the synthetic history csv
+    repeat : integer
+        the number of times to run the case
+    max_scalar : integer
+        the most start times to run the one-at-a-time functions over
+    result_queue : multiprocessing.Queue
+        the queue to put the (timing, traceback) tuple on
+
+    Returns
+    -------
+    None
+        the timing, with its 'peak_rss_mb', is put on the queue
+    '''
+
+    # Import packages
+    import os
+    import resource
+    import traceback
+
+    # Silence the case's printing and logging
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    # Time the case and send back the result
+    try:
+        timing = time_case(case, csv_file, repeat, max_scalar)
+        timing['peak_rss_mb'] = \
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0
+        result_queue.put((timing, None))
+    except Exception:
+        result_queue.put((None, traceback.format_exc()))
+
+
+# Run the benchmark suite
+def run_benchmarks(out_csv, days_list=None, changes_per_hour=2.0,
+                   volatility=0.1, repeat=3, seed=None, cases=None,
+                   max_scalar=1000):
+    '''
+    Function to run every benchmark case over synthetic histories of
+    each length and write the results to a csv
+
+    Parameters
+    ----------
+    out_csv : string
+        filepath to write the results csv to
+    days_list : list (optional), default=None
+        the synthetic history lengths (in days); defaults to
+        [30, 90, 180]
+    changes_per_hour : float (optional), default=2.0
+        the average number of price changes per hour
+    volatility : float (optional), default=0.1
+        the standard deviation of the log price step at each change
+    repeat : integer (optional), default=3
+        the number of times to run each case; the best is reported
+    seed : integer (optional), default=None
+        the random seed of the synthetic histories
+    cases : list (optional), default=None
+        the benchmark cases to run; every one in CASES if None
+    max_scalar : integer (optional), default=1000
+        the most start times to run the one-at-a-time functions over
+
+    Returns
+    -------
+    result_df : pandas.DataFrame
+        the results, one row per case and history length
+    '''
+
+    # Import packages
+    import multiprocessing
+    import numpy as np
+    import os
+    import pandas as pd
+    import platform
+    import Queue
+    import shutil
+    import tempfile
+
+    # Init variables
+    if days_list is None:
+        days_list = [30, 90, 180]
+    if cases is None:
+        cases = CASES
+    rand_state = np.random.RandomState(seed)
+    tmp_dir = tempfile.mkdtemp()
+    rows = []
+
+    # Benchmark each history length
+    try:
+        for days in days_list:
+            csv_file = os.path.join(tmp_dir, 'spot_history_%gd.csv' % days)
+            synthetic_spot_history(days, changes_per_hour, volatility,
+                                   rand_state=rand_state).to_csv(csv_file)
+            for case in cases:
+                result_queue = multiprocessing.Queue()
+                proc = multiprocessing.Process(target=_case_worker,
+                                               args=(case, csv_file, repeat,
+                                                     max_scalar,
+                                                     result_queue))
+                proc.start()
+                # Wait for the result, unless the process died without
+                # sending one, e.g. killed for running out of memory
+                result = None
+                while result is None:
+                    proc_alive = proc.is_alive()
+                    try:
+                        result = result_queue.get(timeout=1.0)
+                    except Queue.Empty:
+                        if not proc_alive:
+                            break
+                proc.join()
+                if result is None:
+                    err_msg = 'Benchmark %s failed over %g days: its ' \
+                              'process exited with code %s' % \
+                              (case, days, proc.exitcode)
+                    raise Exception(err_msg)
+                timing, trace = result
+                if trace is not None:
+                    err_msg = 'Benchmark %s failed over %g days:\n%s' % \
+                              (case, days, trace)
+                    raise Exception(err_msg)
+                timing.update({'case' : case, 'days' : days,
+                               'changes_per_hour' : changes_per_hour,
+                               'volatility' : volatility,
+                               'items_per_sec' : \
+                                   timing['num_items']/timing['wall_time'] \
+                                   if timing['wall_time'] > 0 else np.inf})
+                rows.append(timing)
+                print '%-28s %5g days: %8.4fs, %10.1f %s/s, %7.1f MB' % \
+                      (case, days, timing['wall_time'],
+                       timing['items_per_sec'], timing['unit'],
+                       timing['peak_rss_mb'])
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    # Tabulate the results with the machine they ran on
+    result_df = pd.DataFrame(rows, columns=['case', 'days',
+                                            'changes_per_hour', 'volatility',
+                                            'num_items', 'unit', 'wall_time',
+                                            'mean_time', 'items_per_sec',
+                                            'peak_rss_mb'])
+    result_df['python'] = platform.python_version()
+    result_df['numpy'] = np.__version__
+    result_df['pandas'] = pd.__version__
+    result_df['host'] = platform.node()
+
+    # Write to disk
+    result_df.to_csv(out_csv)
+    print 'Wrote %d benchmark results to %s' % (len(result_df), out_csv)
+
+    # Return the results
+    return result_df
+
+
+# Compare two benchmark result files
+def compare_results(base_csv, new_csv, threshold=0.1):
+    '''
+    Function to compare benchmark results against a baseline and flag
+    the cases that got slower or used more memory
+
+    Parameters
+    ----------
+    base_csv : string
+        filepath to the baseline results csv
+    new_csv : string
+        filepath to the new results csv
+    threshold : float (optional), default=0.1
+        the fraction a case's wall time or peak RSS may grow by before
+        it is flagged
+
+    Returns
+    -------
+    compare_df : pandas.DataFrame
+        the wall time and peak RSS of the cases in both files, their
+        new-to-base ratios, and a 'regression' flag
+    '''
+
+    # Import packages
+    import pandas as pd
+
+    # Load and match up the results
+    base_df = pd.read_csv(base_csv, index_col=0)
+    new_df = pd.read_csv(new_csv, index_col=0)
+    compare_df = pd.merge(base_df[['case', 'days', 'wall_time',
+                                   'peak_rss_mb']],
+                          new_df[['case', 'days', 'wall_time',
+                                  'peak_rss_mb']],
+                          on=['case', 'days'], suffixes=('_base', '_new'))
+
+    # Flag the regressions
+    compare_df['time_ratio'] = compare_df['wall_time_new'] / \
+                               compare_df['wall_time_base']
+    compare_df['rss_ratio'] = compare_df['peak_rss_mb_new'] / \
+                              compare_df['peak_rss_mb_base']
+    compare_df['regression'] = (compare_df['time_ratio'] > 1+threshold) | \
+                               (compare_df['rss_ratio'] > 1+threshold)
+
+    # Return the comparison
+    return compare_df
+
+
+# Make executable
+if __name__ == '__main__':
+
+    # Import packages
+    import argparse
+    import sys
+
+    # Init argparser
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    # Run arguments
+    parser.add_argument('-o', '--out_csv', nargs=1, required=False,
+                        type=str, help='Filepath to write the results to')
+    parser.add_argument('-d', '--days', nargs='+', required=False,
+                        type=float, help='Synthetic history lengths in '\
+                                         'days; default is 30 90 180')
+    parser.add_argument('-f', '--changes_per_hour', nargs=1, required=False,
+                        type=float, help='Average price changes per hour; '\
+                                         'default is 2')
+    parser.add_argument('-v', '--volatility', nargs=1, required=False,
+                        type=float, help='Log price step standard '\
+                                         'deviation; default is 0.1')
+    parser.add_argument('-r', '--repeat', nargs=1, required=False,
+                        type=int, help='Runs of each case; default is 3')
+    parser.add_argument('-s', '--seed', nargs=1, required=False, type=int,
+                        help='Random seed of the synthetic histories')
+    parser.add_argument('-c', '--cases', nargs='+', required=False,
+                        type=str, help='Cases to run; default is all of '\
+                                       '%s' % ', '.join(CASES))
+
+    # Compare arguments
+    parser.add_argument('-b', '--base_csv', nargs=1, required=False,
+                        type=str, help='Baseline results csv to compare to')
+    parser.add_argument('-n', '--new_csv', nargs=1, required=False,
+                        type=str, help='New results csv to compare')
+    parser.add_argument('-t', '--threshold', nargs=1, required=False,
+                        type=float, help='Fraction a case may slow down '\
+                                         'by; default is 0.1')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    # Compare two result files, exiting non-zero on a regression
+    if args.base_csv and args.new_csv:
+        threshold = args.threshold[0] if args.threshold else 0.1
+        compare_df = compare_results(args.base_csv[0], args.new_csv[0],
+                                     threshold)
+        print compare_df.to_string()
+        if compare_df['regression'].any():
+            print '%d regressions found' % compare_df['regression'].sum()
+            sys.exit(1)
+        print 'No regressions found'
+
+    # Or run the benchmarks
+    elif args.out_csv:
+        run_benchmarks(args.out_csv[0], args.days,
+                       args.changes_per_hour[0] \
+                       if args.changes_per_hour else 2.0,
+                       args.volatility[0] if args.volatility else 0.1,
+                       args.repeat[0] if args.repeat else 3,
+                       args.seed[0] if args.seed else None, args.cases)
+    else:
+        parser.error('Either an output csv or two result csvs to compare '\
+                     'is required')
@@ -0,0 +1,378 @@
+# bid_optimizer.py
+
+'''
+This module searches for the bid ratio that minimizes the expected
+total cost of a job submission in an availability zone, optionally
+subject to a ceiling on its mean or quantile total time. The market
+outcomes only change when the bid crosses one of the prices in the
+spot history, so only bids just over those prices are searched: the
+lowest bid completing the submissions within the time ceiling is found
+by bisection, since interrupts and waiting only fall as the bid rises,
+and the cheapest bid above it by a bracketing search
+
+Usage:
+    python bid_optimizer.py -c <config_file> -s <spot_csv> -z <av_zone>
+                            -j <num_jobs> [-t <time_ceiling>]
+                            [-q <time_quantile>] [-m <min_completed>]
+                            [-o <out_csv>]
+'''
+
+# Get the bids where the market outcomes change
+def candidate_bids(change_prices):
+    '''
+    Function to get the bids that give distinct market outcomes over a
+    spot history; a bid in between two neighboring history prices acts
+    just like a bid just over the lower one
+
+    Parameters
+    ----------
+    change_prices : numpy.ndarray
+        the spot price set at each price change point
+
+    Returns
+    -------
+    bids : numpy.ndarray
+        the smallest bid over each distinct history price, ascending;
+        the last bid is never interrupted
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Prices at or above the bid interrupt, so bid just over each one
+    bids = np.nextafter(np.unique(change_prices), np.inf)
+
+    # Return the bids
+    return bids
+
+
+# Get the expected cost and time of a bid
+def evaluate_bid(bid_price, sim_starts, change_times, change_prices,
+                 proc_time, num_iter, cost_args, time_quantile=None,
+                 billing='hourly'):
+    '''
+    Function to simulate a job submission at one bid from every start
+    time and summarize its cost and total time
+
+    Parameters
+    ----------
+    bid_price : float
+        the spot bid price in dollars per hour
+    sim_starts : numpy.ndarray
+        the simulation start times (epoch seconds)
+    change_times : numpy.ndarray
+        sorted epoch-second timestamps where the spot price changed
+    change_prices : numpy.ndarray
+        the spot price set at each of the change_times
+    proc_time : float
+        the time to process one job iteration (in seconds)
+    num_iter : integer
+        the number of job iterations or waves to run
+    cost_args : tuple
+        the (num_jobs, num_nodes, jobs_per, av_zone, in_gb, out_gb,
+        out_gb_dl, up_rate, down_rate) arguments of the EBS cost model
+    time_quantile : float (optional), default=None
+        the quantile of total time to report, between 0 and 1; the mean
+        total time is reported if None
+    billing : string (optional), default='hourly'
+        the instance billing mode, 'hourly' or 'second'
+
+    Returns
+    -------
+    bid_stats : dictionary
+        the 'bid_price', the 'mean_cost' of the completed submissions,
+        the 'time_stat' (seconds) counting incomplete submissions as
+        never finishing, the 'completed_ratio', and the
+        'mean_interrupts' of the completed submissions
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Relative imports
+    from spot_price_model import calc_ebs_model_costs_batch, \
+                                 simulate_market_batch
+
+    # Simulate the market and cost the completed submissions
+    run_times, wait_times, pernode_costs, interrupts, first_iter_times, \
+    completed = simulate_market_batch(sim_starts, change_times,
+                                      change_prices, proc_time, num_iter,
+                                      bid_price, billing=billing)
+    total_costs, instance_costs, stor_costs, xfer_costs, \
+    total_times, run_times, wait_times, \
+    xfer_up_times, xfer_down_times = \
+        calc_ebs_model_costs_batch(run_times[completed],
+                                   wait_times[completed],
+                                   pernode_costs[completed],
+                                   first_iter_times[completed], *cost_args,
+                                   price_time=sim_starts[completed])
+
+    # Incomplete submissions never finish
+    all_times = np.repeat(np.inf, len(sim_starts))
+    all_times[completed] = total_times
+    if time_quantile is None:
+        time_stat = np.mean(all_times)
+    else:
+        time_stat = np.percentile(all_times, 100*time_quantile,
+                                  interpolation='higher')
+
+    # Populate the stats
+    num_done = completed.sum()
+    bid_stats = {'bid_price' : bid_price,
+                 'mean_cost' : total_costs.mean() if num_done else np.inf,
+                 'time_stat' : time_stat,
+                 'completed_ratio' : num_done/float(len(sim_starts)),
+                 'mean_interrupts' : interrupts[completed].mean() \
+                                     if num_done else np.nan}
+
+    # Return the stats
+    return bid_stats
+
+
+# Search for the cheapest bid
+def optimize_bid(proc_time, num_jobs, jobs_per, in_gb, out_gb, out_gb_dl,
+                 up_rate, down_rate, instance_type, av_zone, product,
+                 csv_file=None, time_ceiling=None, time_quantile=None,
+                 min_completed=1.0, billing='hourly', history=None,
+                 max_nodes=20, num_nodes=None):
+    '''
+    Function to find the bid ratio with the lowest expected total cost
+    that completes enough submissions within a total time ceiling; the
+    bisection relies on completion and time only improving as the bid
+    rises, while the cost search brackets the cheapest of bids spaced
+    by doubling steps and so may miss a narrow dip elsewhere
+
+    Parameters
+    ----------
+    proc_time : float
+        the number of minutes a single job of interest takes to run
+    num_jobs : integer
+        total number of jobs to run to complete job submission
+    jobs_per : integer
+        the number of jobs to run per node
+    in_gb : float
+        the total amount of input data for a particular job (in GB)
+    out_gb : float
+        the total amount of output data from a particular job (in GB)
+    out_gb_dl : float
+        the total amount of output data to download from EC2 (in GB)
+    up_rate : float
+        the average upload rate to transfer data to EC2 (in Mb/s)
+    down_rate : float
+        the average download rate to transfer data from EC2 (in Mb/s)
+    instance_type : string
+        type of instance to run the jobs on and to get spot history for
+    av_zone : string
+        the AWS EC2 availability zone (sub-region) to get spot history
+        from
+    product : string
+        the type of operating system product to get spot history for
+    csv_file : string (optional), default=None
+        the filepath to a csv dataframe or history store to get spot
+        history from
+    time_ceiling : float (optional), default=None
+        the most hours the mean (or time_quantile) total time may take;
+        no ceiling if None
+    time_quantile : float (optional), default=None
+        the quantile of total time the ceiling applies to, between 0
+        and 1; the mean total time if None
+    min_completed : float (optional), default=1.0
+        the least ratio of the start times whose submission must
+        complete in the history; the mean cost only covers completed
+        submissions, so low bids where only the lucky ones finish
+        would otherwise look cheap
+    billing : string (optional), default='hourly'
+        the instance billing mode, 'hourly' or 'second'
+    history : tuple (optional), default=None
+        the (spot_history, change_times, change_prices) tuple returned
+        by spot_price_model.load_spot_history; loaded here if None
+    max_nodes : integer (optional), default=20
+        the most nodes that may run at once in the availability zone
+    num_nodes : integer (optional), default=None
+        the number of nodes to run on; as many as are needed, up to
+        max_nodes, if None
+
+    Returns
+    -------
+    best : dictionary or None
+        the stats of the cheapest bid meeting the ceiling, as from
+        evaluate_bid, with its 'bid_ratio'; None if no bid meets it
+    eval_df : pandas.DataFrame
+        the stats of every bid evaluated, by bid price
+    '''
+
+    # Import packages
+    import numpy as np
+    import pandas as pd
+
+    # Relative imports
+    from spot_price_model import history_time_average, load_spot_history, \
+                                 simulate_market_batch
+    import utils
+
+    # Init variables
+    proc_time *= 60.0
+    num_nodes = utils.cluster_size(num_jobs, jobs_per, max_nodes, num_nodes)
+    num_iter = np.ceil(num_jobs/float((jobs_per*num_nodes)))
+    cost_args = (num_jobs, num_nodes, jobs_per, av_zone, in_gb, out_gb,
+                 out_gb_dl, up_rate, down_rate)
+    if history is None:
+        history = load_spot_history(instance_type, product, av_zone, csv_file)
+    spot_history, change_times, change_prices = history
+    spot_history_avg = history_time_average(change_times, change_prices)
+    sim_starts = np.arange(change_times[0], change_times[-1]+1, 20*60)
+    bids = candidate_bids(change_prices)
+    evals = {}
+
+    # Evaluate a candidate bid once
+    def evaluate(bid_idx):
+        if bid_idx not in evals:
+            evals[bid_idx] = evaluate_bid(bids[bid_idx], sim_starts,
+                                          change_times, change_prices,
+                                          proc_time, num_iter, cost_args,
+                                          time_quantile, billing)
+        return evals[bid_idx]
+
+    # Only use start times that finish in the history at the top bid
+    top_idx = len(bids) - 1
+    top_completed = simulate_market_batch(sim_starts, change_times,
+                                          change_prices, proc_time, num_iter,
+                                          bids[top_idx], billing=billing)[-1]
+    if not top_completed.any():
+        err_msg = 'No start time in the spot history leaves enough time ' \
+                  'to run %d jobs' % num_jobs
+        raise Exception(err_msg)
+    sim_starts = sim_starts[top_completed]
+
+    # Check a bid completes enough submissions within the time ceiling
+    def feasible(bid_idx):
+        bid_stats = evaluate(bid_idx)
+        return bid_stats['completed_ratio'] >= min_completed and \
+               (time_ceiling is None or \
+                bid_stats['time_stat'] <= time_ceiling*3600.0)
+
+    # Bisect for the lowest feasible bid; higher bids only do better
+    best = None
+    lo_idx = 0
+    hi_idx = top_idx
+    if not feasible(top_idx):
+        print 'No bid completes %.1f%% of the submissions within the ' \
+              'time ceiling' % (100*min_completed)
+        lo_idx = None
+    while lo_idx is not None and lo_idx < hi_idx:
+        mid_idx = (lo_idx + hi_idx)//2
+        if feasible(mid_idx):
+            hi_idx = mid_idx
+        else:
+            lo_idx = mid_idx + 1
+
+    # Bracket the cheapest bid above it with doubling steps
+    if lo_idx is not None:
+        probes = [lo_idx]
+        step = 1
+        while probes[-1] < top_idx:
+            probes.append(min(lo_idx + step, top_idx))
+            step *= 2
+        best_probe = min(range(len(probes)),
+                         key=lambda idx: evaluate(probes[idx])['mean_cost'])
+        lo_idx = probes[max(best_probe - 1, 0)]
+        hi_idx = probes[min(best_probe + 1, len(probes) - 1)]
+
+        # Narrow the bracket with a ternary search
+        while hi_idx - lo_idx > 2:
+            mid_lo = lo_idx + (hi_idx - lo_idx)//3
+            mid_hi = hi_idx - (hi_idx - lo_idx)//3
+            if evaluate(mid_lo)['mean_cost'] <= evaluate(mid_hi)['mean_cost']:
+                hi_idx = mid_hi
+            else:
+                lo_idx = mid_lo
+        for bid_idx in range(lo_idx, hi_idx+1):
+            evaluate(bid_idx)
+
+        # Take the cheapest feasible bid of all those evaluated, since a
+        # probe outside the final bracket may have found a lower dip
+        best_idx = min([bid_idx for bid_idx in sorted(evals) \
+                        if feasible(bid_idx)],
+                       key=lambda bid_idx: evaluate(bid_idx)['mean_cost'])
+        best = dict(evaluate(best_idx))
+        best['bid_ratio'] = best['bid_price']/spot_history_avg
+
+    # Tabulate the evaluations
+    eval_df = pd.DataFrame([evals[bid_idx] for bid_idx in sorted(evals)],
+                           columns=['bid_price', 'mean_cost', 'time_stat',
+                                    'completed_ratio', 'mean_interrupts'])
+    eval_df['bid_ratio'] = eval_df['bid_price']/spot_history_avg
+    print 'Evaluated %d of %d distinct bids for %d jobs in %s' % \
+          (len(evals), len(bids), num_jobs, av_zone)
+    if best is not None:
+        print 'Best bid ratio %.3f (bid $%.4f): mean cost $%.3f, ' \
+              'time %.3f hours' % (best['bid_ratio'], best['bid_price'],
+                                   best['mean_cost'],
+                                   best['time_stat']/3600.0)
+
+    # Return the best bid and the evaluations
+    return best, eval_df
+
+
+# Make executable
+if __name__ == '__main__':
+
+    # Import packages
+    import argparse
+    import yaml
+
+    # Import local modules
+    import utils
+
+    # Init argparser
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    # Required arguments
+    parser.add_argument('-c', '--config_file', nargs=1, required=True,
+                        type=str, help='Path to AWS sim configuration file')
+    parser.add_argument('-s', '--spot_csv', nargs=1, required=True,
+                        type=str, help='Path to spot history csv or store')
+    parser.add_argument('-z', '--av_zone', nargs=1, required=True,
+                        type=str, help='Availability zone to bid in')
+    parser.add_argument('-j', '--num_jobs', nargs=1, required=True,
+                        type=int, help='Number of datasets to run')
+
+    # Optional arguments
+    parser.add_argument('-t', '--time_ceiling', nargs=1, required=False,
+                        type=float, help='Most hours the total time may take')
+    parser.add_argument('-q', '--time_quantile', nargs=1, required=False,
+                        type=float, help='Quantile of total time the '\
+                                         'ceiling applies to; default is '\
+                                         'the mean')
+    parser.add_argument('-m', '--min_completed', nargs=1, required=False,
+                        type=float, help='Least ratio of start times that '\
+                                         'must complete; default is 1.0')
+    parser.add_argument('-o', '--out_csv', nargs=1, required=False,
+                        type=str, help='Filepath to write the evaluated '\
+                                       'bids to')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    # Init variables
+    config_dict = yaml.load(open(args.config_file[0], 'r'))
+    time_ceiling = args.time_ceiling[0] if args.time_ceiling else None
+    time_quantile = args.time_quantile[0] if args.time_quantile else None
+    min_completed = args.min_completed[0] if args.min_completed else 1.0
+    max_nodes = utils.zone_max_nodes(config_dict, args.av_zone[0])
+    num_nodes = utils.zone_num_nodes(config_dict, args.av_zone[0])
+
+    # Search for the best bid
+    best, eval_df = optimize_bid(config_dict['proc_time'], args.num_jobs[0],
+                                 config_dict['jobs_per'],
+                                 config_dict['in_gb'], config_dict['out_gb'],
+                                 config_dict['out_gb_dl'],
+                                 config_dict['up_rate'],
+                                 config_dict['down_rate'],
+                                 config_dict['instance_type'],
+                                 args.av_zone[0], config_dict['product'],
+                                 args.spot_csv[0], time_ceiling,
+                                 time_quantile, min_completed,
+                                 max_nodes=max_nodes, num_nodes=num_nodes)
+    if args.out_csv:
+        eval_df.to_csv(args.out_csv[0])
@@ -0,0 +1,451 @@
+# break_even.py
+
+'''
+This module finds where running on spot instances stops paying off
+against on-demand ones: for each availability zone and number of
+datasets, the range of bid ratios where the expected spot cost, plus
+an optional charge per hour of extra time, is below the on-demand
+cost of the static model; and, for each bid ratio, the number of
+datasets where the cheaper option switches. The spot market outcomes
+only change at the history prices, so both are found by bisecting for
+the sign change of the spot margin over on-demand instead of
+simulating every bid or size
+
+Usage:
+    python break_even.py -c <config_file> -s <spot_csv> -t <price_table>
+                         -o <out_prefix> [-v <time_value>]
+                         [-n <num_cores>] [-z <av_zone> ...]
+'''
+
+# Get the spot margin over on-demand of one configuration
+def spot_margin(bid_price, sim_starts, change_times, change_prices,
+                cfg_dict, av_zone, num_jobs, od_cost, od_time,
+                time_value=0.0, billing='hourly', catalog=None):
+    '''
+    Function to simulate a job submission on spot instances from every
+    start time and get its expected cost over the on-demand cost, both
+    with the S3 model
+
+    Parameters
+    ----------
+    bid_price : float
+        the spot bid price in dollars per hour
+    sim_starts : numpy.ndarray
+        the simulation start times (epoch seconds)
+    change_times : numpy.ndarray
+        sorted epoch-second timestamps where the spot price changed
+    change_prices : numpy.ndarray
+        the spot price set at each of the change_times
+    cfg_dict : dictionary
+        the sim config, for its proc_time, jobs_per, cluster size, and
+        transfer parameters
+    av_zone : string
+        the availability zone to run in
+    num_jobs : integer
+        the number of datasets to run
+    od_cost : float
+        the on-demand total cost of the submission
+    od_time : float
+        the on-demand total time of the submission (in seconds)
+    time_value : float (optional), default=0.0
+        the dollars charged per hour the spot submission takes beyond
+        the on-demand one (or credited per hour it saves)
+    billing : string (optional), default='hourly'
+        the instance billing mode, 'hourly' or 'second'
+    catalog : dictionary (optional), default=None
+        the pricing catalog from pricing_catalog.load_catalog; the
+        default catalog is loaded if not specified
+
+    Returns
+    -------
+    margin : float
+        the mean spot cost plus time charge, minus the on-demand cost;
+        negative where spot wins and infinite if a submission does not
+        complete within the history
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Relative imports
+    from spot_price_model import calc_s3_model_costs_batch, \
+                                 simulate_market_batch
+    import utils
+
+    # Init variables
+    proc_time = cfg_dict['proc_time']*60.0
+    jobs_per = cfg_dict['jobs_per']
+    num_nodes = utils.cluster_size(num_jobs, jobs_per,
+                                   utils.zone_max_nodes(cfg_dict, av_zone),
+                                   utils.zone_num_nodes(cfg_dict, av_zone))
+    num_iter = np.ceil(num_jobs/float((jobs_per*num_nodes)))
+
+    # Simulate the market
+    run_times, wait_times, pernode_costs, interrupts, first_iter_times, \
+    completed = simulate_market_batch(sim_starts, change_times,
+                                      change_prices, proc_time, num_iter,
+                                      bid_price, billing=billing)
+    if not completed.all():
+        return np.inf
+
+    # Cost the submissions with the s3 model
+    total_costs, instance_costs, ebs_storage_costs, s3_costs, \
+    s3_storage_costs, s3_req_costs, s3_xfer_costs, \
+    total_times, run_times, wait_times, \
+    xfer_up_times, s3_upl_times, s3_download_times = \
+        calc_s3_model_costs_batch(run_times, wait_times, pernode_costs,
+                                  first_iter_times, num_jobs, num_nodes,
+                                  jobs_per, av_zone, cfg_dict['in_gb'],
+                                  cfg_dict['out_gb'], cfg_dict['up_rate'],
+                                  cfg_dict['down_rate'],
+                                  price_time=sim_starts, catalog=catalog)
+
+    # Charge for the extra time
+    margin = total_costs.mean() - od_cost + \
+             time_value*(total_times.mean() - od_time)/3600.0
+
+    # Return the margin
+    return margin
+
+
+# Find the break-even curves of one availability zone
+def zone_break_even(av_zone, cfg_dict, price_hr, csv_file=None,
+                    time_value=0.0, billing='hourly', pricing_yml=None):
+    '''
+    Function to find, for one availability zone, the bid ratios and
+    numbers of datasets where spot and on-demand instances cost the
+    same; the bisections assume the cheaper option only switches once
+    on each side of the cheapest bid and once over the sizes
+
+    Parameters
+    ----------
+    av_zone : string
+        the availability zone to run in
+    cfg_dict : dictionary
+        the sim config; its num_jobs and bid_ratio lists are searched
+    price_hr : float
+        the per-hour on-demand price of a node in the zone
+    csv_file : string (optional), default=None
+        the filepath to a csv dataframe or history store to get spot
+        history from
+    time_value : float (optional), default=0.0
+        the dollars charged per hour the spot submission takes beyond
+        the on-demand one
+    billing : string (optional), default='hourly'
+        the instance billing mode, 'hourly' or 'second'
+    pricing_yml : string (optional), default=None
+        filepath to the AWS pricing file; defaults to aws_prices.yml
+
+    Returns
+    -------
+    bid_df : pandas.DataFrame
+        per number of datasets, the on-demand cost and time, the
+        cheapest bid ratio and its margin, and the low and high
+        break-even bid ratios that spot wins between (NaN if spot never
+        wins, 0 or inf if it wins down or up to any bid); the margin is
+        NaN if no start time in the history completes at that size
+    size_df : pandas.DataFrame
+        per bid ratio, the smallest number of datasets where the
+        cheaper option differs from the one at the smallest size, and
+        which option wins below it (NaN if it never switches); sizes
+        no start time completes at are skipped, and the row is marked
+        'undetermined' if the switch falls next to one of them
+    '''
+
+    # Import packages
+    import numpy as np
+    import pandas as pd
+
+    # Relative imports
+    from bid_optimizer import candidate_bids
+    from pricing_catalog import load_catalog
+    from run_static_model import static_costs
+    from spot_price_model import history_time_average, load_spot_history, \
+                                 simulate_market_batch
+    import utils
+
+    # Init variables
+    catalog = load_catalog(pricing_yml)
+    max_nodes = utils.zone_max_nodes(cfg_dict, av_zone)
+    num_nodes_cfg = utils.zone_num_nodes(cfg_dict, av_zone)
+    spot_history, change_times, change_prices = \
+        load_spot_history(cfg_dict['instance_type'], cfg_dict['product'],
+                          av_zone, csv_file)
+    spot_history_avg = history_time_average(change_times, change_prices)
+    all_starts = np.arange(change_times[0], change_times[-1]+1, 20*60)
+    prices = np.unique(change_prices)
+    bids = candidate_bids(change_prices)
+    top_idx = len(bids) - 1
+    num_jobs_list = sorted(cfg_dict['num_jobs'])
+    bid_ratios = cfg_dict['bid_ratio']
+    if not isinstance(bid_ratios, list):
+        bid_ratios = [bid_ratios]
+    sizes = {}
+    margins = {}
+    num_sims = [0]
+
+    # Get the on-demand results and start times of a size once
+    def size_info(num_jobs):
+        if num_jobs not in sizes:
+            od_df = static_costs(cfg_dict, av_zone, price_hr, num_jobs,
+                                 cfg_dict['jobs_per'], max_nodes, catalog,
+                                 num_nodes_cfg)
+            jobs_per = cfg_dict['jobs_per']
+            num_nodes = utils.cluster_size(num_jobs, jobs_per, max_nodes,
+                                           num_nodes_cfg)
+            num_iter = np.ceil(num_jobs/float((jobs_per*num_nodes)))
+            completed = simulate_market_batch(all_starts, change_times,
+                                              change_prices,
+                                              cfg_dict['proc_time']*60.0,
+                                              num_iter, bids[top_idx],
+                                              billing=billing)[-1]
+            sizes[num_jobs] = (od_df['static_total_cost'].iloc[0],
+                               od_df['static_total_time'].iloc[0],
+                               all_starts[completed])
+        return sizes[num_jobs]
+
+    # Get the margin of a bid and size once
+    def margin(bid_price, num_jobs):
+        if (bid_price, num_jobs) not in margins:
+            od_cost, od_time, sim_starts = size_info(num_jobs)
+            if len(sim_starts) == 0:
+                margins[(bid_price, num_jobs)] = np.nan
+            else:
+                margins[(bid_price, num_jobs)] = \
+                    spot_margin(bid_price, sim_starts, change_times,
+                                change_prices, cfg_dict, av_zone, num_jobs,
+                                od_cost, od_time, time_value, billing,
+                                catalog)
+                num_sims[0] += 1
+        return margins[(bid_price, num_jobs)]
+
+    # Bisect between a losing and a winning candidate bid
+    def bisect_bids(lose_idx, win_idx, num_jobs):
+        while abs(win_idx - lose_idx) > 1:
+            mid_idx = (lose_idx + win_idx)//2
+            if margin(bids[mid_idx], num_jobs) < 0:
+                win_idx = mid_idx
+            else:
+                lose_idx = mid_idx
+        return max(lose_idx, win_idx)
+
+    # Find the break-even bids of each size
+    bid_rows = []
+    for num_jobs in num_jobs_list:
+        od_cost, od_time, sim_starts = size_info(num_jobs)
+        row_dict = {'av_zone' : av_zone, 'num_datasets' : num_jobs,
+                    'price_hr' : price_hr, 'od_total_cost' : od_cost,
+                    'od_total_time' : od_time}
+
+        # Probe the bids with doubling steps for the cheapest one
+        probes = [0]
+        step = 1
+        while probes[-1] < top_idx:
+            probes.append(min(step, top_idx))
+            step *= 2
+        win_idx = min(probes, key=lambda idx: margin(bids[idx], num_jobs))
+        row_dict['best_bid_ratio'] = bids[win_idx]/spot_history_avg
+        row_dict['best_margin'] = margin(bids[win_idx], num_jobs)
+
+        # Bids between the history prices act like the one below, so
+        # the break-even bids are history prices
+        if not row_dict['best_margin'] < 0:
+            low_bid = high_bid = np.nan
+        else:
+            if margin(bids[0], num_jobs) < 0:
+                low_bid = 0.0
+            else:
+                low_bid = prices[bisect_bids(0, win_idx, num_jobs)]
+            if margin(bids[top_idx], num_jobs) < 0:
+                high_bid = np.inf
+            else:
+                high_bid = prices[bisect_bids(top_idx, win_idx, num_jobs)]
+        row_dict['low_bid_ratio'] = low_bid/spot_history_avg
+        row_dict['high_bid_ratio'] = high_bid/spot_history_avg
+        bid_rows.append(row_dict)
+
+    # Find the break-even size of each bid ratio
+    size_rows = []
+    for bid_ratio in bid_ratios:
+        bid_price = bid_ratio*spot_history_avg
+        row_dict = {'av_zone' : av_zone, 'bid_ratio' : bid_ratio,
+                    'break_even_datasets' : np.nan, 'wins_below' : None}
+        first_win = None
+        lo_jobs = None
+
+        # Bracket the switch with the config sizes, then bisect it; a
+        # size no start time completes at has no margin (NaN), so it
+        # can't tell which option wins
+        for hi_jobs in num_jobs_list:
+            hi_margin = margin(bid_price, hi_jobs)
+            if np.isnan(hi_margin):
+                continue
+            if first_win is None:
+                first_win = hi_margin < 0
+            elif (hi_margin < 0) != first_win:
+                undetermined = False
+                while hi_jobs - lo_jobs > 1:
+                    mid_jobs = (lo_jobs + hi_jobs)//2
+                    mid_margin = margin(bid_price, mid_jobs)
+                    if np.isnan(mid_margin):
+                        undetermined = True
+                        break
+                    if (mid_margin < 0) == first_win:
+                        lo_jobs = mid_jobs
+                    else:
+                        hi_jobs = mid_jobs
+                if undetermined:
+                    row_dict['wins_below'] = 'undetermined'
+                else:
+                    row_dict['break_even_datasets'] = hi_jobs
+                    row_dict['wins_below'] = \
+                        'spot' if first_win else 'on_demand'
+                break
+            lo_jobs = hi_jobs
+        size_rows.append(row_dict)
+
+    # Tabulate the curves
+    bid_df = pd.DataFrame(bid_rows,
+                          columns=['av_zone', 'num_datasets', 'price_hr',
+                                   'od_total_cost', 'od_total_time',
+                                   'best_bid_ratio', 'best_margin',
+                                   'low_bid_ratio', 'high_bid_ratio'])
+    size_df = pd.DataFrame(size_rows,
+                           columns=['av_zone', 'bid_ratio',
+                                    'break_even_datasets', 'wins_below'])
+    print 'Found break-even curves for %s with %d simulations' % \
+          (av_zone, num_sims[0])
+
+    # Return the curves
+    return bid_df, size_df
+
+
+# Main routine
+def main(config, spot_csv, price_table, out_prefix, time_value=0.0,
+         num_cores=1, av_zones=None, billing='hourly', pricing_yml=None):
+    '''
+    Function to find the spot vs. on-demand break-even curves of every
+    availability zone in a sim config, in parallel, and write them to
+    <out_prefix>_bid-break-even.csv and <out_prefix>_size-break-even.csv
+
+    Parameters
+    ----------
+    config : string
+        filepath to the sim config file
+    spot_csv : string
+        the filepath to a csv dataframe or history store to get spot
+        history from
+    price_table : string
+        filepath to a YAML mapping regions or availability zones to
+        the per-hour on-demand price, e.g. on_demand_c38xlarge.yml
+    out_prefix : string
+        the filepath prefix to write the curves to
+    time_value : float (optional), default=0.0
+        the dollars charged per hour the spot submission takes beyond
+        the on-demand one
+    num_cores : integer (optional), default=1
+        the number of availability zones to solve at once
+    av_zones : list (optional), default=None
+        the availability zones to solve; the config's if None
+    billing : string (optional), default='hourly'
+        the instance billing mode, 'hourly' or 'second'
+    pricing_yml : string (optional), default=None
+        filepath to the AWS pricing file; defaults to aws_prices.yml
+
+    Returns
+    -------
+    bid_df : pandas.DataFrame
+        the break-even bid ratios of every zone and size
+    size_df : pandas.DataFrame
+        the break-even sizes of every zone and bid ratio
+    '''
+
+    # Import packages
+    import pandas as pd
+    import yaml
+
+    # Relative imports
+    import utils
+
+    # Init variables
+    cfg_dict = yaml.load(open(config, 'r'))
+    price_dict = yaml.load(open(price_table, 'r'))
+    if av_zones is None:
+        av_zones = cfg_dict['av_zone']
+        if isinstance(av_zones, str):
+            av_zones = [av_zones]
+    task_list = []
+    for av_zone in av_zones:
+        price_hr = price_dict.get(av_zone, price_dict.get(av_zone[:-1]))
+        if price_hr is None:
+            err_msg = 'Price table has no price for %s' % av_zone
+            raise Exception(err_msg)
+        task_list.append((zone_break_even,
+                          (av_zone, cfg_dict, price_hr, spot_csv,
+                           time_value, billing, pricing_yml)))
+
+    # Solve each availability zone in parallel
+    results, errors = utils.run_in_parallel(task_list, num_cores)
+    if errors:
+        err_msg = 'Failed to find break-even curves for %s' % \
+                  ', '.join(av_zones[task_idx] for task_idx in sorted(errors))
+        raise Exception(err_msg)
+    bid_df = pd.concat([result[0] for result in results], ignore_index=True)
+    size_df = pd.concat([result[1] for result in results], ignore_index=True)
+
+    # Write to disk
+    bid_df.to_csv(out_prefix + '_bid-break-even.csv')
+    size_df.to_csv(out_prefix + '_size-break-even.csv')
+    print 'Wrote break-even curves of %d zones to %s_*-break-even.csv' % \
+          (len(av_zones), out_prefix)
+
+    # Return the curves
+    return bid_df, size_df
+
+
+# Make executable
+if __name__ == '__main__':
+
+    # Import packages
+    import argparse
+
+    # Init argparser
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    # Required arguments
+    parser.add_argument('-c', '--config', nargs=1, required=True,
+                        type=str, help='Filepath to the sim config file')
+    parser.add_argument('-s', '--spot_csv', nargs=1, required=True,
+                        type=str, help='Path to spot history csv or store')
+    parser.add_argument('-t', '--price_table', nargs=1, required=True,
+                        type=str, help='Filepath to a YAML of on-demand '\
+                                       'per-hour prices by region or zone')
+    parser.add_argument('-o', '--out_prefix', nargs=1, required=True,
+                        type=str, help='Filepath prefix to write the '\
+                                       'break-even curves to')
+
+    # Optional arguments
+    parser.add_argument('-v', '--time_value', nargs=1, required=False,
+                        type=float, help='Dollars charged per hour spot '\
+                                         'takes beyond on-demand; default '\
+                                         'is 0')
+    parser.add_argument('-n', '--num_cores', nargs=1, required=False,
+                        type=int, help='Number of zones to solve at once')
+    parser.add_argument('-z', '--av_zones', nargs='+', required=False,
+                        type=str, help='Only solve these availability zones')
+    parser.add_argument('-r', '--pricing_yml', nargs=1, required=False,
+                        type=str, help='Filepath to the AWS pricing file; '\
+                                       'defaults to aws_prices.yml')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    # Init variables
+    time_value = args.time_value[0] if args.time_value else 0.0
+    num_cores = args.num_cores[0] if args.num_cores else 1
+    pricing_yml = args.pricing_yml[0] if args.pricing_yml else None
+
+    # Find the break-even curves
+    main(args.config[0], args.spot_csv[0], args.price_table[0],
+         args.out_prefix[0], time_value, num_cores, args.av_zones,
+         pricing_yml=pricing_yml)
@@ -0,0 +1,377 @@
+# market_outcomes.py
+
+'''
+This module persists the spot market outcomes of the simulations
+(compute time, wait time, per-node cost, interrupts, and first
+iteration time for every start time) separately from their costs, and
+re-costs them in bulk, so changes to the storage, transfer, or master
+node prices or to the data sizes and rates don't need the market to be
+re-simulated
+
+Usage:
+    python market_outcomes.py -c <config_file> -s <sim_dir> -o <out_dir>
+                              [-m <cost_model>] [-r <pricing_yml>]
+                              [-b <billing>]
+'''
+
+# Get the filepath of a market outcome table
+def outcome_path(base_dir, instance_type, num_iter, proc_time, bid_ratio,
+                 billing='hourly'):
+    '''
+    Function to return the filepath of the market outcome table of a
+    simulation; the outcomes only depend on the number of job
+    iterations, not the number of jobs, so job sizes with the same
+    number of iterations share one table
+
+    Parameters
+    ----------
+    base_dir : string
+        the availability zone folder of the simulation results
+    instance_type : string
+        type of instance the jobs were simulated on
+    num_iter : integer
+        the number of job iterations or waves
+    proc_time : float
+        the number of seconds a job iteration takes to run
+    bid_ratio : float
+        the ratio to average spot history price the bid was set to
+    billing : string (optional), default='hourly'
+        the instance billing mode, 'hourly' or 'second'
+
+    Returns
+    -------
+    outcome_npz : string
+        the filepath to the market outcome table
+    '''
+
+    # Import packages
+    import os
+
+    # Build the filepath
+    outcome_npz = os.path.join(base_dir, '%s_%d-iter_%.3f-min_%.3f-bid_%s_' \
+                                         'outcomes.npz' % \
+                               (instance_type, num_iter, proc_time/60.0,
+                                bid_ratio, billing))
+
+    # Return the filepath
+    return outcome_npz
+
+
+# Save a market outcome table
+def save_outcomes(outcome_npz, sim_starts, outcomes, bid_price,
+                  history_stats, params):
+    '''
+    Function to save the market outcomes of every simulation start time
+    to a numpy archive, written to a temporary file and moved into place
+    so concurrent simulations never read a partial table
+
+    Parameters
+    ----------
+    outcome_npz : string
+        the filepath to the market outcome table, from outcome_path
+    sim_starts : numpy.ndarray
+        the simulation start times (epoch seconds)
+    outcomes : tuple
+        the compute time, wait time, per-node cost, number of
+        interrupts, first iteration time, and completed arrays from
+        simulate_market_batch
+    bid_price : float
+        the spot bid price in dollars per hour
+    history_stats : tuple
+        the (mean, median, standard deviation) of the spot history
+    params : dictionary
+        the simulation input parameters, including the
+        history_fingerprint of its spot history
+
+    Returns
+    -------
+    None
+        this function saves the table to disk
+    '''
+
+    # Import packages
+    import numpy as np
+    import os
+    import tempfile
+
+    # Init variables
+    run_times, wait_times, pernode_costs, interrupts, first_iter_times, \
+    completed = outcomes
+    mean_history, median_history, stdev_history = history_stats
+
+    # Write to a temporary file and move it into place
+    tmp_fd, tmp_npz = tempfile.mkstemp(suffix='.npz',
+                                       dir=os.path.dirname(outcome_npz))
+    with os.fdopen(tmp_fd, 'wb') as npz_file:
+        np.savez(npz_file, start_time=sim_starts, compute_time=run_times,
+                 wait_time=wait_times, per_node_cost=pernode_costs,
+                 num_interrupts=interrupts, first_iter_time=first_iter_times,
+                 completed=completed, bid_price=bid_price,
+                 mean_history=mean_history, median_history=median_history,
+                 stdev_history=stdev_history,
+                 history_fingerprint=params['history_fingerprint'],
+                 product=params['product'],
+                 csv_file=str(params['csv_file']))
+    os.rename(tmp_npz, outcome_npz)
+
+
+# Load a market outcome table
+def load_outcomes(outcome_npz, history_fingerprint=None, product=None):
+    '''
+    Function to load a market outcome table, checking that it was
+    simulated over the expected spot history
+
+    Parameters
+    ----------
+    outcome_npz : string
+        the filepath to the market outcome table, from outcome_path
+    history_fingerprint : string (optional), default=None
+        the fingerprint of the spot history the outcomes must have been
+        simulated over; not checked if None
+    product : string (optional), default=None
+        the product the outcomes must have been simulated for; not
+        checked if None
+
+    Returns
+    -------
+    outcome_dict : dictionary or None
+        the arrays and values saved by save_outcomes, or None if the
+        table doesn't exist or doesn't match
+    '''
+
+    # Import packages
+    import numpy as np
+    import os
+
+    # Check the table exists
+    if not os.path.exists(outcome_npz):
+        return None
+
+    # Load the table
+    npz_data = np.load(outcome_npz)
+    outcome_dict = dict((key, npz_data[key]) for key in npz_data.files)
+    npz_data.close()
+
+    # Check it matches
+    if history_fingerprint is not None and \
+       str(outcome_dict['history_fingerprint']) != history_fingerprint:
+        return None
+    if product is not None and str(outcome_dict['product']) != product:
+        return None
+
+    # Return the outcomes
+    return outcome_dict
+
+
+# Re-cost persisted market outcomes in bulk
+def recost(config_file, sim_dir, out_dir, cost_model='ebs', pricing_yml=None,
+           billing='hourly'):
+    '''
+    Function to apply a cost model and parameter set to the persisted
+    market outcome tables of a simulation sweep, without re-simulating
+    the spot market; the configuration file may change any of the data
+    sizes and rates, and the pricing file any of the AWS prices
+
+    Parameters
+    ----------
+    config_file : string
+        filepath to the spot model configuration file to cost with; its
+        av_zone, bid_ratio, num_jobs, jobs_per, proc_time, and cluster
+        size (see utils.zone_num_nodes) must have been simulated in
+        sim_dir
+    sim_dir : string
+        base directory of the simulation results, with the market
+        outcome tables in its availability zone folders
+    out_dir : string
+        base directory to write the re-costed stats to
+    cost_model : string (optional), default='ebs'
+        the cost model to apply, 'ebs' (written as <info>_stats.csv,
+        like spot_price_model.main) or 's3' (written as
+        <info>_s3-stats.csv, like utils.apply_cost_model)
+    pricing_yml : string (optional), default=None
+        filepath to the AWS pricing file; defaults to aws_prices.yml
+    billing : string (optional), default='hourly'
+        the instance billing mode the outcomes were simulated with
+
+    Returns
+    -------
+    out_csvs : list
+        the filepaths of the re-costed stats csvs
+    '''
+
+    # Import packages
+    import numpy as np
+    import os
+    import pandas as pd
+    import yaml
+
+    # Import local packages
+    from aggregate_results import save_result_sketches
+    from pricing_catalog import load_catalog
+    from spot_price_model import calc_ebs_model_costs_batch, result_prefix
+    import utils
+
+    # Init variables
+    config_dict = yaml.load(open(config_file, 'r'))
+    catalog = load_catalog(pricing_yml)
+    proc_time = config_dict['proc_time']*60.0
+    jobs_per = config_dict['jobs_per']
+    stat_df_cols = ['Total cost', 'Instance cost', 'Storage cost',
+                    'Tranfer cost', 'Total time', 'Run time', 'Wait time',
+                    'Upload time', 'Download time']
+    if cost_model not in ['ebs', 's3']:
+        err_msg = 'cost_model argument does not support %s' % cost_model
+        raise Exception(err_msg)
+    out_csvs = []
+
+    # Cost every zone, bid ratio, and dataset size
+    for av_zone in config_dict['av_zone']:
+        zone_dir = os.path.join(out_dir, av_zone)
+        if not os.path.exists(zone_dir):
+            os.makedirs(zone_dir)
+        max_nodes = utils.zone_max_nodes(config_dict, av_zone)
+        num_nodes_cfg = utils.zone_num_nodes(config_dict, av_zone)
+        for bid_ratio in config_dict['bid_ratio']:
+            for num_jobs in config_dict['num_jobs']:
+                num_nodes = utils.cluster_size(num_jobs, jobs_per, max_nodes,
+                                               num_nodes_cfg)
+                num_iter = np.ceil(num_jobs/float((jobs_per*num_nodes)))
+
+                # Load the market outcomes
+                outcome_npz = outcome_path(os.path.join(sim_dir, av_zone),
+                                           config_dict['instance_type'],
+                                           num_iter, proc_time, bid_ratio,
+                                           billing)
+                outcome_dict = load_outcomes(outcome_npz,
+                                             product=config_dict['product'])
+                if outcome_dict is None:
+                    print 'No market outcomes found at %s, skipping...' % \
+                          outcome_npz
+                    continue
+                completed = outcome_dict['completed']
+                run_times = outcome_dict['compute_time'][completed]
+                wait_times = outcome_dict['wait_time'][completed]
+                pernode_costs = outcome_dict['per_node_cost'][completed]
+                first_iter_times = outcome_dict['first_iter_time'][completed]
+                sim_starts = outcome_dict['start_time'][completed]
+                out_prefix = result_prefix(zone_dir,
+                                           {'instance_type' : \
+                                            config_dict['instance_type'],
+                                            'num_jobs' : num_jobs,
+                                            'jobs_per' : jobs_per,
+                                            'bid_ratio' : bid_ratio,
+                                            'num_nodes' : num_nodes})
+
+                # Apply the EBS model
+                if cost_model == 'ebs':
+                    total_costs, instance_costs, stor_costs, xfer_costs, \
+                    total_times, run_times, wait_times, \
+                    xfer_up_times, xfer_down_times = \
+                        calc_ebs_model_costs_batch(run_times, wait_times,
+                                                   pernode_costs,
+                                                   first_iter_times, num_jobs,
+                                                   num_nodes, jobs_per,
+                                                   av_zone,
+                                                   config_dict['in_gb'],
+                                                   config_dict['out_gb'],
+                                                   config_dict['out_gb_dl'],
+                                                   config_dict['up_rate'],
+                                                   config_dict['down_rate'],
+                                                   price_time=sim_starts,
+                                                   catalog=catalog)
+                    stat_cols = [total_costs, instance_costs, stor_costs,
+                                 xfer_costs, total_times/60.0,
+                                 run_times/60.0, wait_times/60.0,
+                                 xfer_up_times/60.0, xfer_down_times/60.0]
+                    stat_df = pd.DataFrame(np.column_stack(stat_cols),
+                                           columns=stat_df_cols)
+                    out_csv = out_prefix + '_stats.csv'
+                    interrupts = outcome_dict['num_interrupts'][completed]
+                    sim_df = pd.DataFrame({'av_zone' : av_zone,
+                                           'bid_ratio' : bid_ratio,
+                                           'num_datasets' : num_jobs,
+                                           'num_nodes' : num_nodes,
+                                           'num_interrupts' : interrupts,
+                                           'per_node_cost' : pernode_costs},
+                                          index=stat_df.index)
+
+                # Or the S3 model, through the simulation dataframe
+                else:
+                    start_times = pd.to_datetime(sim_starts, unit='s')
+                    interrupts = outcome_dict['num_interrupts'][completed]
+                    sim_df = pd.DataFrame({'start_time' : start_times,
+                                           'proc_time' : proc_time,
+                                           'num_datasets' : num_jobs,
+                                           'jobs_per_node' : jobs_per,
+                                           'num_jobs_iter' : num_iter,
+                                           'bid_ratio' : bid_ratio,
+                                           'compute_time' : run_times,
+                                           'wait_time' : wait_times,
+                                           'per_node_cost' : pernode_costs,
+                                           'num_interrupts' : interrupts,
+                                           'first_iter_time' : first_iter_times,
+                                           'av_zone' : av_zone})
+                    for key in ['bid_price', 'median_history',
+                                'mean_history', 'stdev_history']:
+                        sim_df[key] = float(outcome_dict[key])
+                    for key in ['in_gb', 'out_gb', 'up_rate', 'down_rate']:
+                        sim_df[key] = config_dict[key]
+                    sim_df['num_nodes'] = num_nodes
+                    stat_df = utils.apply_cost_model(sim_df, catalog=catalog)
+                    out_csv = out_prefix + '_s3-stats.csv'
+
+                # Write the stats to disk, with their quantile sketches
+                stat_df.to_csv(out_csv)
+                save_result_sketches(out_csv, stat_df, sim_df, cost_model)
+                out_csvs.append(out_csv)
+
+    # Return the stats csvs
+    return out_csvs
+
+
+# Make executable
+if __name__ == '__main__':
+
+    # Import packages
+    import argparse
+
+    # Init argparser
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    # Required arguments
+    parser.add_argument('-c', '--config_file', nargs=1, required=True,
+                        type=str, help='Path to AWS sim configuration file '\
+                                       'with the parameters to cost with')
+    parser.add_argument('-s', '--sim_dir', nargs=1, required=True,
+                        type=str, help='Base directory of the simulation '\
+                                       'results with the market outcomes')
+    parser.add_argument('-o', '--out_dir', nargs=1, required=True,
+                        type=str, help='Base directory to write the '\
+                                       're-costed stats to')
+
+    # Optional arguments
+    parser.add_argument('-m', '--cost_model', nargs=1, required=False,
+                        type=str, help='Cost model to apply, \'ebs\' '\
+                                       '(default) or \'s3\'')
+    parser.add_argument('-r', '--pricing_yml', nargs=1, required=False,
+                        type=str, help='Filepath to the AWS pricing file; '\
+                                       'defaults to aws_prices.yml')
+    parser.add_argument('-b', '--billing', nargs=1, required=False,
+                        type=str, help='Billing mode the outcomes were '\
+                                       'simulated with; default is \'hourly\'')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    # Init variables
+    config_file = args.config_file[0]
+    sim_dir = args.sim_dir[0]
+    out_dir = args.out_dir[0]
+    cost_model = args.cost_model[0] if args.cost_model else 'ebs'
+    pricing_yml = args.pricing_yml[0] if args.pricing_yml else None
+    billing = args.billing[0] if args.billing else 'hourly'
+
+    # Re-cost the market outcomes
+    out_csvs = recost(config_file, sim_dir, out_dir, cost_model, pricing_yml,
+                      billing)
+    print 'Wrote %d re-costed stats csvs to %s' % (len(out_csvs), out_dir)
@@ -0,0 +1,385 @@
+# node_optimizer.py
+
+'''
+This module searches for the cluster size (number of nodes) that
+minimizes the expected total cost, total time, or a weighted sum of the
+two of a job submission in an availability zone, within the zone's node
+limit. The spot market outcomes of a node only depend on the number of
+job iterations the node count implies, so the market is simulated (or
+its persisted outcomes loaded) once per distinct number of iterations
+and every node count giving it is costed from those outcomes. Node
+counts are compared over the start times that complete on the largest
+cluster, and fewer nodes are only considered if enough of those
+submissions still finish within the history
+
+Usage:
+    python node_optimizer.py -c <config_file> -s <spot_csv> -o <out_csv>
+                             [-m <objective>] [-v <time_value>]
+                             [-n <min_completed>] [-k <sim_dir>]
+                             [-z <av_zone> ...]
+'''
+
+# Search for the best number of nodes
+def optimize_nodes(proc_time, num_jobs, jobs_per, in_gb, out_gb, out_gb_dl,
+                   up_rate, down_rate, bid_ratio, instance_type, av_zone,
+                   product, csv_file=None, max_nodes=20, objective='cost',
+                   time_value=0.0, min_completed=1.0, billing='hourly',
+                   sim_dir=None, history=None):
+    '''
+    Function to find the number of nodes, up to the zone's limit, with
+    the lowest expected objective over the start times whose submission
+    completes on the largest cluster
+
+    Parameters
+    ----------
+    proc_time : float
+        the number of minutes a single job of interest takes to run
+    num_jobs : integer
+        total number of jobs to run to complete job submission
+    jobs_per : integer
+        the number of jobs to run per node
+    in_gb : float
+        the total amount of input data for a particular job (in GB)
+    out_gb : float
+        the total amount of output data from a particular job (in GB)
+    out_gb_dl : float
+        the total amount of output data to download from EC2 (in GB)
+    up_rate : float
+        the average upload rate to transfer data to EC2 (in Mb/s)
+    down_rate : float
+        the average download rate to transfer data from EC2 (in Mb/s)
+    bid_ratio : float
+        the ratio to average spot history price to set the bid price to
+    instance_type : string
+        type of instance to run the jobs on and to get spot history for
+    av_zone : string
+        the AWS EC2 availability zone (sub-region) to get spot history
+        from
+    product : string
+        the type of operating system product to get spot history for
+    csv_file : string (optional), default=None
+        the filepath to a csv dataframe or history store to get spot
+        history from
+    max_nodes : integer (optional), default=20
+        the most nodes that may run at once in the availability zone
+    objective : string (optional), default='cost'
+        what to minimize: 'cost' (mean total cost), 'time' (mean total
+        time), or 'weighted' (mean total cost plus time_value dollars
+        per hour of mean total time)
+    time_value : float (optional), default=0.0
+        the dollars an hour of total time is worth to the 'weighted'
+        objective
+    min_completed : float (optional), default=1.0
+        the least ratio of those start times whose submission must
+        complete on a number of nodes for it to be considered; the
+        means only cover completed submissions, so small clusters where
+        only the lucky ones finish would otherwise look cheap
+    billing : string (optional), default='hourly'
+        the instance billing mode, 'hourly' or 'second'
+    sim_dir : string (optional), default=None
+        base directory of simulation results to load the persisted
+        market outcomes from, and save newly simulated ones to; the
+        market is always simulated if None
+    history : tuple (optional), default=None
+        the (spot_history, change_times, change_prices) tuple returned
+        by spot_price_model.load_spot_history; loaded here if None
+
+    Returns
+    -------
+    best : dictionary or None
+        the stats of the best number of nodes, as in eval_df; None if
+        no number of nodes completes enough submissions
+    eval_df : pandas.DataFrame
+        per number of nodes, the 'num_iter', the 'mean_cost',
+        'mean_time' (seconds), and 'mean_interrupts' of its completed
+        submissions, the 'objective' (infinite if too few complete),
+        and the 'completed_ratio'
+    '''
+
+    # Import packages
+    import numpy as np
+    import os
+    import pandas as pd
+
+    # Relative imports
+    from spot_price_model import build_crossing_index, \
+                                 calc_ebs_model_costs_batch, \
+                                 history_stats, history_time_average, \
+                                 load_spot_history, simulate_market_batch
+    import market_outcomes
+    import sim_cache
+    import utils
+
+    # Init variables
+    if objective not in ['cost', 'time', 'weighted']:
+        err_msg = 'objective argument does not support %s' % objective
+        raise Exception(err_msg)
+    proc_time *= 60.0
+    if history is None:
+        history = load_spot_history(instance_type, product, av_zone, csv_file)
+    spot_history, change_times, change_prices = history
+    bid_price = bid_ratio*history_time_average(change_times, change_prices)
+    sim_starts = np.arange(change_times[0], change_times[-1]+1, 20*60)
+    node_counts = np.arange(1, utils.cluster_size(num_jobs, jobs_per,
+                                                  max_nodes) + 1)
+    num_iters = np.ceil(num_jobs/(float(jobs_per)*node_counts))
+    params = {'history_fingerprint' : \
+                  sim_cache.fingerprint_arrays([change_times,
+                                                change_prices]),
+              'product' : product,
+              'csv_file' : csv_file}
+    crossing_index = build_crossing_index(change_prices, bid_price)
+    outcomes = {}
+    num_loaded = 0
+
+    # Get the market outcomes of each distinct number of iterations once
+    for num_iter in np.unique(num_iters):
+        outcome_dict = None
+        if sim_dir is not None:
+            outcome_npz = market_outcomes.outcome_path(os.path.join(sim_dir,
+                                                                    av_zone),
+                                                       instance_type, num_iter,
+                                                       proc_time, bid_ratio,
+                                                       billing)
+            outcome_dict = \
+                market_outcomes.load_outcomes(outcome_npz,
+                                              params['history_fingerprint'],
+                                              product)
+        if outcome_dict is not None and \
+           np.array_equal(outcome_dict['start_time'], sim_starts):
+            outcomes[num_iter] = tuple(outcome_dict[key] for key in \
+                                       ['compute_time', 'wait_time',
+                                        'per_node_cost', 'num_interrupts',
+                                        'first_iter_time', 'completed'])
+            num_loaded += 1
+            continue
+        outcomes[num_iter] = simulate_market_batch(sim_starts, change_times,
+                                                   change_prices, proc_time,
+                                                   num_iter, bid_price,
+                                                   crossing_index,
+                                                   billing=billing)
+        if sim_dir is not None:
+            if not os.path.exists(os.path.dirname(outcome_npz)):
+                os.makedirs(os.path.dirname(outcome_npz))
+            market_outcomes.save_outcomes(outcome_npz, sim_starts,
+                                          outcomes[num_iter], bid_price,
+                                          history_stats(change_prices),
+                                          params)
+
+    # Only use start times that finish in the history on the most nodes
+    top_completed = outcomes[num_iters.min()][-1]
+    if not top_completed.any():
+        err_msg = 'No start time in the spot history leaves enough time ' \
+                  'to run %d jobs' % num_jobs
+        raise Exception(err_msg)
+
+    # Cost every number of nodes from its iterations' outcomes
+    eval_rows = []
+    for num_nodes, num_iter in zip(node_counts, num_iters):
+        run_times, wait_times, pernode_costs, interrupts, \
+        first_iter_times, completed = outcomes[num_iter]
+        done = top_completed & completed
+        total_costs, instance_costs, stor_costs, xfer_costs, \
+        total_times, run_times, wait_times, \
+        xfer_up_times, xfer_down_times = \
+            calc_ebs_model_costs_batch(run_times[done], wait_times[done],
+                                       pernode_costs[done],
+                                       first_iter_times[done], num_jobs,
+                                       num_nodes, jobs_per, av_zone, in_gb,
+                                       out_gb, out_gb_dl, up_rate, down_rate,
+                                       price_time=sim_starts[done])
+        num_done = done.sum()
+        eval_rows.append({'num_nodes' : int(num_nodes),
+                          'num_iter' : int(num_iter),
+                          'mean_cost' : total_costs.mean() \
+                                        if num_done else np.inf,
+                          'mean_time' : total_times.mean() \
+                                        if num_done else np.inf,
+                          'completed_ratio' : num_done/\
+                                              float(top_completed.sum()),
+                          'mean_interrupts' : interrupts[done].mean() \
+                                              if num_done else np.nan})
+
+    # Score them, ties going to the fewest nodes
+    eval_df = pd.DataFrame(eval_rows,
+                           columns=['num_nodes', 'num_iter', 'mean_cost',
+                                    'mean_time', 'objective',
+                                    'completed_ratio', 'mean_interrupts'])
+    if objective == 'cost':
+        eval_df['objective'] = eval_df['mean_cost']
+    elif objective == 'time':
+        eval_df['objective'] = eval_df['mean_time']
+    else:
+        eval_df['objective'] = eval_df['mean_cost'] + \
+                               time_value*eval_df['mean_time']/3600.0
+    eval_df.loc[eval_df['completed_ratio'] < min_completed,
+                'objective'] = np.inf
+    print 'Costed %d node counts from %d market simulations (%d loaded) ' \
+          'for %d jobs in %s' % (len(node_counts), len(outcomes),
+                                 num_loaded, num_jobs, av_zone)
+    best = None
+    if np.isfinite(eval_df['objective']).any():
+        best = eval_df.iloc[np.argmin(eval_df['objective'].values)].to_dict()
+        print 'Best number of nodes %d (%d iterations): mean cost $%.3f, ' \
+              'time %.3f hours' % (best['num_nodes'], best['num_iter'],
+                                   best['mean_cost'],
+                                   best['mean_time']/3600.0)
+    else:
+        print 'No number of nodes completes %.1f%% of the submissions' % \
+              (100*min_completed)
+
+    # Return the best number of nodes and the evaluations
+    return best, eval_df
+
+
+# Main routine
+def main(config_file, spot_csv, out_csv, objective='cost', time_value=0.0,
+         min_completed=1.0, sim_dir=None, av_zones=None, billing='hourly'):
+    '''
+    Function to find the best number of nodes of every availability
+    zone, bid ratio, and number of datasets in a configuration file,
+    within each zone's node limit
+
+    Parameters
+    ----------
+    config_file : string
+        filepath to the spot model configuration file; its optional
+        'max_nodes' sets the node limits (see utils.zone_max_nodes)
+    spot_csv : string
+        filepath to the spot history csv file or binary history store
+    out_csv : string
+        filepath to write the best number of nodes of each
+        configuration to
+    objective : string (optional), default='cost'
+        what to minimize: 'cost', 'time', or 'weighted'
+    time_value : float (optional), default=0.0
+        the dollars an hour of total time is worth to the 'weighted'
+        objective
+    min_completed : float (optional), default=1.0
+        the least ratio of the start times completing on the largest
+        cluster that must also complete on a number of nodes
+    sim_dir : string (optional), default=None
+        base directory of simulation results to reuse and save market
+        outcomes in
+    av_zones : list (optional), default=None
+        the availability zones to search; every zone in the config if
+        None
+    billing : string (optional), default='hourly'
+        the instance billing mode, 'hourly' or 'second'
+
+    Returns
+    -------
+    node_df : pandas.DataFrame
+        per availability zone, bid ratio, and number of datasets, the
+        node limit and the stats of the best number of nodes (NaN if
+        none completes enough submissions)
+    '''
+
+    # Import packages
+    import pandas as pd
+    import yaml
+
+    # Relative imports
+    from spot_price_model import load_spot_history
+    import utils
+
+    # Init variables
+    config_dict = yaml.load(open(config_file, 'r'))
+    if av_zones is None:
+        av_zones = config_dict['av_zone']
+    node_rows = []
+
+    # Search every zone, bid ratio, and dataset size
+    for av_zone in av_zones:
+        history = load_spot_history(config_dict['instance_type'],
+                                    config_dict['product'], av_zone,
+                                    spot_csv)
+        max_nodes = utils.zone_max_nodes(config_dict, av_zone)
+        for bid_ratio in config_dict['bid_ratio']:
+            for num_jobs in config_dict['num_jobs']:
+                try:
+                    best, eval_df = \
+                        optimize_nodes(config_dict['proc_time'], num_jobs,
+                                       config_dict['jobs_per'],
+                                       config_dict['in_gb'],
+                                       config_dict['out_gb'],
+                                       config_dict['out_gb_dl'],
+                                       config_dict['up_rate'],
+                                       config_dict['down_rate'], bid_ratio,
+                                       config_dict['instance_type'], av_zone,
+                                       config_dict['product'], spot_csv,
+                                       max_nodes, objective, time_value,
+                                       min_completed, billing, sim_dir,
+                                       history)
+                except Exception as exc:
+                    print '%s, skipping...' % exc
+                    best = None
+                best = best or {}
+                best.update({'av_zone' : av_zone,
+                             'bid_ratio' : bid_ratio,
+                             'num_datasets' : num_jobs,
+                             'max_nodes' : max_nodes})
+                node_rows.append(best)
+
+    # Write to disk
+    node_df = pd.DataFrame(node_rows,
+                           columns=['av_zone', 'bid_ratio', 'num_datasets',
+                                    'max_nodes', 'num_nodes', 'num_iter',
+                                    'mean_cost', 'mean_time', 'objective',
+                                    'completed_ratio', 'mean_interrupts'])
+    node_df.to_csv(out_csv)
+    print 'Wrote the best number of nodes of %d configurations to %s' % \
+          (len(node_df), out_csv)
+
+    # Return the best numbers of nodes
+    return node_df
+
+
+# Make executable
+if __name__ == '__main__':
+
+    # Import packages
+    import argparse
+
+    # Init argparser
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    # Required arguments
+    parser.add_argument('-c', '--config_file', nargs=1, required=True,
+                        type=str, help='Path to AWS sim configuration file')
+    parser.add_argument('-s', '--spot_csv', nargs=1, required=True,
+                        type=str, help='Path to spot history csv or store')
+    parser.add_argument('-o', '--out_csv', nargs=1, required=True,
+                        type=str, help='Filepath to write the best number '\
+                                       'of nodes of each configuration to')
+
+    # Optional arguments
+    parser.add_argument('-m', '--objective', nargs=1, required=False,
+                        type=str, help='What to minimize: cost, time, or '\
+                                       'weighted; default is cost')
+    parser.add_argument('-v', '--time_value', nargs=1, required=False,
+                        type=float, help='Dollars an hour of total time is '\
+                                         'worth to the weighted objective')
+    parser.add_argument('-n', '--min_completed', nargs=1, required=False,
+                        type=float, help='Least ratio of start times that '\
+                                         'must complete; default is 1.0')
+    parser.add_argument('-k', '--sim_dir', nargs=1, required=False,
+                        type=str, help='Base directory of simulation '\
+                                       'results to reuse and save market '\
+                                       'outcomes in')
+    parser.add_argument('-z', '--av_zones', nargs='+', required=False,
+                        type=str, help='Availability zones to search; '\
+                                       'default is every config zone')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    # Init variables
+    objective = args.objective[0] if args.objective else 'cost'
+    time_value = args.time_value[0] if args.time_value else 0.0
+    min_completed = args.min_completed[0] if args.min_completed else 1.0
+    sim_dir = args.sim_dir[0] if args.sim_dir else None
+
+    # Search for the best numbers of nodes
+    main(args.config_file[0], args.spot_csv[0], args.out_csv[0], objective,
+         time_value, min_completed, sim_dir, args.av_zones)
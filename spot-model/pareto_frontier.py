@@ -0,0 +1,231 @@
+# pareto_frontier.py
+
+'''
+This module extracts the cost vs. time Pareto frontier of the
+simulation results summarized by aggregate_results.py, across every
+availability zone and bid ratio; a configuration is on the frontier if
+no other configuration of the same group is both as cheap and as fast,
+and at least one of the two strictly so. The frontier of each group is
+found with one sort and a running-minimum sweep
+
+Usage:
+    python pareto_frontier.py -i <summary_csv> -o <out_csv>
+                              [-c <cost_stat>] [-t <time_stat>]
+                              [-g <group_by> ...] [-x <max_cost>]
+                              [-y <max_time>]
+'''
+
+# Flag the non-dominated rows of a table
+def pareto_mask(data_frame, cost_col, time_col, group_by=None):
+    '''
+    Function to flag the rows of a table that no other row of the same
+    group beats on both cost and time; of rows with equal cost and time
+    only the first is kept
+
+    Parameters
+    ----------
+    data_frame : pandas.DataFrame
+        the table of configurations
+    cost_col : string
+        the name of the cost column to minimize
+    time_col : string
+        the name of the time column to minimize
+    group_by : list (optional), default=None
+        the columns whose distinct values each get their own frontier;
+        one frontier over every row if None
+
+    Returns
+    -------
+    on_front : numpy.ndarray
+        boolean array, True for each row on its group's frontier; rows
+        with a missing cost or time are never on it
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    group_by = list(group_by) if group_by else []
+    valid = data_frame[cost_col].notnull() & data_frame[time_col].notnull()
+    sort_df = data_frame.loc[valid, group_by + [cost_col, time_col]]
+    sort_df = sort_df.reset_index(drop=True)
+    sort_df['row_idx'] = np.flatnonzero(valid.values)
+
+    # Sort by group, then cheapest first, then fastest first
+    sort_df = sort_df.sort_values(group_by + [cost_col, time_col],
+                                  kind='mergesort')
+
+    # Keep the rows faster than every cheaper row of their group
+    if group_by:
+        best_time = sort_df.groupby(group_by)[time_col].cummin()
+        prev_best = best_time.groupby([sort_df[col] for col in group_by])\
+                             .shift(1)
+    else:
+        prev_best = sort_df[time_col].cummin().shift(1)
+    keep = prev_best.isnull() | (sort_df[time_col] < prev_best)
+
+    # Map back to the table rows
+    on_front = np.zeros(len(data_frame), dtype='bool')
+    on_front[sort_df['row_idx'].values[keep.values]] = True
+
+    # Return the mask
+    return on_front
+
+
+# Get the frontier configurations of a summary table
+def frontier_table(summary_df, cost_stat='mean', time_stat='mean',
+                   group_by=None, max_cost=None, max_time=None):
+    '''
+    Function to get the cost vs. time Pareto frontier of each group of
+    an aggregate_results summary table, only counting configurations
+    within the cost and time ceilings
+
+    Parameters
+    ----------
+    summary_df : pandas.DataFrame
+        the summary table written by aggregate_results.py
+    cost_stat : string (optional), default='mean'
+        the statistic of total cost to minimize, e.g. 'mean', 'median',
+        or 'p95'
+    time_stat : string (optional), default='mean'
+        the statistic of total time to minimize, e.g. 'mean', 'median',
+        or 'p95'
+    group_by : list (optional), default=None
+        the summary columns to find a frontier per; defaults to
+        ['num_datasets'], and an empty list gives one frontier across
+        every configuration
+    max_cost : float (optional), default=None
+        the most dollars a configuration may cost; no ceiling if None
+    max_time : float (optional), default=None
+        the most hours a configuration may take; no ceiling if None
+
+    Returns
+    -------
+    front_df : pandas.DataFrame
+        the frontier configurations, with every column of the summary,
+        ordered by group and then from cheapest to fastest
+    '''
+
+    # Init variables
+    if group_by is None:
+        group_by = ['num_datasets']
+    cost_col = '%s_total_cost' % cost_stat
+    time_col = '%s_total_time' % time_stat
+    for col in list(group_by) + [cost_col, time_col]:
+        if col not in summary_df.columns:
+            err_msg = 'Summary table has no %s column' % col
+            raise Exception(err_msg)
+
+    # Apply the ceilings
+    within = summary_df[cost_col].notnull()
+    if max_cost is not None:
+        within &= summary_df[cost_col] <= max_cost
+    if max_time is not None:
+        within &= summary_df[time_col] <= max_time*3600.0
+    ceil_df = summary_df[within]
+
+    # Pick out the frontier
+    front_df = ceil_df[pareto_mask(ceil_df, cost_col, time_col, group_by)]
+    front_df = front_df.sort_values(list(group_by) + [cost_col],
+                                    kind='mergesort')
+
+    # Return the frontier
+    return front_df
+
+
+# Main routine
+def main(summary_csv, out_csv, cost_stat='mean', time_stat='mean',
+         group_by=None, max_cost=None, max_time=None):
+    '''
+    Function to write the cost vs. time Pareto frontier of an
+    aggregate_results summary csv
+
+    Parameters
+    ----------
+    summary_csv : string
+        filepath to the summary csv written by aggregate_results.py
+    out_csv : string
+        filepath to write the frontier configurations to
+    cost_stat : string (optional), default='mean'
+        the statistic of total cost to minimize
+    time_stat : string (optional), default='mean'
+        the statistic of total time to minimize
+    group_by : list (optional), default=None
+        the summary columns to find a frontier per; defaults to
+        ['num_datasets']
+    max_cost : float (optional), default=None
+        the most dollars a configuration may cost; no ceiling if None
+    max_time : float (optional), default=None
+        the most hours a configuration may take; no ceiling if None
+
+    Returns
+    -------
+    front_df : pandas.DataFrame
+        the frontier configurations
+    '''
+
+    # Import packages
+    import pandas as pd
+
+    # Load the summary and get its frontier
+    summary_df = pd.read_csv(summary_csv, index_col=0)
+    front_df = frontier_table(summary_df, cost_stat, time_stat, group_by,
+                              max_cost, max_time)
+
+    # Write to disk
+    front_df.to_csv(out_csv)
+    print 'Wrote %d of %d configurations on the frontier to %s' % \
+          (len(front_df), len(summary_df), out_csv)
+
+    # Return the frontier
+    return front_df
+
+
+# Make executable
+if __name__ == '__main__':
+
+    # Import packages
+    import argparse
+
+    # Init argparser
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    # Required arguments
+    parser.add_argument('-i', '--summary_csv', nargs=1, required=True,
+                        type=str, help='Path to the aggregate_results.py '\
+                                       'summary csv')
+    parser.add_argument('-o', '--out_csv', nargs=1, required=True,
+                        type=str, help='Filepath to write the frontier to')
+
+    # Optional arguments
+    parser.add_argument('-c', '--cost_stat', nargs=1, required=False,
+                        type=str, help='Statistic of total cost to '\
+                                       'minimize, e.g. mean, median, p95; '\
+                                       'default is mean')
+    parser.add_argument('-t', '--time_stat', nargs=1, required=False,
+                        type=str, help='Statistic of total time to '\
+                                       'minimize, e.g. mean, median, p95; '\
+                                       'default is mean')
+    parser.add_argument('-g', '--group_by', nargs='*', required=False,
+                        type=str, help='Summary columns to find a frontier '\
+                                       'per; default is num_datasets, none '\
+                                       'for one frontier overall')
+    parser.add_argument('-x', '--max_cost', nargs=1, required=False,
+                        type=float, help='Most dollars a configuration may '\
+                                         'cost')
+    parser.add_argument('-y', '--max_time', nargs=1, required=False,
+                        type=float, help='Most hours a configuration may '\
+                                         'take')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    # Init variables
+    cost_stat = args.cost_stat[0] if args.cost_stat else 'mean'
+    time_stat = args.time_stat[0] if args.time_stat else 'mean'
+    max_cost = args.max_cost[0] if args.max_cost else None
+    max_time = args.max_time[0] if args.max_time else None
+
+    # Write the frontier
+    main(args.summary_csv[0], args.out_csv[0], cost_stat, time_stat,
+         args.group_by, max_cost, max_time)
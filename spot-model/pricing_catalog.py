@@ -0,0 +1,188 @@
+# pricing_catalog.py
+
+'''
+This module loads the AWS storage, transfer, and master node prices
+used by the cost models from a pricing file with effective-date ranges
+and serves vectorized price lookups for arrays of availability zones
+and times
+'''
+
+# Load the pricing catalog
+def load_catalog(pricing_yml=None, _catalog_cache={}):
+    '''
+    Function to load a pricing yaml file into arrays of prices indexed
+    by pricing period and integer region code; catalogs are cached per
+    process, so repeated lookups don't re-read or rebuild them
+
+    Parameters
+    ----------
+    pricing_yml : string (optional), default=None
+        filepath to the pricing yaml file; if not specified, the
+        aws_prices.yml file next to this module is used
+
+    Returns
+    -------
+    catalog : dictionary
+        the pricing catalog with the keys:
+        'regions' - list of region names, in region code order
+        'region_codes' - dictionary mapping region names to codes
+        'cost_types' - dictionary mapping each cost type to a dictionary
+        of its period 'starts' and 'ends' (epoch seconds) and 'prices'
+        (periods x regions array, NaN where a region isn't priced)
+    '''
+
+    # Import packages
+    import numpy as np
+    import os
+    import pandas as pd
+    import yaml
+
+    # Init variables
+    if pricing_yml is None:
+        pricing_yml = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   'aws_prices.yml')
+    pricing_yml = os.path.abspath(pricing_yml)
+
+    # Return the cached catalog if it was already loaded
+    if pricing_yml in _catalog_cache:
+        return _catalog_cache[pricing_yml]
+
+    # Load the pricing file
+    pricing_dict = yaml.load(open(pricing_yml, 'r'))
+
+    # Intern the region names to integer codes
+    regions = sorted(set(region for periods in pricing_dict.values() \
+                                for period in periods \
+                                for region in period['prices']))
+    region_codes = dict((region, code) for code, region in enumerate(regions))
+
+    # Build the price arrays for each cost type
+    cost_types = {}
+    for cost_type, periods in pricing_dict.items():
+        periods = sorted(periods, key=lambda period: str(period['effective']))
+        starts = np.array([pd.Timestamp(str(period['effective'])).value // 10**9 \
+                           for period in periods], dtype='int64')
+        ends = np.array([pd.Timestamp(str(period['expires'])).value // 10**9 \
+                         if period['expires'] else np.iinfo('int64').max \
+                         for period in periods], dtype='int64')
+        prices = np.nan*np.ones((len(periods), len(regions)))
+        for period_idx, period in enumerate(periods):
+            for region, price in period['prices'].items():
+                prices[period_idx, region_codes[region]] = price
+        cost_types[cost_type] = {'starts' : starts,
+                                 'ends' : ends,
+                                 'prices' : prices}
+
+    # Populate and cache the catalog
+    catalog = {'regions' : regions,
+               'region_codes' : region_codes,
+               'cost_types' : cost_types}
+    _catalog_cache[pricing_yml] = catalog
+
+    # Return the catalog
+    return catalog
+
+
+# Get the integer region codes of availability zones
+def get_region_codes(catalog, av_zones):
+    '''
+    Function to convert availability zone names to the catalog's integer
+    region codes, looking up each distinct zone once
+
+    Parameters
+    ----------
+    catalog : dictionary
+        the pricing catalog from load_catalog
+    av_zones : string or numpy.ndarray
+        the availability zone(s) to get the region codes of
+
+    Returns
+    -------
+    codes : numpy.ndarray
+        the region code of each zone, shaped like av_zones
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Convert each distinct zone once
+    uniq_zones, zone_idx = np.unique(np.asarray(av_zones).ravel(),
+                                     return_inverse=True)
+    uniq_codes = []
+    for av_zone in uniq_zones:
+        region = str(av_zone)[:-1]
+        if region not in catalog['region_codes']:
+            err_msg = 'Pricing catalog has no prices for region %s' % region
+            raise Exception(err_msg)
+        uniq_codes.append(catalog['region_codes'][region])
+
+    # Broadcast back out to every zone
+    codes = np.array(uniq_codes, dtype='int64')[zone_idx]
+    codes = codes.reshape(np.shape(av_zones))
+
+    # Return the region codes
+    return codes
+
+
+# Look up prices for arrays of zones and times
+def lookup_prices(cost_type, av_zones, price_times=None, catalog=None):
+    '''
+    Function to return the price of a cost type in effect for each
+    availability zone at each time
+
+    Parameters
+    ----------
+    cost_type : string
+        the type of cost to look up, supported types are the ones in the
+        pricing file: 'ebs_ssd', 'ebs_mag', 'ec2_xfer', 'ec2_master',
+        's3_stor', 's3_xfer', 's3_req_put', 's3_req_get'
+    av_zones : string or numpy.ndarray
+        the availability zone(s) to get the prices for
+    price_times : integer or numpy.ndarray (optional), default=None
+        the time(s), in epoch seconds, to get the prices at; if not
+        specified, the latest pricing period is used
+    catalog : dictionary (optional), default=None
+        the pricing catalog from load_catalog; the default catalog is
+        loaded if not specified
+
+    Returns
+    -------
+    prices : numpy.ndarray
+        the $ amount per unit of the cost type for each zone and time
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    if catalog is None:
+        catalog = load_catalog()
+    if cost_type not in catalog['cost_types']:
+        err_msg = 'cost_type argument does not support %s' % cost_type
+        raise Exception(err_msg)
+    cost_table = catalog['cost_types'][cost_type]
+    codes = get_region_codes(catalog, av_zones)
+
+    # Find the pricing period in effect at each time
+    if price_times is None:
+        period_idx = np.repeat(len(cost_table['starts'])-1, codes.size)
+        period_idx = period_idx.reshape(codes.shape)
+        in_period = period_idx >= 0
+    else:
+        price_times = np.asarray(price_times, dtype='int64')
+        period_idx = np.searchsorted(cost_table['starts'], price_times,
+                                     side='right') - 1
+        in_period = (period_idx >= 0) & \
+                    (price_times < cost_table['ends'][np.maximum(period_idx, 0)])
+    codes, period_idx, in_period = np.broadcast_arrays(codes, period_idx,
+                                                       in_period)
+
+    # Get the prices
+    prices = cost_table['prices'][np.maximum(period_idx, 0), codes]
+    if not np.all(in_period & ~np.isnan(prices)):
+        err_msg = 'Pricing catalog has no %s price for some of the zones ' \
+                  'and times requested' % cost_type
+        raise Exception(err_msg)
+
+    # Return the prices
+    return prices
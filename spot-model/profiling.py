@@ -0,0 +1,263 @@
+# profiling.py
+
+'''
+This module contains opt-in profiling hooks for the spot model: named
+stage timers and counters (simulations run, interrupts processed, rows
+written, bytes read, ...) kept per process. While profiling is off
+every hook returns straight away, so the instrumented code runs at its
+usual speed; profiles are saved as YAML and merged across the worker
+processes of a sweep
+'''
+
+# The profile of this process, None while profiling is disabled
+_profile = None
+
+
+# Create an empty profile
+def new_profile():
+    '''
+    Function to create an empty profile
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    profile : dictionary
+        the profile, with 'timers' mapping each stage name to its total
+        'seconds' and number of 'calls', and 'counters' mapping each
+        counter name to its total
+    '''
+
+    # Return the profile
+    return {'timers' : {}, 'counters' : {}}
+
+
+# Start profiling this process
+def enable_profiling():
+    '''
+    Function to start collecting a fresh profile in this process
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+        the hooks record to the process profile from now on
+    '''
+
+    # Reset the process profile
+    global _profile
+    _profile = new_profile()
+
+
+# Stop profiling this process
+def disable_profiling():
+    '''
+    Function to stop profiling this process and hand back its profile
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    profile : dictionary or None
+        the profile collected since profiling was enabled; None if it
+        was not enabled
+    '''
+
+    # Detach the process profile
+    global _profile
+    profile = _profile
+    _profile = None
+
+    # Return the profile
+    return profile
+
+
+# Start timing a stage
+def start_timer(stage):
+    '''
+    Function to start timing a stage
+
+    Parameters
+    ----------
+    stage : string
+        the name of the stage
+
+    Returns
+    -------
+    timer : tuple or None
+        the (stage, start time) to pass to stop_timer; None while
+        profiling is disabled
+    '''
+
+    # Skip the clock while profiling is disabled
+    if _profile is None:
+        return None
+
+    # Import packages
+    import time
+
+    # Return the timer
+    return (stage, time.time())
+
+
+# Stop timing a stage
+def stop_timer(timer):
+    '''
+    Function to stop timing a stage and add its elapsed time to the
+    profile
+
+    Parameters
+    ----------
+    timer : tuple or None
+        the timer returned by start_timer
+
+    Returns
+    -------
+    None
+        the elapsed time is added to the process profile
+    '''
+
+    # Skip stages started while profiling was disabled
+    if timer is None or _profile is None:
+        return
+
+    # Import packages
+    import time
+
+    # Add the elapsed time to the stage
+    stage, start = timer
+    stage_dict = _profile['timers'].setdefault(stage, {'seconds' : 0.0,
+                                                       'calls' : 0})
+    stage_dict['seconds'] += time.time() - start
+    stage_dict['calls'] += 1
+
+
+# Add to a counter
+def add_count(counter, amount=1):
+    '''
+    Function to add to a named counter of the profile
+
+    Parameters
+    ----------
+    counter : string
+        the name of the counter
+    amount : integer (optional), default=1
+        the amount to add
+
+    Returns
+    -------
+    None
+        the amount is added to the process profile
+    '''
+
+    # Skip while profiling is disabled
+    if _profile is None:
+        return
+
+    # Add to the counter
+    _profile['counters'][counter] = \
+        _profile['counters'].get(counter, 0) + int(amount)
+
+
+# Merge profiles
+def merge_profiles(profiles):
+    '''
+    Function to sum the stage times, calls, and counters of several
+    profiles
+
+    Parameters
+    ----------
+    profiles : list
+        the profiles to merge; None entries are skipped
+
+    Returns
+    -------
+    merged : dictionary
+        the merged profile, with the 'num_profiles' merged
+    '''
+
+    # Init variables
+    merged = new_profile()
+    merged['num_profiles'] = 0
+
+    # Sum each profile in
+    for profile in profiles:
+        if profile is None:
+            continue
+        merged['num_profiles'] += profile.get('num_profiles', 1)
+        for stage, stage_dict in profile['timers'].items():
+            merged_dict = merged['timers'].setdefault(stage,
+                                                      {'seconds' : 0.0,
+                                                       'calls' : 0})
+            merged_dict['seconds'] += stage_dict['seconds']
+            merged_dict['calls'] += stage_dict['calls']
+        for counter, amount in profile['counters'].items():
+            merged['counters'][counter] = \
+                merged['counters'].get(counter, 0) + amount
+
+    # Return the merged profile
+    return merged
+
+
+# Save a profile
+def save_profile(profile_yml, profile):
+    '''
+    Function to save a profile to a YAML file
+
+    Parameters
+    ----------
+    profile_yml : string
+        the filepath to save the profile to
+    profile : dictionary
+        the profile to save
+
+    Returns
+    -------
+    None
+        this function saves the profile to disk
+    '''
+
+    # Import packages
+    import yaml
+
+    # Write the profile
+    with open(profile_yml, 'w') as y_file:
+        y_file.write(yaml.dump(profile, default_flow_style=False))
+
+
+# Merge the profile files of a sweep
+def aggregate_profiles(profile_ymls, out_yml):
+    '''
+    Function to merge the profiles written by the worker processes of
+    a sweep into one file
+
+    Parameters
+    ----------
+    profile_ymls : list
+        filepaths to the profiles to merge
+    out_yml : string
+        the filepath to save the merged profile to
+
+    Returns
+    -------
+    merged : dictionary
+        the merged profile
+    '''
+
+    # Import packages
+    import yaml
+
+    # Merge and save the profiles
+    merged = merge_profiles([yaml.load(open(profile_yml, 'r')) \
+                             for profile_yml in profile_ymls])
+    save_profile(out_yml, merged)
+
+    # Return the merged profile
+    return merged
@@ -0,0 +1,360 @@
+# quantile_sketch.py
+
+'''
+This module contains functions to summarize a stream of simulation
+results in bounded memory with mergeable quantile sketches; each
+sketch is a t-digest style list of (mean, weight) centroids, kept
+exact until it grows past its size limit and then compressed so its
+centroids are finest at the tails of the distribution. Sketches are
+saved to numpy archives next to the results they summarize
+'''
+
+# Create an empty quantile sketch
+def new_sketch(compression=200):
+    '''
+    Function to create an empty quantile sketch
+
+    Parameters
+    ----------
+    compression : integer (optional), default=200
+        the sketch accuracy; a compressed sketch holds at most
+        compression+1 centroids, and up to 10*compression before it
+        is compressed again
+
+    Returns
+    -------
+    sketch : dictionary
+        the sketch, with its centroid 'means' and 'weights' arrays,
+        the 'count', 'total', 'min', and 'max' of the values added,
+        and its 'compression'
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init the sketch
+    sketch = {'means' : np.zeros(0, dtype='float64'),
+              'weights' : np.zeros(0, dtype='float64'),
+              'count' : 0.0, 'total' : 0.0,
+              'min' : np.inf, 'max' : -np.inf,
+              'compression' : compression}
+
+    # Return the sketch
+    return sketch
+
+
+# Compress a quantile sketch
+def compress_sketch(sketch):
+    '''
+    Function to merge the centroids of a sketch so that each one spans
+    at most one unit of the arcsine scale function, which keeps the
+    centroids small near the 0 and 1 quantiles
+
+    Parameters
+    ----------
+    sketch : dictionary
+        the quantile sketch, as returned by new_sketch
+
+    Returns
+    -------
+    sketch : dictionary
+        the sketch, compressed in place
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    order = np.argsort(sketch['means'], kind='mergesort')
+    means = sketch['means'][order]
+    weights = sketch['weights'][order]
+    total_weight = weights.sum()
+    if total_weight == 0:
+        return sketch
+
+    # Bucket the centroids by where they start on the scale function
+    q_left = (np.cumsum(weights) - weights)/total_weight
+    scale = sketch['compression']/np.pi
+    k_left = scale*(np.arcsin(2*q_left - 1) + np.pi/2)
+    buckets = np.floor(k_left).astype('int64')
+
+    # Merge the centroids in each bucket
+    new_weights = np.bincount(buckets, weights=weights)
+    new_sums = np.bincount(buckets, weights=weights*means)
+    keep = new_weights > 0
+    sketch['weights'] = new_weights[keep]
+    sketch['means'] = new_sums[keep]/sketch['weights']
+
+    # Return the sketch
+    return sketch
+
+
+# Add values to a quantile sketch
+def add_values(sketch, values):
+    '''
+    Function to add an array of values to a quantile sketch
+
+    Parameters
+    ----------
+    sketch : dictionary
+        the quantile sketch, as returned by new_sketch
+    values : numpy.ndarray
+        the values to add; NaNs are ignored
+
+    Returns
+    -------
+    sketch : dictionary
+        the sketch, updated in place
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    values = np.asarray(values, dtype='float64').ravel()
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return sketch
+
+    # Add the values as unit weight centroids
+    sketch['means'] = np.concatenate([sketch['means'], values])
+    sketch['weights'] = np.concatenate([sketch['weights'],
+                                        np.ones(len(values))])
+    sketch['count'] += len(values)
+    sketch['total'] += values.sum()
+    sketch['min'] = min(sketch['min'], values.min())
+    sketch['max'] = max(sketch['max'], values.max())
+
+    # Compress if the sketch has grown too large
+    if len(sketch['means']) > 10*sketch['compression']:
+        compress_sketch(sketch)
+
+    # Return the sketch
+    return sketch
+
+
+# Merge quantile sketches
+def merge_sketches(sketches):
+    '''
+    Function to merge a list of quantile sketches into one that
+    summarizes all of their values
+
+    Parameters
+    ----------
+    sketches : list
+        the quantile sketches to merge
+
+    Returns
+    -------
+    merged : dictionary
+        the merged quantile sketch, with the largest compression of
+        the sketches merged
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    compression = max([sketch['compression'] for sketch in sketches] + [1])
+    merged = new_sketch(compression)
+
+    # Pool the centroids and totals
+    if sketches:
+        merged['means'] = np.concatenate([sketch['means'] \
+                                          for sketch in sketches])
+        merged['weights'] = np.concatenate([sketch['weights'] \
+                                            for sketch in sketches])
+    merged['count'] = sum(sketch['count'] for sketch in sketches)
+    merged['total'] = sum(sketch['total'] for sketch in sketches)
+    merged['min'] = min([sketch['min'] for sketch in sketches] + [np.inf])
+    merged['max'] = max([sketch['max'] for sketch in sketches] + [-np.inf])
+
+    # Compress if the sketch is too large
+    if len(merged['means']) > 10*compression:
+        compress_sketch(merged)
+
+    # Return the merged sketch
+    return merged
+
+
+# Estimate quantiles from a sketch
+def sketch_quantiles(sketch, quantiles):
+    '''
+    Function to estimate quantiles of the values summarized by a
+    sketch; while the sketch is uncompressed these match
+    numpy.percentile with linear interpolation exactly
+
+    Parameters
+    ----------
+    sketch : dictionary
+        the quantile sketch, as returned by new_sketch
+    quantiles : list
+        the quantiles to estimate, between 0 and 1
+
+    Returns
+    -------
+    estimates : numpy.ndarray
+        the estimated quantiles; NaN if the sketch is empty
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    quantiles = np.asarray(quantiles, dtype='float64')
+    if sketch['count'] == 0:
+        return np.nan*np.ones(len(quantiles))
+    order = np.argsort(sketch['means'], kind='mergesort')
+    means = sketch['means'][order]
+    weights = sketch['weights'][order]
+
+    # Interpolate between centroid centers, pinned to the extremes
+    centers = np.cumsum(weights) - weights/2.0
+    if weights[0] > 1:
+        centers = np.concatenate([[0.5], centers])
+        means = np.concatenate([[sketch['min']], means])
+    if weights[-1] > 1:
+        centers = np.concatenate([centers, [sketch['count'] - 0.5]])
+        means = np.concatenate([means, [sketch['max']]])
+    ranks = quantiles*(sketch['count'] - 1) + 0.5
+    estimates = np.interp(ranks, centers, means)
+
+    # Return the estimates
+    return estimates
+
+
+# Get the mean of a sketch
+def sketch_mean(sketch):
+    '''
+    Function to get the exact mean of the values summarized by a
+    sketch
+
+    Parameters
+    ----------
+    sketch : dictionary
+        the quantile sketch, as returned by new_sketch
+
+    Returns
+    -------
+    mean : float
+        the mean of the values; NaN if the sketch is empty
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Return the mean
+    if sketch['count'] == 0:
+        return np.nan
+    return sketch['total']/sketch['count']
+
+
+# Save grouped quantile sketches
+def save_sketches(sketch_npz, groups):
+    '''
+    Function to save the quantile sketches of one or more groups to a
+    numpy archive, written to a temporary file and moved into place so
+    readers never load a partial archive
+
+    Parameters
+    ----------
+    sketch_npz : string
+        the filepath to save the sketches to
+    groups : dictionary
+        maps each (av_zone, bid_ratio, num_datasets, num_nodes) group
+        key to a dictionary of the quantile sketch of each metric
+
+    Returns
+    -------
+    None
+        this function saves the sketches to disk
+    '''
+
+    # Import packages
+    import numpy as np
+    import os
+    import tempfile
+
+    # Init variables
+    group_keys = sorted(groups)
+    npz_dict = {'av_zone' : np.array([key[0] for key in group_keys]),
+                'bid_ratio' : np.array([key[1] for key in group_keys],
+                                       dtype='float64'),
+                'num_datasets' : np.array([key[2] for key in group_keys],
+                                          dtype='int64'),
+                'num_nodes' : np.array([key[3] for key in group_keys],
+                                       dtype='int64')}
+
+    # Store each sketch as its centroids and totals
+    for group_idx, key in enumerate(group_keys):
+        for metric, sketch in groups[key].items():
+            prefix = '%d_%s' % (group_idx, metric)
+            npz_dict[prefix + '_centroids'] = \
+                np.vstack([sketch['means'], sketch['weights']])
+            npz_dict[prefix + '_totals'] = \
+                np.array([sketch['count'], sketch['total'], sketch['min'],
+                          sketch['max'], sketch['compression']])
+
+    # Write to a temporary file and move it into place
+    tmp_fd, tmp_npz = tempfile.mkstemp(suffix='.npz',
+                                       dir=os.path.dirname(sketch_npz))
+    with os.fdopen(tmp_fd, 'wb') as npz_file:
+        np.savez(npz_file, **npz_dict)
+    os.rename(tmp_npz, sketch_npz)
+
+
+# Load grouped quantile sketches
+def load_sketches(sketch_npz):
+    '''
+    Function to load the grouped quantile sketches saved by
+    save_sketches
+
+    Parameters
+    ----------
+    sketch_npz : string
+        the filepath to the saved sketches
+
+    Returns
+    -------
+    groups : dictionary or None
+        maps each (av_zone, bid_ratio, num_datasets, num_nodes) group
+        key to a dictionary of the quantile sketch of each metric; None
+        if the sketches were saved before the number of nodes was a
+        group field
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    npz_data = np.load(sketch_npz)
+    groups = {}
+    if 'num_nodes' not in npz_data.files:
+        npz_data.close()
+        return None
+
+    # Rebuild each group's sketches
+    for group_idx in range(len(npz_data['av_zone'])):
+        key = (str(npz_data['av_zone'][group_idx]),
+               float(npz_data['bid_ratio'][group_idx]),
+               int(npz_data['num_datasets'][group_idx]),
+               int(npz_data['num_nodes'][group_idx]))
+        groups[key] = {}
+        prefix = '%d_' % group_idx
+        for npz_key in npz_data.files:
+            if not (npz_key.startswith(prefix) and \
+                    npz_key.endswith('_centroids')):
+                continue
+            metric = npz_key[len(prefix):-len('_centroids')]
+            centroids = npz_data[npz_key]
+            count, total, min_val, max_val, compression = \
+                npz_data[prefix + metric + '_totals']
+            groups[key][metric] = {'means' : centroids[0],
+                                   'weights' : centroids[1],
+                                   'count' : count, 'total' : total,
+                                   'min' : min_val, 'max' : max_val,
+                                   'compression' : int(compression)}
+    npz_data.close()
+
+    # Return the sketches
+    return groups
@@ -261,7 +261,6 @@ def main(out_dir, num_cores):
     import logging
     import os
     import pandas as pd
-    from multiprocessing import Process
     from CPAC.AWS import fetch_creds
 
     # Import local packages
@@ -301,12 +300,15 @@ def main(out_dir, num_cores):
     for reg_idx, region in enumerate(regions):
         # For each instance_type-product combination
         for ip_idx, (instance_type, product) in enumerate(instance_products):
-            proc = Process(target=get_df_and_save,
-                           args=(None, instance_type, product, region, out_dir))
-            proc_list.append(proc)
-
-    # Run in parallel
-    utils.run_in_parallel(proc_list, num_cores)
+            proc_list.append((get_df_and_save,
+                              (None, instance_type, product, region, out_dir)))
+
+    # Run in parallel, retrying fetches that fail
+    results, errors = utils.run_in_parallel(proc_list, num_cores,
+                                            max_retries=2)
+    if errors:
+        sh_log.info('Failed to fetch %d of %d histories' % \
+                    (len(errors), len(proc_list)))
 
     # Gather files to merge into one dataframe
     sh_log.info('Done fetching and saving histories.\nGathering for merge...')
@@ -7,13 +7,16 @@ Script to run AWS simulation for a given configuration file in parallel
 
 Usage:
     python run_spot_sims.py -c <config_file> -n <num_cores>
-                            -o <out_dir> -s <spot_csv>
+                            -o <out_dir> -s <spot_csv> [-t]
+                            [-k <cache_dir> [-g <cache_gb>]] [-i] [-f]
+                            [-p <num_paths> [-d <path_days>] [-r <seed>]]
 '''
 
 # Build processing list
-def build_proc_list(config_file, out_dir, spot_csv):
+def build_proc_list(config_file, out_dir, spot_csv, cache_dir=None,
+                    cache_gb=None, incremental=False, profile=False):
     '''
-    Build a list of spot_price_model.main processes
+    Build a list of spot_price_model.main tasks
 
     Parameters
     ----------
@@ -23,17 +26,26 @@ def build_proc_list(config_file, out_dir, spot_csv):
         directory to output the results of the simulations
     spot_csv : string
         filepath to the spot history csv file
+    cache_dir : string (optional), default=None
+        base directory of the simulation result cache to use
+    cache_gb : float (optional), default=None
+        the most GB of results to keep in the cache
+    incremental : boolean (optional), default=False
+        flag to extend earlier results over a longer spot history
+        instead of skipping simulations whose results exist
+    profile : boolean (optional), default=False
+        flag to save a profile of each simulation's stages
 
     Returns
     -------
     proc_list : list
-        list of multiprocessing.Process objects that run the simulation
+        list of (spot_price_model.main, args) tasks for
+        utils.run_in_parallel that run the simulation
     '''
 
     # Import packages
     import utils
     import yaml
-    from multiprocessing import Process
 
     # Import local modules
     import record_spot_price
@@ -47,27 +59,356 @@ def build_proc_list(config_file, out_dir, spot_csv):
     for avz in config_dict['av_zone']:
         for br in config_dict['bid_ratio']:
             for nj in config_dict['num_jobs']:
-                proc = Process(target=spot_price_model.main,
-                               args=(out_dir, config_dict['proc_time'], nj,
-                                     config_dict['jobs_per'],
-                                     config_dict['in_gb'],
-                                     config_dict['out_gb'],
-                                     config_dict['out_gb_dl'],
-                                     config_dict['up_rate'],
-                                     config_dict['down_rate'], br,
-                                     config_dict['instance_type'], avz,
-                                     config_dict['product'], spot_csv, None))
-                proc_list.append(proc)
+                proc_list.append((spot_price_model.main,
+                                  (out_dir, config_dict['proc_time'], nj,
+                                   config_dict['jobs_per'],
+                                   config_dict['in_gb'],
+                                   config_dict['out_gb'],
+                                   config_dict['out_gb_dl'],
+                                   config_dict['up_rate'],
+                                   config_dict['down_rate'], br,
+                                   config_dict['instance_type'], avz,
+                                   config_dict['product'], spot_csv, None,
+                                   'hourly', cache_dir, cache_gb,
+                                   incremental, profile,
+                                   utils.zone_num_nodes(config_dict, avz),
+                                   utils.zone_max_nodes(config_dict, avz))))
 
     # Return process list
     return proc_list
 
 
+# Build Monte Carlo processing list
+def build_mc_proc_list(config_file, out_dir, spot_csv, num_paths,
+                       path_days=None, seed=None):
+    '''
+    Build a list of synthetic_history.main tasks, which simulate each
+    configuration over synthetic spot histories to get confidence
+    intervals on its mean costs and times
+
+    Parameters
+    ----------
+    config_file : string
+        filepath to the spot model configuration file
+    out_dir : string
+        directory to output the results of the simulations
+    spot_csv : string
+        filepath to the spot history csv file
+    num_paths : integer
+        the number of synthetic histories to simulate each over
+    path_days : float (optional), default=None
+        the length of each synthetic history in days; defaults to twice
+        the recorded history length
+    seed : integer (optional), default=None
+        the random seed; each task gets its own seed from it
+
+    Returns
+    -------
+    proc_list : list
+        list of (synthetic_history.main, args) tasks for
+        utils.run_in_parallel
+    '''
+
+    # Import packages
+    import yaml
+
+    # Import local modules
+    import synthetic_history
+    import utils
+
+    # Init variables
+    proc_list = []
+    config_dict = yaml.load(open(config_file, 'r'))
+
+    # Build processing list
+    for avz in config_dict['av_zone']:
+        for br in config_dict['bid_ratio']:
+            for nj in config_dict['num_jobs']:
+                task_seed = None if seed is None else seed + len(proc_list)
+                proc_list.append((synthetic_history.main,
+                                  (out_dir, config_dict['proc_time'], nj,
+                                   config_dict['jobs_per'],
+                                   config_dict['in_gb'],
+                                   config_dict['out_gb'],
+                                   config_dict['out_gb_dl'],
+                                   config_dict['up_rate'],
+                                   config_dict['down_rate'], br,
+                                   config_dict['instance_type'], avz,
+                                   config_dict['product'], spot_csv,
+                                   num_paths, path_days, 24, task_seed,
+                                   'hourly', 0.95, 50, None,
+                                   utils.zone_max_nodes(config_dict, avz),
+                                   utils.zone_num_nodes(config_dict, avz))))
+
+    # Return process list
+    return proc_list
+
+
+# Run every simulation of the zones handed to a worker
+def zone_worker(zone_queue, status_queue, config_dict, out_dir, spot_csv,
+                cache_dir=None, cache_gb=None, incremental=False,
+                profile=False):
+    '''
+    Function for a long-lived worker process to pull availability zones
+    off of a queue, load each zone's spot history once, and run all of
+    that zone's bid ratio and number of jobs simulations against it
+
+    Parameters
+    ----------
+    zone_queue : multiprocessing.Queue
+        queue of availability zones to simulate, ending with None
+    status_queue : multiprocessing.Queue
+        queue to put an (av_zone, bid_ratio, num_jobs, err_msg) tuple on
+        as each simulation finishes; err_msg is None on success
+    config_dict : dictionary
+        the spot model configuration
+    out_dir : string
+        directory to output the results of the simulations
+    spot_csv : string
+        filepath to the spot history csv file or binary history store
+    cache_dir : string (optional), default=None
+        base directory of the simulation result cache to use
+    cache_gb : float (optional), default=None
+        the most GB of results to keep in the cache
+    incremental : boolean (optional), default=False
+        flag to extend earlier results over a longer spot history
+        instead of skipping simulations whose results exist
+    profile : boolean (optional), default=False
+        flag to save a profile of each simulation's stages
+
+    Returns
+    -------
+    None
+        this function saves the simulation results to disk
+    '''
+
+    # Import packages
+    import os
+
+    # Import local modules
+    import profiling
+    import spot_price_model
+    import utils
+
+    # Work until the end of the queue
+    while True:
+        av_zone = zone_queue.get()
+        if av_zone is None:
+            break
+        max_nodes = utils.zone_max_nodes(config_dict, av_zone)
+        num_nodes = utils.zone_num_nodes(config_dict, av_zone)
+
+        # Load the zone's history once; a store's arrays are passed on
+        # memory mapped read-only, so the pages are shared between
+        # workers
+        if profile:
+            profiling.enable_profiling()
+        timer = profiling.start_timer('load_history')
+        try:
+            history = spot_price_model.load_spot_history(config_dict['instance_type'],
+                                                         config_dict['product'],
+                                                         av_zone, spot_csv)
+            load_err = None
+        except Exception as exc:
+            history = None
+            load_err = 'Could not load history: %s' % exc
+        profiling.stop_timer(timer)
+        if profile:
+            if not os.path.exists(out_dir):
+                try:
+                    os.makedirs(out_dir)
+                except OSError:
+                    pass
+            profiling.save_profile(os.path.join(out_dir,
+                                                '%s_history_profile.yml' % \
+                                                av_zone),
+                                   profiling.disable_profiling())
+
+        # Run every bid ratio and dataset size against it
+        for br in config_dict['bid_ratio']:
+            for nj in config_dict['num_jobs']:
+                err_msg = load_err
+                if history is not None:
+                    try:
+                        spot_price_model.main(out_dir, config_dict['proc_time'],
+                                              nj, config_dict['jobs_per'],
+                                              config_dict['in_gb'],
+                                              config_dict['out_gb'],
+                                              config_dict['out_gb_dl'],
+                                              config_dict['up_rate'],
+                                              config_dict['down_rate'], br,
+                                              config_dict['instance_type'],
+                                              av_zone, config_dict['product'],
+                                              spot_csv, history=history,
+                                              cache_dir=cache_dir,
+                                              cache_gb=cache_gb,
+                                              incremental=incremental,
+                                              profile=profile,
+                                              num_nodes=num_nodes,
+                                              max_nodes=max_nodes)
+                    except Exception as exc:
+                        err_msg = '%s: %s' % (type(exc).__name__, exc)
+                status_queue.put((av_zone, br, nj, err_msg))
+
+        # Release the history before taking the next zone
+        del history
+
+
+# Run the simulations on a zone-affine worker pool
+def run_zone_pool(config_file, out_dir, spot_csv, num_cores, cache_dir=None,
+                  cache_gb=None, incremental=False, profile=False):
+    '''
+    Function to schedule the simulations of a configuration file onto a
+    pool of long-lived workers, handing out whole availability zones so
+    each zone's history is loaded once and memory use scales with the
+    number of zones in flight rather than the number of simulations
+
+    Parameters
+    ----------
+    config_file : string
+        filepath to the spot model configuration file
+    out_dir : string
+        directory to output the results of the simulations
+    spot_csv : string
+        filepath to the spot history csv file or binary history store
+    num_cores : integer
+        the number of workers to run at once
+    cache_dir : string (optional), default=None
+        base directory of the simulation result cache to use
+    cache_gb : float (optional), default=None
+        the most GB of results to keep in the cache
+    incremental : boolean (optional), default=False
+        flag to extend earlier results over a longer spot history
+        instead of skipping simulations whose results exist
+    profile : boolean (optional), default=False
+        flag to save a profile of each simulation's stages
+
+    Returns
+    -------
+    failed_tasks : list
+        list of (av_zone, bid_ratio, num_jobs, err_msg) tuples of the
+        simulations that did not complete
+    '''
+
+    # Import packages
+    import Queue
+    import yaml
+    from multiprocessing import Process, Queue as ProcQueue
+
+    # Import local modules
+    import utils
+
+    # Init variables
+    config_dict = yaml.load(open(config_file, 'r'))
+    zones = config_dict['av_zone']
+    tasks = set((avz, br, nj) for avz in zones \
+                              for br in config_dict['bid_ratio'] \
+                              for nj in config_dict['num_jobs'])
+    num_tasks = len(tasks)
+    num_workers = max(min(num_cores, len(zones)), 1)
+    zone_queue = ProcQueue()
+    status_queue = ProcQueue()
+    failed_tasks = []
+
+    # Queue up the zones, with one stop sentinel per worker
+    for avz in zones:
+        zone_queue.put(avz)
+    for worker_idx in range(num_workers):
+        zone_queue.put(None)
+
+    # Start the workers
+    workers = [Process(target=zone_worker,
+                       args=(zone_queue, status_queue, config_dict, out_dir,
+                             spot_csv, cache_dir, cache_gb, incremental,
+                             profile)) \
+               for worker_idx in range(num_workers)]
+    for worker in workers:
+        worker.start()
+
+    # Report each simulation as it completes
+    num_done = 0
+    while num_done < num_tasks:
+        try:
+            avz, br, nj, err_msg = status_queue.get(timeout=5)
+        except Queue.Empty:
+            if any(worker.is_alive() for worker in workers):
+                continue
+            break
+        tasks.discard((avz, br, nj))
+        num_done += 1
+        if err_msg is None:
+            print 'Finished %s, bid ratio %.3f, %d jobs' % (avz, br, nj)
+        else:
+            print 'Failed %s, bid ratio %.3f, %d jobs: %s' % \
+                  (avz, br, nj, err_msg)
+            failed_tasks.append((avz, br, nj, err_msg))
+        utils.print_loop_status(num_done, num_tasks)
+
+    # Any unreported simulations belonged to a worker that died
+    for avz, br, nj in sorted(tasks):
+        err_msg = 'Worker exited before reporting'
+        print 'Failed %s, bid ratio %.3f, %d jobs: %s' % (avz, br, nj, err_msg)
+        failed_tasks.append((avz, br, nj, err_msg))
+
+    # Wait for the workers to exit
+    for worker in workers:
+        worker.join()
+
+    # Return the failed simulations
+    return failed_tasks
+
+
+# Merge the profiles of a run
+def aggregate_run_profiles(out_dir, start_time):
+    '''
+    Function to merge the profiles the workers of a run saved under
+    the output directory into one summary profile
+
+    Parameters
+    ----------
+    out_dir : string
+        directory the results of the simulations were output to
+    start_time : float
+        the epoch time the run started; profiles saved before it are
+        left out
+
+    Returns
+    -------
+    merged : dictionary
+        the merged profile, also saved as 'profile_summary.yml' in
+        out_dir
+    '''
+
+    # Import packages
+    import os
+
+    # Import local modules
+    import profiling
+
+    # Find the profiles saved during this run
+    profile_ymls = []
+    for root, dirs, files in os.walk(out_dir):
+        for file_name in files:
+            profile_yml = os.path.join(root, file_name)
+            if file_name.endswith('_profile.yml') and \
+               os.path.getmtime(profile_yml) >= start_time:
+                profile_ymls.append(profile_yml)
+
+    # Merge and save them
+    summary_yml = os.path.join(out_dir, 'profile_summary.yml')
+    merged = profiling.aggregate_profiles(sorted(profile_ymls), summary_yml)
+
+    # Return the merged profile
+    return merged
+
+
 # Make module executable
 if __name__ == '__main__':
 
     # Import packages
     import argparse
+    import os
+    import time
 
     # Import local modules
     import utils
@@ -85,6 +426,39 @@ if __name__ == '__main__':
     parser.add_argument('-s', '--spot_csv', nargs=1, required=True,
                         type=str, help='Path to spot history csv')
 
+    # Optional arguments
+    parser.add_argument('-t', '--per_task', action='store_true',
+                        required=False,
+                        help='Run each simulation in its own process, '\
+                             'loading its zone\'s history separately, '\
+                             'instead of on the zone-affine worker pool')
+    parser.add_argument('-k', '--cache_dir', nargs=1, required=False,
+                        type=str, help='Directory of a simulation result '\
+                                       'cache to reuse identical simulations')
+    parser.add_argument('-g', '--cache_gb', nargs=1, required=False,
+                        type=float, help='Most GB of results to keep in '\
+                                         'the cache')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        required=False,
+                        help='Extend earlier results in out_dir over a '\
+                             'longer spot history, re-simulating only the '\
+                             'start times whose outcome can change')
+    parser.add_argument('-f', '--profile', action='store_true',
+                        required=False,
+                        help='Time each stage of every simulation and '\
+                             'count the work done, merging the profiles '\
+                             'into out_dir/profile_summary.yml')
+    parser.add_argument('-p', '--num_paths', nargs=1, required=False,
+                        type=int, help='Simulate over this many synthetic '\
+                                       'spot histories per configuration '\
+                                       'for confidence intervals, instead '\
+                                       'of the recorded history')
+    parser.add_argument('-d', '--path_days', nargs=1, required=False,
+                        type=float, help='Days in each synthetic history; '\
+                                         'default is twice the recorded')
+    parser.add_argument('-r', '--seed', nargs=1, required=False,
+                        type=int, help='Random seed for synthetic histories')
+
     # Parse arguments
     args = parser.parse_args()
 
@@ -93,9 +467,29 @@ if __name__ == '__main__':
     num_cores = args.num_cores[0]
     out_dir = args.out_dir[0]
     spot_csv = args.spot_csv[0]
-
-    # Build processing list
-    proc_list = build_proc_list(config_file, out_dir, spot_csv)
+    cache_dir = args.cache_dir[0] if args.cache_dir else None
+    cache_gb = args.cache_gb[0] if args.cache_gb else None
+    start_time = int(time.time())
 
     # Run jobs in parallel
-    utils.run_in_parallel(proc_list, num_cores)
+    if args.num_paths:
+        path_days = args.path_days[0] if args.path_days else None
+        seed = args.seed[0] if args.seed else None
+        proc_list = build_mc_proc_list(config_file, out_dir, spot_csv,
+                                       args.num_paths[0], path_days, seed)
+        utils.run_in_parallel(proc_list, num_cores, collect_results=False)
+    elif args.per_task:
+        proc_list = build_proc_list(config_file, out_dir, spot_csv,
+                                    cache_dir, cache_gb, args.incremental,
+                                    args.profile)
+        utils.run_in_parallel(proc_list, num_cores, collect_results=False)
+    else:
+        run_zone_pool(config_file, out_dir, spot_csv, num_cores, cache_dir,
+                      cache_gb, args.incremental, args.profile)
+
+    # Merge the profiles of the simulations
+    if args.profile:
+        merged = aggregate_run_profiles(out_dir, start_time)
+        print 'Merged %d profiles into %s' % \
+              (merged['num_profiles'],
+               os.path.join(out_dir, 'profile_summary.yml'))
@@ -6,7 +6,7 @@
 '''
 
 # Load config file and run static model
-def load_and_run(config, av_zone, price_hr):
+def load_and_run(config, av_zone, price_hr, pricing_yml=None):
     '''
     '''
 
@@ -17,12 +17,16 @@ def load_and_run(config, av_zone, price_hr):
     import yaml
 
     # Relative imports
+    from pricing_catalog import load_catalog
     from spot_price_model import calc_s3_model_costs
     import utils
 
     # Init variables
     df_rows = []
     cfg_dict = yaml.load(open(config, 'r'))
+    catalog = load_catalog(pricing_yml)
+    max_nodes = utils.zone_max_nodes(cfg_dict, av_zone)
+    num_nodes_cfg = utils.zone_num_nodes(cfg_dict, av_zone)
 
     # Model parameters
     down_rate = cfg_dict['down_rate']
@@ -42,7 +46,8 @@ def load_and_run(config, av_zone, price_hr):
         print '%d datasets...' % num_jobs
 
         # Tune parameters for cost model
-        num_nodes = min(np.ceil(float(num_jobs)/jobs_per), 20)
+        num_nodes = utils.cluster_size(num_jobs, jobs_per, max_nodes,
+                                       num_nodes_cfg)
         num_iter = np.ceil(num_jobs/float((jobs_per*num_nodes)))
 
         # Runtime parameters
@@ -60,7 +65,8 @@ def load_and_run(config, av_zone, price_hr):
         xfer_up_time, s3_upl_time, s3_download_time = \
             calc_s3_model_costs(run_time, wait_time, pernode_cost,
                                 first_iter_time, num_jobs, num_nodes, jobs_per,
-                                av_zone, in_gb, out_gb, up_rate, down_rate)
+                                av_zone, in_gb, out_gb, up_rate, down_rate,
+                                catalog=catalog)
 
         # Populate dictionary
         row_dict = {'av_zone' : av_zone, 'down_rate' : down_rate,
@@ -99,6 +105,230 @@ def load_and_run(config, av_zone, price_hr):
     return static_df
 
 
+# Calculate static model costs for arrays of configurations
+def static_costs(cfg_dict, av_zone, price_hr, num_jobs, jobs_per,
+                 max_nodes=20, catalog=None, num_nodes=None):
+    '''
+    Function to calculate the static (on-demand) model costs and times
+    of job submissions with the S3 model; the zone, price, and size
+    parameters may be scalars or arrays
+
+    Parameters
+    ----------
+    cfg_dict : dictionary
+        the sim config, for its proc_time, transfer, and instance
+        parameters
+    av_zone : string or numpy.ndarray
+        the availability zone(s) to run in
+    price_hr : float or numpy.ndarray
+        the per-hour on-demand price(s) of a node
+    num_jobs : integer or numpy.ndarray
+        the number(s) of datasets to run
+    jobs_per : integer or numpy.ndarray
+        the number(s) of jobs to run per node
+    max_nodes : integer or numpy.ndarray (optional), default=20
+        the most nodes a cluster may have
+    catalog : dictionary (optional), default=None
+        the pricing catalog from pricing_catalog.load_catalog; the
+        default catalog is loaded if not specified
+    num_nodes : integer or numpy.ndarray (optional), default=None
+        the number(s) of nodes asked for, NaN where as many as are
+        needed should run; as many as are needed, up to max_nodes, if
+        None
+
+    Returns
+    -------
+    static_df : pandas.DataFrame
+        the static model results, one row per configuration
+    '''
+
+    # Import packages
+    import numpy as np
+    import pandas as pd
+
+    # Relative imports
+    from spot_price_model import calc_s3_model_costs_batch
+    import utils
+
+    # Init variables
+    if num_nodes is None:
+        num_nodes = np.nan
+    av_zone, price_hr, num_jobs, jobs_per, max_nodes, nodes_asked = \
+        np.broadcast_arrays(np.atleast_1d(av_zone),
+                            *[np.asarray(arg, dtype='float64') for arg in \
+                              [price_hr, num_jobs, jobs_per, max_nodes,
+                               num_nodes]])
+    proc_time = cfg_dict['proc_time']*60.0 # convert to seconds
+
+    # Tune parameters for cost model, on the nodes asked for if any
+    asked = ~np.isnan(nodes_asked)
+    num_nodes = utils.cluster_size(num_jobs, jobs_per, max_nodes)
+    num_nodes[asked] = utils.cluster_size(num_jobs[asked], jobs_per[asked],
+                                          max_nodes[asked],
+                                          nodes_asked[asked])
+    num_iter = np.ceil(num_jobs/(jobs_per*num_nodes))
+
+    # Runtime parameters
+    run_time = num_iter*proc_time
+    wait_time = np.zeros(run_time.shape)
+    pernode_cost = np.ceil(run_time/3600.0)*price_hr
+    first_iter_time = proc_time
+
+    # Grab costs from s3 model
+    total_cost, instance_cost, ebs_storage_cost, s3_cost, \
+    s3_storage_cost, s3_req_cost, s3_xfer_cost, \
+    total_time, run_time, wait_time, \
+    xfer_up_time, s3_upl_time, s3_download_time = \
+        calc_s3_model_costs_batch(run_time, wait_time, pernode_cost,
+                                  first_iter_time, num_jobs, num_nodes,
+                                  jobs_per, av_zone, cfg_dict['in_gb'],
+                                  cfg_dict['out_gb'], cfg_dict['up_rate'],
+                                  cfg_dict['down_rate'], catalog=catalog)
+
+    # Create static model dataframe
+    static_df = pd.DataFrame({'av_zone' : av_zone,
+                              'down_rate' : cfg_dict['down_rate'],
+                              'in_gb' : cfg_dict['in_gb'],
+                              'instance_type' : cfg_dict['instance_type'],
+                              'jobs_per' : jobs_per.astype('int64'),
+                              'max_nodes' : max_nodes.astype('int64'),
+                              'num_datasets' : num_jobs.astype('int64'),
+                              'num_nodes' : num_nodes.astype('int64'),
+                              'out_gb' : cfg_dict['out_gb'],
+                              'out_gb_dl' : cfg_dict['out_gb_dl'],
+                              'proc_time' : proc_time,
+                              'product' : cfg_dict['product'],
+                              'up_rate' : cfg_dict['up_rate'],
+                              'price_hr' : price_hr,
+                              'static_total_cost' : total_cost,
+                              'static_instance_cost' : instance_cost,
+                              'static_ebs_storage_cost' : ebs_storage_cost,
+                              's3_total_cost' : s3_cost,
+                              's3_storage_cost' : s3_storage_cost,
+                              's3_req_cost' : s3_req_cost,
+                              's3_xfer_cost' : s3_xfer_cost,
+                              'static_total_time' : total_time,
+                              'static_run_time' : run_time,
+                              'static_wait_time' : wait_time,
+                              'xfer_up_time' : xfer_up_time,
+                              's3_upl_time' : s3_upl_time,
+                              's3_dl_time' : s3_download_time})
+
+    # Return dataframe
+    return static_df
+
+
+# Run the static model over a grid of zones, prices, and sizes
+def run_grid(config, price_table, jobs_per_list=None, max_nodes_list=None,
+             pricing_yml=None, out_csv=None):
+    '''
+    Function to evaluate the static (on-demand) model for every
+    combination of availability zone, hourly price, number of
+    datasets, jobs per node, and cluster size in one vectorized pass
+
+    Parameters
+    ----------
+    config : string
+        filepath to the sim config file; its av_zone and num_jobs lists
+        make up the grid
+    price_table : string
+        filepath to a YAML mapping regions or availability zones to the
+        per-hour price (or a list of prices) to assume, e.g.
+        on_demand_c38xlarge.yml; a zone's own entry wins over its
+        region's
+    jobs_per_list : list (optional), default=None
+        the numbers of jobs per node to evaluate; defaults to the
+        config's jobs_per
+    max_nodes_list : list (optional), default=None
+        the most nodes a cluster may have, running as many as are
+        needed; defaults to each zone's limit and number of nodes in
+        the config (see utils.zone_max_nodes and utils.zone_num_nodes)
+    pricing_yml : string (optional), default=None
+        filepath to the AWS pricing file; defaults to aws_prices.yml
+    out_csv : string (optional), default=None
+        filepath to write the consolidated table to; defaults to
+        <config name>/on_demand.csv under the working directory
+
+    Returns
+    -------
+    static_df : pandas.DataFrame
+        the static model results, one row per grid combination
+    '''
+
+    # Import packages
+    import os
+    import numpy as np
+    import yaml
+
+    # Relative imports
+    from pricing_catalog import load_catalog
+    import utils
+
+    # Init variables
+    cfg_dict = yaml.load(open(config, 'r'))
+    price_dict = yaml.load(open(price_table, 'r'))
+    catalog = load_catalog(pricing_yml)
+    av_zones = cfg_dict['av_zone']
+    if isinstance(av_zones, str):
+        av_zones = [av_zones]
+    num_jobs_list = cfg_dict['num_jobs']
+    if jobs_per_list is None:
+        jobs_per_list = [cfg_dict['jobs_per']]
+    zone_limits = max_nodes_list is None
+    if zone_limits:
+        max_nodes_list = [None]
+
+    # Get each zone's prices from its own or its region's entry
+    zone_prices = []
+    for av_zone in av_zones:
+        price_hr = price_dict.get(av_zone, price_dict.get(av_zone[:-1]))
+        if price_hr is None:
+            err_msg = 'Price table has no price for %s' % av_zone
+            raise Exception(err_msg)
+        if not isinstance(price_hr, list):
+            price_hr = [price_hr]
+        zone_prices.extend((av_zone, price) for price in price_hr)
+
+    # Expand the grid
+    zone_idx, jobs_idx, per_idx, nodes_idx = \
+        [grid_idx.ravel() for grid_idx in \
+         np.meshgrid(np.arange(len(zone_prices)),
+                     np.arange(len(num_jobs_list)),
+                     np.arange(len(jobs_per_list)),
+                     np.arange(len(max_nodes_list)), indexing='ij')]
+    av_zone = np.array([zone_price[0] for zone_price in zone_prices])[zone_idx]
+    price_hr = np.array([zone_price[1] for zone_price in zone_prices],
+                        dtype='float64')[zone_idx]
+    num_jobs = np.asarray(num_jobs_list, dtype='float64')[jobs_idx]
+    jobs_per = np.asarray(jobs_per_list, dtype='float64')[per_idx]
+    if zone_limits:
+        max_nodes = np.array([utils.zone_max_nodes(cfg_dict, zone) \
+                              for zone in av_zone], dtype='float64')
+        num_nodes = np.array([utils.zone_num_nodes(cfg_dict, zone) \
+                              for zone in av_zone], dtype='float64')
+    else:
+        max_nodes = np.asarray(max_nodes_list, dtype='float64')[nodes_idx]
+        num_nodes = None
+
+    # Evaluate the whole grid at once
+    static_df = static_costs(cfg_dict, av_zone, price_hr, num_jobs, jobs_per,
+                             max_nodes, catalog, num_nodes)
+
+    # Write to disk
+    if out_csv is None:
+        out_csv = os.path.join(os.getcwd(),
+                               os.path.basename(config).split('.')[0],
+                               'on_demand.csv')
+    if os.path.dirname(out_csv) and \
+       not os.path.exists(os.path.dirname(out_csv)):
+        os.makedirs(os.path.dirname(out_csv))
+    static_df.to_csv(out_csv)
+    print 'Wrote %d static model results to %s' % (len(static_df), out_csv)
+
+    # Return dataframe
+    return static_df
+
+
 # Make executable
 if __name__ == '__main__':
 
@@ -112,22 +342,55 @@ if __name__ == '__main__':
     # Required arguments
     parser.add_argument('-c', '--config', nargs=1, required=True,
                         type=str, help='Filepath to the sim config file')
-    parser.add_argument('-p', '--price_hr', nargs=1, required=True,
+    parser.add_argument('-p', '--price_hr', nargs=1, required=False,
                         type=float, help='Price per compute hour to assume')
     parser.add_argument('-z', '--av_zone', nargs=1, required=False, type=str,
                         help='Specify availability zone of interest')
+    parser.add_argument('-r', '--pricing_yml', nargs=1, required=False,
+                        type=str, help='Filepath to the AWS pricing file; '\
+                                       'defaults to aws_prices.yml')
+    parser.add_argument('-t', '--price_table', nargs=1, required=False,
+                        type=str, help='Filepath to a YAML of per-hour '\
+                                       'prices by region or zone; runs '\
+                                       'every config zone and size at once')
+    parser.add_argument('-j', '--jobs_per', nargs='+', required=False,
+                        type=int, help='Jobs per node to evaluate in grid '\
+                                       'mode; defaults to the config\'s')
+    parser.add_argument('-n', '--max_nodes', nargs='+', required=False,
+                        type=int, help='Cluster sizes to evaluate in grid '\
+                                       'mode; defaults to each zone\'s '\
+                                       'config limit and num_nodes')
+    parser.add_argument('-o', '--out_csv', nargs=1, required=False,
+                        type=str, help='Filepath to write the grid mode '\
+                                       'table to')
 
     # Parse arguments
     args = parser.parse_args()
 
     # Init variables
     config = args.config[0]
-    price_hr = args.price_hr[0]
-    av_zone = args.av_zone[0]
+    if args.pricing_yml:
+        pricing_yml = args.pricing_yml[0]
+    else:
+        pricing_yml = None
 
-    # Call static model function
-    static_df = load_and_run(config, av_zone, price_hr)
+    # Run every zone, price, and size in one pass
+    if args.price_table:
+        out_csv = args.out_csv[0] if args.out_csv else None
+        run_grid(config, args.price_table[0], args.jobs_per,
+                 args.max_nodes, pricing_yml, out_csv)
 
-    # Write to disk
-    out_df_path = os.path.join(os.getcwd(), os.path.basename(config).split('.')[0], str(price_hr), av_zone, 'on_demand.csv')
-    static_df.to_csv(out_df_path)
+    # Or run the one zone and price
+    else:
+        if not (args.price_hr and args.av_zone):
+            parser.error('Either a price table or a price and zone is '\
+                         'required')
+        price_hr = args.price_hr[0]
+        av_zone = args.av_zone[0]
+
+        # Call static model function
+        static_df = load_and_run(config, av_zone, price_hr, pricing_yml)
+
+        # Write to disk
+        out_df_path = os.path.join(os.getcwd(), os.path.basename(config).split('.')[0], str(price_hr), av_zone, 'on_demand.csv')
+        static_df.to_csv(out_df_path)
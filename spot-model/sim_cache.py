@@ -0,0 +1,401 @@
+# sim_cache.py
+
+'''
+This module stores spot simulation results in a content-addressed
+cache, keyed by a hash of every simulation input, the spot history
+series, and the AWS prices used, with a json index of the entries for
+fast lookup and least-recently-used eviction
+
+Usage:
+    python sim_cache.py -d <cache_dir> [-g <max_gb>] [-e <max_entries>]
+'''
+
+# Fingerprint a set of arrays
+def fingerprint_arrays(arrays):
+    '''
+    Function to hash the dtypes, shapes, and contents of a list of
+    numpy arrays
+
+    Parameters
+    ----------
+    arrays : list
+        list of numpy.ndarrays to fingerprint
+
+    Returns
+    -------
+    fingerprint : string
+        the sha1 hex digest of the arrays
+    '''
+
+    # Import packages
+    import hashlib
+    import numpy as np
+
+    # Hash each array in turn
+    sha = hashlib.sha1()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        sha.update(str(arr.dtype))
+        sha.update(str(arr.shape))
+        sha.update(arr.tostring())
+
+    # Return the fingerprint
+    return sha.hexdigest()
+
+
+# Build the cache key of a simulation
+def cache_key(params, change_times, change_prices, catalog=None):
+    '''
+    Function to build the cache key of a simulation from its input
+    parameters, its spot history, and the pricing catalog
+
+    Parameters
+    ----------
+    params : dictionary
+        the simulation input parameters, as written to _params.yml
+    change_times : numpy.ndarray
+        epoch seconds of each price change in the spot history
+    change_prices : numpy.ndarray
+        the spot price at each change time
+    catalog : dictionary (optional), default=None
+        the pricing catalog from pricing_catalog.load_catalog; the
+        default catalog is used if not specified
+
+    Returns
+    -------
+    key : string
+        the sha1 hex digest identifying the simulation
+    '''
+
+    # Import packages
+    import hashlib
+    import json
+
+    # Relative imports
+    from pricing_catalog import load_catalog
+
+    # Init variables
+    if catalog is None:
+        catalog = load_catalog()
+    pricing_arrays = []
+    for cost_type in sorted(catalog['cost_types']):
+        cost_table = catalog['cost_types'][cost_type]
+        pricing_arrays.extend([cost_table['starts'], cost_table['ends'],
+                               cost_table['prices']])
+
+    # The history source path doesn't matter, only its contents
+    key_dict = dict((key, val) for key, val in params.items() \
+                    if key != 'csv_file')
+    key_dict['history'] = fingerprint_arrays([change_times, change_prices])
+    key_dict['pricing'] = fingerprint_arrays(pricing_arrays)
+    key_dict['regions'] = catalog['regions']
+
+    # Hash the inputs
+    key = hashlib.sha1(json.dumps(key_dict, sort_keys=True,
+                                  default=str)).hexdigest()
+
+    # Return the key
+    return key
+
+
+# Lock the cache index
+def lock_index(cache_dir):
+    '''
+    Function to take an exclusive lock on the cache index, so that
+    several simulation processes can share one cache
+
+    Parameters
+    ----------
+    cache_dir : string
+        the base directory of the cache
+
+    Returns
+    -------
+    lock_file : file
+        the open lock file; close it to release the lock
+    '''
+
+    # Import packages
+    import fcntl
+    import os
+
+    # Make sure the cache exists
+    if not os.path.exists(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError as exc:
+            print 'Found cache directory %s, continuing...' % cache_dir
+
+    # Lock the index
+    lock_file = open(os.path.join(cache_dir, 'index.lock'), 'a')
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+    # Return the lock file
+    return lock_file
+
+
+# Read the cache index
+def read_index(cache_dir):
+    '''
+    Function to read the cache index; the index lock should be held
+
+    Parameters
+    ----------
+    cache_dir : string
+        the base directory of the cache
+
+    Returns
+    -------
+    index : dictionary
+        maps each cache key to a dictionary of its 'size' (bytes),
+        'created' and 'last_access' (epoch seconds)
+    '''
+
+    # Import packages
+    import json
+    import os
+
+    # Init variables
+    index_json = os.path.join(cache_dir, 'index.json')
+
+    # Read the index
+    if os.path.exists(index_json):
+        with open(index_json, 'r') as json_file:
+            index = json.load(json_file)
+    else:
+        index = {}
+
+    # Return the index
+    return index
+
+
+# Write the cache index
+def write_index(cache_dir, index):
+    '''
+    Function to atomically replace the cache index; the index lock
+    should be held
+
+    Parameters
+    ----------
+    cache_dir : string
+        the base directory of the cache
+    index : dictionary
+        the cache index, as returned by read_index
+
+    Returns
+    -------
+    None
+        this function saves the index to disk
+    '''
+
+    # Import packages
+    import json
+    import os
+
+    # Init variables
+    index_json = os.path.join(cache_dir, 'index.json')
+
+    # Write to a temporary file and move it into place
+    with open(index_json + '.tmp', 'w') as json_file:
+        json.dump(index, json_file)
+    os.rename(index_json + '.tmp', index_json)
+
+
+# Get a simulation's results from the cache
+def cache_get(cache_dir, key):
+    '''
+    Function to load a simulation's results from the cache and mark
+    them as recently used
+
+    Parameters
+    ----------
+    cache_dir : string
+        the base directory of the cache
+    key : string
+        the simulation's cache key, from cache_key
+
+    Returns
+    -------
+    cached : tuple or None
+        the cached (sim_df, stat_df) dataframes, or None if the
+        simulation isn't in the cache
+    '''
+
+    # Import packages
+    import os
+    import pandas as pd
+    import time
+
+    # Init variables
+    entry_dir = os.path.join(cache_dir, 'entries', key)
+
+    # Look the key up in the index
+    lock_file = lock_index(cache_dir)
+    try:
+        index = read_index(cache_dir)
+        if key not in index or not os.path.isdir(entry_dir):
+            return None
+        sim_df = pd.read_pickle(os.path.join(entry_dir, 'sim.pkl'))
+        stat_df = pd.read_pickle(os.path.join(entry_dir, 'stats.pkl'))
+        index[key]['last_access'] = time.time()
+        write_index(cache_dir, index)
+    finally:
+        lock_file.close()
+
+    # Return the cached dataframes
+    return sim_df, stat_df
+
+
+# Put a simulation's results in the cache
+def cache_put(cache_dir, key, sim_df, stat_df, max_gb=None, max_entries=None):
+    '''
+    Function to store a simulation's results in the cache, evicting
+    the least recently used entries if the cache grows past its limits
+
+    Parameters
+    ----------
+    cache_dir : string
+        the base directory of the cache
+    key : string
+        the simulation's cache key, from cache_key
+    sim_df : pandas.DataFrame
+        the simulation market results dataframe
+    stat_df : pandas.DataFrame
+        the full run stats dataframe
+    max_gb : float (optional), default=None
+        the most GB of results to keep in the cache; no limit if None
+    max_entries : integer (optional), default=None
+        the most simulations to keep in the cache; no limit if None
+
+    Returns
+    -------
+    None
+        this function saves the results to the cache on disk
+    '''
+
+    # Import packages
+    import os
+    import shutil
+    import tempfile
+    import time
+
+    # Init variables
+    entries_dir = os.path.join(cache_dir, 'entries')
+    entry_dir = os.path.join(entries_dir, key)
+    if not os.path.exists(entries_dir):
+        try:
+            os.makedirs(entries_dir)
+        except OSError as exc:
+            print 'Found cache entries directory, continuing...'
+
+    # Write the entry to a temporary directory first
+    tmp_dir = tempfile.mkdtemp(dir=entries_dir)
+    sim_df.to_pickle(os.path.join(tmp_dir, 'sim.pkl'))
+    stat_df.to_pickle(os.path.join(tmp_dir, 'stats.pkl'))
+    entry_size = sum(os.path.getsize(os.path.join(tmp_dir, pkl)) \
+                     for pkl in os.listdir(tmp_dir))
+
+    # Move it into place and add it to the index
+    lock_file = lock_index(cache_dir)
+    try:
+        if os.path.isdir(entry_dir):
+            shutil.rmtree(tmp_dir)
+        else:
+            os.rename(tmp_dir, entry_dir)
+        index = read_index(cache_dir)
+        now = time.time()
+        index[key] = {'size' : entry_size, 'created' : now,
+                      'last_access' : now}
+        evict(cache_dir, max_gb, max_entries, index=index)
+    finally:
+        lock_file.close()
+
+
+# Evict least recently used entries from the cache
+def evict(cache_dir, max_gb=None, max_entries=None, index=None):
+    '''
+    Function to remove the least recently used simulations from the
+    cache until it is within its size and entry limits
+
+    Parameters
+    ----------
+    cache_dir : string
+        the base directory of the cache
+    max_gb : float (optional), default=None
+        the most GB of results to keep in the cache; no limit if None
+    max_entries : integer (optional), default=None
+        the most simulations to keep in the cache; no limit if None
+    index : dictionary (optional), default=None
+        the cache index, if the caller already holds the index lock;
+        otherwise the lock is taken and the index read here
+
+    Returns
+    -------
+    evicted : list
+        the cache keys that were removed
+    '''
+
+    # Import packages
+    import os
+    import shutil
+
+    # Take the lock, unless the caller has it
+    lock_file = None
+    if index is None:
+        lock_file = lock_index(cache_dir)
+        index = read_index(cache_dir)
+
+    # Remove entries, oldest access first, until within the limits
+    try:
+        evicted = []
+        lru_keys = sorted(index, key=lambda key: index[key]['last_access'])
+        total_bytes = sum(index[key]['size'] for key in index)
+        for key in lru_keys:
+            over_size = max_gb is not None and total_bytes > max_gb*1024**3
+            over_count = max_entries is not None and \
+                         len(index) > max_entries
+            if not (over_size or over_count):
+                break
+            shutil.rmtree(os.path.join(cache_dir, 'entries', key), True)
+            total_bytes -= index[key]['size']
+            del index[key]
+            evicted.append(key)
+        write_index(cache_dir, index)
+    finally:
+        if lock_file is not None:
+            lock_file.close()
+
+    # Return the evicted keys
+    return evicted
+
+
+# Make executable
+if __name__ == '__main__':
+
+    # Import packages
+    import argparse
+
+    # Init argparser
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    # Required arguments
+    parser.add_argument('-d', '--cache_dir', nargs=1, required=True,
+                        type=str, help='Base directory of the cache')
+
+    # Optional arguments
+    parser.add_argument('-g', '--max_gb', nargs=1, required=False,
+                        type=float, help='Most GB of results to keep')
+    parser.add_argument('-e', '--max_entries', nargs=1, required=False,
+                        type=int, help='Most simulations to keep')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    # Init variables
+    cache_dir = args.cache_dir[0]
+    max_gb = args.max_gb[0] if args.max_gb else None
+    max_entries = args.max_entries[0] if args.max_entries else None
+
+    # Evict and summarize
+    evicted = evict(cache_dir, max_gb, max_entries)
+    print 'Evicted %d simulations from %s' % (len(evicted), cache_dir)
@@ -0,0 +1,460 @@
+# spot_history_store.py
+
+'''
+This module stores spot price histories on disk as compact binary
+series, one per instance type, product, and availability zone, that
+simulation processes open with memory mapping instead of parsing the
+merged spot history csv
+
+Usage:
+    python spot_history_store.py -c <spot_csv> [<spot_csv> ...]
+                                 -o <store_dir> [-n <num_cores>]
+'''
+
+# Get the filepaths of a stored spot history series
+def series_paths(store_dir, instance_type, product, av_zone):
+    '''
+    Function to return the filepaths of the timestamp and price arrays
+    for one spot history series in the store
+
+    Parameters
+    ----------
+    store_dir : string
+        base directory of the spot history store
+    instance_type : string
+        the type of instance of the spot history
+    product : string
+        the type of OS product of the spot history
+    av_zone : string
+        the availability zone of the spot history
+
+    Returns
+    -------
+    times_npy : string
+        filepath to the int64 epoch-second timestamps array
+    prices_npy : string
+        filepath to the float64 prices array
+    '''
+
+    # Import packages
+    import os
+
+    # Init variables
+    series_dir = os.path.join(store_dir, instance_type,
+                              product.replace('/', '-'))
+    times_npy = os.path.join(series_dir, '%s_times.npy' % av_zone)
+    prices_npy = os.path.join(series_dir, '%s_prices.npy' % av_zone)
+
+    # Return the filepaths
+    return times_npy, prices_npy
+
+
+# Write a spot history series to the store
+def write_series(store_dir, instance_type, product, av_zone,
+                 change_times, change_prices):
+    '''
+    Function to save one sorted spot history series to the store
+
+    Parameters
+    ----------
+    store_dir : string
+        base directory of the spot history store
+    instance_type : string
+        the type of instance of the spot history
+    product : string
+        the type of OS product of the spot history
+    av_zone : string
+        the availability zone of the spot history
+    change_times : numpy.ndarray
+        sorted epoch-second timestamps where the spot price changed
+    change_prices : numpy.ndarray
+        the spot price set at each of the change_times
+
+    Returns
+    -------
+    None
+        this function saves the series to disk
+    '''
+
+    # Import packages
+    import numpy as np
+    import os
+
+    # Init variables
+    times_npy, prices_npy = series_paths(store_dir, instance_type,
+                                         product, av_zone)
+
+    # Check if folders exists
+    series_dir = os.path.dirname(times_npy)
+    if not os.path.exists(series_dir):
+        try:
+            os.makedirs(series_dir)
+        except OSError as exc:
+            print 'Found series directory %s, continuing...' % series_dir
+
+    # Save the arrays
+    np.save(times_npy, np.asarray(change_times, dtype='int64'))
+    np.save(prices_npy, np.asarray(change_prices, dtype='float64'))
+
+
+# Read a spot history series from the store
+def read_series(store_dir, instance_type, product, av_zone):
+    '''
+    Function to open one spot history series in the store; the arrays
+    are memory mapped read-only, so only the pages of this series are
+    read and concurrent processes share them through the page cache;
+    prices from stores built with float32 prices are read into memory
+    as float64
+
+    Parameters
+    ----------
+    store_dir : string
+        base directory of the spot history store
+    instance_type : string
+        the type of instance of the spot history
+    product : string
+        the type of OS product of the spot history
+    av_zone : string
+        the availability zone of the spot history
+
+    Returns
+    -------
+    change_times : numpy.memmap
+        sorted int64 epoch-second timestamps where the spot price changed
+    change_prices : numpy.memmap
+        the float64 spot price set at each of the change_times
+    '''
+
+    # Import packages
+    import numpy as np
+    import os
+
+    # Init variables
+    times_npy, prices_npy = series_paths(store_dir, instance_type,
+                                         product, av_zone)
+
+    # Check the series was stored
+    if not os.path.exists(times_npy):
+        err_msg = 'No spot history stored for %s %s in %s under %s' \
+                  % (instance_type, product, av_zone, store_dir)
+        raise Exception(err_msg)
+
+    # Memory map the arrays
+    change_times = np.load(times_npy, mmap_mode='r')
+    change_prices = np.load(prices_npy, mmap_mode='r')
+    if change_prices.dtype != np.float64:
+        change_prices = np.asarray(change_prices, dtype='float64')
+
+    # Return the series
+    return change_times, change_prices
+
+
+# Parse spot history timestamps
+def parse_timestamps(timestamps, ts_format='%Y-%m-%dT%H:%M:%S.%fZ'):
+    '''
+    Function to parse spot history timestamp strings all at once using
+    a fixed format, rather than one at a time with dateutil
+
+    Parameters
+    ----------
+    timestamps : array-like
+        the timestamp strings to parse
+    ts_format : string (optional), default='%Y-%m-%dT%H:%M:%S.%fZ'
+        strftime format of the timestamps, as returned by boto; the
+        format is inferred if the timestamps don't match it
+
+    Returns
+    -------
+    datetimes : pandas.DatetimeIndex
+        the parsed UTC timestamps
+    '''
+
+    # Import packages
+    import pandas as pd
+
+    # Parse with the fixed format, otherwise infer it
+    try:
+        datetimes = pd.to_datetime(timestamps, format=ts_format, utc=True)
+    except ValueError:
+        datetimes = pd.to_datetime(timestamps, utc=True)
+    datetimes = pd.DatetimeIndex(datetimes)
+
+    # Return the datetimes
+    return datetimes
+
+
+# Find where each chunk of rows of a csv starts
+def chunk_offsets(csv_file, chunksize, block_size=2**24):
+    '''
+    Function to find the byte offsets of the first row of each chunk of
+    a csv, after its header line, by counting line breaks in large
+    blocks of the file rather than parsing it
+
+    Parameters
+    ----------
+    csv_file : string
+        filepath to the csv
+    chunksize : integer
+        the number of rows in each chunk
+    block_size : integer (optional), default=2**24
+        the number of bytes to read at a time
+
+    Returns
+    -------
+    offsets : list
+        the byte offset of the first row of each chunk, in file order
+    '''
+
+    # Import packages
+    import numpy as np
+    import os
+
+    # Init variables
+    file_size = os.path.getsize(csv_file)
+    offsets = []
+
+    # Count line breaks from the first row on
+    with open(csv_file, 'rb') as csv_in:
+        csv_in.readline()
+        block_start = csv_in.tell()
+        offsets.append(block_start)
+        rows_left = chunksize
+        block = csv_in.read(block_size)
+        while block:
+            line_ends = block_start + \
+                np.flatnonzero(np.frombuffer(block, dtype='uint8') == \
+                               ord('\n'))
+            offsets.extend(line_ends[rows_left-1::chunksize] + 1)
+            if len(line_ends) < rows_left:
+                rows_left -= len(line_ends)
+            else:
+                rows_left = chunksize - (len(line_ends)-rows_left)%chunksize
+            block_start += len(block)
+            block = csv_in.read(block_size)
+
+    # Drop the offset past the last row
+    offsets = [int(offset) for offset in offsets if offset < file_size]
+
+    # Return the offsets
+    return offsets
+
+
+# Parse a chunk of a merged spot history csv
+def parse_chunk(chunk_args):
+    '''
+    Function to read and parse the timestamps of a chunk of merged spot
+    history rows, and save its rows of each instance type, product, and
+    availability zone to a store of just that chunk
+
+    Parameters
+    ----------
+    chunk_args : tuple
+        (csv_file, offset, chunksize, columns, ts_format, chunk_store)
+        where offset is the byte offset of the chunk's first row,
+        chunksize the most rows to read, columns the csv's header,
+        ts_format the strftime format of its 'Timestamp' column, and
+        chunk_store the directory to save the chunk's series to
+
+    Returns
+    -------
+    chunk_store : string
+        the directory the chunk's series were saved to
+    chunk_keys : list
+        the (instance_type, product, av_zone) keys found in the chunk
+    '''
+
+    # Import packages
+    import pandas as pd
+
+    # Init variables
+    csv_file, offset, chunksize, columns, ts_format, chunk_store = \
+        chunk_args
+    group_cols = ['Instance type', 'Product', 'Availability zone']
+
+    # Read only the rows of this chunk
+    with open(csv_file, 'rb') as csv_in:
+        csv_in.seek(offset)
+        chunk_df = pd.read_csv(csv_in, header=None, names=columns,
+                               usecols=group_cols + ['Spot price',
+                                                     'Timestamp'],
+                               nrows=chunksize)
+
+    # Parse all of the timestamps at once with the fixed format
+    datetimes = parse_timestamps(chunk_df['Timestamp'].values, ts_format)
+    epoch_secs = datetimes.asi8 // 10**9
+    prices = chunk_df['Spot price'].values.astype('float64')
+
+    # Save the rows of each series, in file order
+    chunk_keys = []
+    for key, row_idx in chunk_df.groupby(group_cols).indices.items():
+        write_series(chunk_store, key[0], key[1], key[2],
+                     epoch_secs[row_idx], prices[row_idx])
+        chunk_keys.append(key)
+
+    # Return the chunk store and its series
+    return chunk_store, chunk_keys
+
+
+# Sort, de-duplicate, and save one spot history series
+def finalize_series(series_args):
+    '''
+    Function to gather one series' rows from the chunk stores, sort
+    them by time, keep the first recorded price for each duplicated
+    timestamp, and write it to the store
+
+    Parameters
+    ----------
+    series_args : tuple
+        (store_dir, key, chunk_stores) where key is the series'
+        (instance_type, product, av_zone) and chunk_stores are the
+        chunk stores holding its rows, in file order
+
+    Returns
+    -------
+    num_changes : integer
+        the number of price change points written for the series
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    store_dir, (instance_type, product, av_zone), chunk_stores = series_args
+    chunk_rows = [read_series(chunk_store, instance_type, product, av_zone) \
+                  for chunk_store in chunk_stores]
+    times = np.concatenate([rows[0] for rows in chunk_rows])
+    prices = np.concatenate([rows[1] for rows in chunk_rows])
+
+    # Stable sort keeps file order among duplicated timestamps
+    sort_idx = np.argsort(times, kind='mergesort')
+    times = times[sort_idx]
+    prices = prices[sort_idx]
+    first_seen = np.append(True, np.diff(times) != 0)
+
+    # Save the series
+    write_series(store_dir, instance_type, product, av_zone,
+                 times[first_seen], prices[first_seen])
+    num_changes = first_seen.sum()
+
+    # Return the number of change points
+    return num_changes
+
+
+# Convert merged spot history csvs into the store
+def build_store(csv_files, store_dir, num_cores=1, chunksize=500000,
+                ts_format='%Y-%m-%dT%H:%M:%S.%fZ'):
+    '''
+    Function to split merged spot history csvs, as written by
+    record_spot_price.main, into one sorted and de-duplicated series
+    per instance type, product, and availability zone in the store;
+    each process reads and parses its own chunks of the csvs and saves
+    their rows of each series to disk, so only one chunk or series at
+    a time is held in memory by any process
+
+    Parameters
+    ----------
+    csv_files : string or list
+        filepath(s) to the merged spot history csvs; overlapping
+        histories (e.g. consecutive months) are merged together
+    store_dir : string
+        base directory of the spot history store
+    num_cores : integer (optional), default=1
+        the number of processes to parse chunks and write series with
+    chunksize : integer (optional), default=500000
+        the number of csv rows to read and parse at a time
+    ts_format : string (optional), default='%Y-%m-%dT%H:%M:%S.%fZ'
+        strftime format of the 'Timestamp' column, as returned by boto;
+        the format is inferred for chunks that don't match it
+
+    Returns
+    -------
+    None
+        this function saves the series to disk
+    '''
+
+    # Import packages
+    import itertools
+    import os
+    import pandas as pd
+    import shutil
+    import tempfile
+    from multiprocessing import Pool
+
+    # Init variables
+    if isinstance(csv_files, str):
+        csv_files = [csv_files]
+    if not os.path.exists(store_dir):
+        os.makedirs(store_dir)
+    parts_dir = tempfile.mkdtemp(prefix='.chunks_', dir=store_dir)
+    series_parts = {}
+    if num_cores > 1:
+        pool = Pool(num_cores)
+        map_func = pool.imap
+    else:
+        map_func = itertools.imap
+
+    # Parse each csv in chunks and note which chunks hold each series
+    try:
+        chunk_args = []
+        for csv_file in csv_files:
+            print 'Parsing %s in chunks of %d rows...' % (csv_file, chunksize)
+            columns = list(pd.read_csv(csv_file, nrows=0).columns)
+            for offset in chunk_offsets(csv_file, chunksize):
+                chunk_store = os.path.join(parts_dir,
+                                           '%06d' % len(chunk_args))
+                chunk_args.append((csv_file, offset, chunksize, columns,
+                                   ts_format, chunk_store))
+        for chunk_store, chunk_keys in map_func(parse_chunk, chunk_args):
+            for key in chunk_keys:
+                series_parts.setdefault(key, []).append(chunk_store)
+
+        # Sort, de-duplicate, and write out each series
+        series_args = [(store_dir, key, chunk_stores) \
+                       for key, chunk_stores in sorted(series_parts.items())]
+        for series_arg, num_changes in zip(series_args,
+                                           map_func(finalize_series,
+                                                    series_args)):
+            print 'Wrote %d changes for %s %s %s' % \
+                  ((num_changes,) + series_arg[1])
+
+    # Remove the chunk stores and shut down the worker processes
+    finally:
+        shutil.rmtree(parts_dir)
+        if num_cores > 1:
+            pool.close()
+            pool.join()
+
+
+# Make executable
+if __name__ == '__main__':
+
+    # Import packages
+    import argparse
+
+    # Init argparser
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    # Required arguments
+    parser.add_argument('-c', '--spot_csvs', nargs='+', required=True,
+                        type=str, help='Path(s) to merged spot history csvs')
+    parser.add_argument('-o', '--store_dir', nargs=1, required=True,
+                        type=str, help='Base directory of the spot history '\
+                                       'store to write')
+
+    # Optional arguments
+    parser.add_argument('-n', '--num_cores', nargs=1, required=False,
+                        type=int, help='Number of cores to run in parallel')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    # Init variables
+    spot_csvs = args.spot_csvs
+    store_dir = args.store_dir[0]
+    try:
+        num_cores = args.num_cores[0]
+    except TypeError as exc:
+        num_cores = 1
+
+    # Build the store
+    build_store(spot_csvs, store_dir, num_cores)
@@ -11,7 +11,8 @@ for a job submission to an AWS EC2 SPOT cluster
 # Calculate costs with the EBS model
 def calc_s3_model_costs(run_time, wait_time, node_cost, first_iter_time,
                          num_jobs, num_nodes, jobs_per, av_zone,
-                         in_gb, out_gb, up_rate, down_rate):
+                         in_gb, out_gb, up_rate, down_rate,
+                         price_time=None, catalog=None):
     '''
     Function to take results from the simulate_market function and
     calculate total costs and runtimes with data transfer and storage
@@ -44,6 +45,12 @@ def calc_s3_model_costs(run_time, wait_time, node_cost, first_iter_time,
         the total amount of output data from a particular job (in GB)
     up_rate : float
         the average upload rate to transfer data to EC2 (in Mb/s)
+    price_time : integer (optional), default=None
+        the time, in epoch seconds, to use the AWS prices of; if not
+        specified, the latest prices in the catalog are used
+    catalog : dictionary (optional), default=None
+        the pricing catalog from pricing_catalog.load_catalog; the
+        default catalog is used if not specified
 
     Returns
     -------
@@ -113,7 +120,7 @@ def calc_s3_model_costs(run_time, wait_time, node_cost, first_iter_time,
     s3_upl_time = s3_upl_time_n1 + residual_jobs*(out_gb/upl_to_s3_gbps)
 
     ### Get EBS storage costs ###
-    ebs_ssd = get_ec2_costs(av_zone, 'ssd')
+    ebs_ssd = get_ec2_costs(av_zone, 'ssd', price_time, catalog)
     # EBS should only need to hold per-iteration jobs (rm complete as they go)
     ebs_nfs_gb = in_gb*num_jobs + num_nodes*jobs_per*out_gb
     # Get GB-months
@@ -127,7 +134,7 @@ def calc_s3_model_costs(run_time, wait_time, node_cost, first_iter_time,
     # Return pricing for each storage, transfer, and requests
     # Assuming out_gb stored on S3 for month, up to 1TB/month price
     # S3 storage
-    stor_gb_month = get_s3_costs(av_zone, 'stor')
+    stor_gb_month = get_s3_costs(av_zone, 'stor', price_time, catalog)
     down_gb_per_sec = down_rate/8.0/1000.0
     secs_to_download_s3 = (num_jobs*out_gb)/down_gb_per_sec
     s3_storage_cost = stor_gb_month*\
@@ -139,10 +146,10 @@ def calc_s3_model_costs(run_time, wait_time, node_cost, first_iter_time,
     in_ratio = 2
     # Assume ~50 for outupt
     out_ratio = 50
-    req_prices = get_s3_costs(av_zone, 'req')
+    req_prices = get_s3_costs(av_zone, 'req', price_time, catalog)
     s3_req_cost = req_prices['get']*((out_ratio*num_jobs)/10000.0)
     # S3 download transfer
-    xfer_per_gb = get_s3_costs(av_zone, 'xfer')
+    xfer_per_gb = get_s3_costs(av_zone, 'xfer', price_time, catalog)
     s3_xfer_cost = xfer_per_gb*(num_jobs*out_gb)
 
     # Sum of storage, transfer, and requests
@@ -150,7 +157,7 @@ def calc_s3_model_costs(run_time, wait_time, node_cost, first_iter_time,
 
     ### Get computation costs ###
     # Add in master node costs - asssumed to be on-demand, t2.small
-    master_on_demand = get_ec2_costs(av_zone, 'master')
+    master_on_demand = get_ec2_costs(av_zone, 'master', price_time, catalog)
     master_cost = master_on_demand*np.ceil(master_up_time/3600.0)
     # Get cumulative cost for running N nodes per iteration
     nodes_cost = node_cost*num_nodes
@@ -174,7 +181,8 @@ def calc_s3_model_costs(run_time, wait_time, node_cost, first_iter_time,
 # Calculate costs with the EBS model
 def calc_ebs_model_costs(run_time, wait_time, node_cost, first_iter_time,
                          num_jobs, num_nodes, jobs_per, av_zone,
-                         in_gb, out_gb, out_gb_dl, up_rate, down_rate):
+                         in_gb, out_gb, out_gb_dl, up_rate, down_rate,
+                         price_time=None, catalog=None):
     '''
     Function to take results from the simulate_market function and
     calculate total costs and runtimes with data transfer and storage
@@ -211,6 +219,12 @@ def calc_ebs_model_costs(run_time, wait_time, node_cost, first_iter_time,
         the average upload rate to transfer data to EC2 (in Mb/s)
     down_rate : float
         the average download rate to transfer data from EC2 (in Mb/s)
+    price_time : integer (optional), default=None
+        the time, in epoch seconds, to use the AWS prices of; if not
+        specified, the latest prices in the catalog are used
+    catalog : dictionary (optional), default=None
+        the pricing catalog from pricing_catalog.load_catalog; the
+        default catalog is used if not specified
 
     Returns
     -------
@@ -272,7 +286,7 @@ def calc_ebs_model_costs(run_time, wait_time, node_cost, first_iter_time,
     xfer_down_time = xfer_down_time_n1 + residual_jobs*(out_gb_dl/down_gb_per_sec)
 
     ### Get EBS storage costs ###
-    ebs_ssd = get_ec2_costs(av_zone, 'ssd')
+    ebs_ssd = get_ec2_costs(av_zone, 'ssd', price_time, catalog)
     ebs_nfs_gb = num_jobs*(in_gb+out_gb)
 
     # Get GB-months
@@ -284,7 +298,7 @@ def calc_ebs_model_costs(run_time, wait_time, node_cost, first_iter_time,
 
     ### Get computation costs ###
     # Add in master node costs - asssumed to be on-demand, t2.small
-    master_on_demand = get_ec2_costs(av_zone, 'master')
+    master_on_demand = get_ec2_costs(av_zone, 'master', price_time, catalog)
     master_cost = master_on_demand*np.ceil(master_up_time/3600.0)
     # Get cumulative cost for running N nodes per iteration
     nodes_cost = node_cost*num_nodes
@@ -292,7 +306,7 @@ def calc_ebs_model_costs(run_time, wait_time, node_cost, first_iter_time,
     instance_cost = master_cost + nodes_cost
 
     ### Data transfer costs ###
-    ec2_xfer_out = get_ec2_costs(av_zone, 'xfer')
+    ec2_xfer_out = get_ec2_costs(av_zone, 'xfer', price_time, catalog)
     xfer_cost = ec2_xfer_out*(num_jobs*out_gb_dl)
 
     ### Total cost ###
@@ -306,25 +320,236 @@ def calc_ebs_model_costs(run_time, wait_time, node_cost, first_iter_time,
            xfer_up_time, xfer_down_time
 
 
+# Calculate costs with the S3 model for arrays of simulation results
+def calc_s3_model_costs_batch(run_time, wait_time, node_cost, first_iter_time,
+                              num_jobs, num_nodes, jobs_per, av_zone,
+                              in_gb, out_gb, up_rate, down_rate,
+                              price_time=None, catalog=None):
+    '''
+    Function to take results from the simulate_market_batch function
+    and calculate total costs and runtimes for the S3-based storage
+    model; this is the array version of calc_s3_model_costs and every
+    parameter may be a scalar or an array (or DataFrame column)
+
+    Parameters
+    ----------
+    See calc_s3_model_costs
+
+    Returns
+    -------
+    Every return value of calc_s3_model_costs as a numpy.ndarray
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Relative imports
+    from pricing_catalog import lookup_prices
+
+    # Init variables
+    run_time, wait_time, node_cost, first_iter_time, num_jobs, num_nodes, \
+    jobs_per, in_gb, out_gb, up_rate, down_rate = \
+        np.broadcast_arrays(*[np.asarray(arg, dtype='float64') for arg in \
+                              [run_time, wait_time, node_cost,
+                               first_iter_time, num_jobs, num_nodes,
+                               jobs_per, in_gb, out_gb, up_rate,
+                               down_rate]])
+    av_zone = np.broadcast_to(np.asarray(av_zone), run_time.shape)
+    cpac_ami_gb = 30
+    secs_per_avg_month = (365/12.0)*24*3600
+    num_iter = np.ceil(num_jobs/(jobs_per*num_nodes))
+    # Upload speed from instance to S3 (mbps/8 bits/1000 MB in 1 GB)
+    upl_to_s3_gbps = 100/8.0/1000.0
+
+    # Get total execution time as sum of running and waiting times
+    exec_time = run_time + wait_time
+
+    ### Master runtime + storage time (EBS) + xfer time ###
+    up_gb_per_sec = up_rate/8.0/1000.0
+    xfer_up_time = num_jobs*(in_gb/up_gb_per_sec)
+
+    # Get the number of jobs ran through n-1 iterations
+    num_jobs_n1 = ((num_iter-1)*num_nodes*jobs_per)
+    s3_upl_time_n1 = num_jobs_n1*(out_gb/upl_to_s3_gbps)
+    exec_time_n1 = exec_time - first_iter_time
+    residual_jobs = num_jobs - num_jobs_n1
+
+    # End of upload of master node
+    master_up_time = xfer_up_time + \
+                     first_iter_time + \
+                     np.maximum(exec_time_n1, s3_upl_time_n1) + \
+                     residual_jobs*(out_gb/upl_to_s3_gbps)
+
+    # Get total transfer up time
+    s3_upl_time = s3_upl_time_n1 + residual_jobs*(out_gb/upl_to_s3_gbps)
+
+    ### Get EBS storage costs ###
+    ebs_ssd = lookup_prices('ebs_ssd', av_zone, price_time, catalog)
+    ebs_nfs_gb = in_gb*num_jobs + num_nodes*jobs_per*out_gb
+    master_gb_months = (ebs_nfs_gb+cpac_ami_gb)*\
+                       (3600.0*np.ceil(master_up_time/3600.0)/secs_per_avg_month)
+    nodes_gb_months = num_nodes*cpac_ami_gb*\
+                      (3600.0*np.ceil(run_time/3600.0)/secs_per_avg_month)
+    ebs_storage_cost = ebs_ssd*(master_gb_months + nodes_gb_months)
+
+    ### Get S3 storage/xfer/requests costs ###
+    stor_gb_month = lookup_prices('s3_stor', av_zone, price_time, catalog)
+    down_gb_per_sec = down_rate/8.0/1000.0
+    secs_to_download_s3 = (num_jobs*out_gb)/down_gb_per_sec
+    s3_storage_cost = stor_gb_month*\
+                      (secs_to_download_s3/secs_per_avg_month)*\
+                      (num_jobs*out_gb)
+    # S3 download requests, ~50 output files per job
+    out_ratio = 50
+    req_get = lookup_prices('s3_req_get', av_zone, price_time, catalog)
+    s3_req_cost = req_get*((out_ratio*num_jobs)/10000.0)
+    # S3 download transfer
+    xfer_per_gb = lookup_prices('s3_xfer', av_zone, price_time, catalog)
+    s3_xfer_cost = xfer_per_gb*(num_jobs*out_gb)
+
+    # Sum of storage, transfer, and requests
+    s3_cost = s3_storage_cost + s3_req_cost + s3_xfer_cost
+
+    ### Get computation costs ###
+    master_on_demand = lookup_prices('ec2_master', av_zone, price_time, catalog)
+    master_cost = master_on_demand*np.ceil(master_up_time/3600.0)
+    nodes_cost = node_cost*num_nodes
+    instance_cost = master_cost + nodes_cost
+
+    ### Total cost ###
+    total_cost = instance_cost + ebs_storage_cost + s3_cost
+    ### Total time ###
+    total_time = master_up_time + secs_to_download_s3
+
+    # Return data frame columns
+    return total_cost, instance_cost, ebs_storage_cost, s3_cost, \
+           s3_storage_cost, s3_req_cost, s3_xfer_cost, \
+           total_time, run_time, wait_time, \
+           xfer_up_time, s3_upl_time, secs_to_download_s3
+
+
+# Calculate costs with the EBS model for arrays of simulation results
+def calc_ebs_model_costs_batch(run_time, wait_time, node_cost, first_iter_time,
+                               num_jobs, num_nodes, jobs_per, av_zone,
+                               in_gb, out_gb, out_gb_dl, up_rate, down_rate,
+                               price_time=None, catalog=None):
+    '''
+    Function to take results from the simulate_market_batch function
+    and calculate total costs and runtimes for the EBS/EC2 storage
+    model; this is the array version of calc_ebs_model_costs and every
+    parameter may be a scalar or an array (or DataFrame column)
+
+    Parameters
+    ----------
+    See calc_ebs_model_costs
+
+    Returns
+    -------
+    Every return value of calc_ebs_model_costs as a numpy.ndarray
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Relative imports
+    from pricing_catalog import lookup_prices
+
+    # Init variables
+    run_time, wait_time, node_cost, first_iter_time, num_jobs, num_nodes, \
+    jobs_per, in_gb, out_gb, out_gb_dl, up_rate, down_rate = \
+        np.broadcast_arrays(*[np.asarray(arg, dtype='float64') for arg in \
+                              [run_time, wait_time, node_cost,
+                               first_iter_time, num_jobs, num_nodes,
+                               jobs_per, in_gb, out_gb, out_gb_dl, up_rate,
+                               down_rate]])
+    av_zone = np.broadcast_to(np.asarray(av_zone), run_time.shape)
+    cpac_ami_gb = 30
+    secs_per_avg_month = (365/12.0)*24*3600
+    num_iter = np.ceil(num_jobs/(jobs_per*num_nodes))
+
+    # Get total execution time as sum of running and waiting times
+    exec_time = run_time + wait_time
+
+    ### Master runtime + storage time (EBS) + xfer time ###
+    up_gb_per_sec = up_rate/8.0/1000.0
+    down_gb_per_sec = down_rate/8.0/1000.0
+    xfer_up_time = num_jobs*(in_gb/up_gb_per_sec)
+
+    # Get the number of jobs ran through n-1 iterations
+    num_jobs_n1 = ((num_iter-1)*num_nodes*jobs_per)
+    xfer_down_time_n1 = num_jobs_n1*(out_gb_dl/down_gb_per_sec)
+    exec_time_n1 = exec_time - first_iter_time
+    residual_jobs = num_jobs - num_jobs_n1
+
+    # End of download of master node
+    master_up_time = xfer_up_time + \
+                     first_iter_time + \
+                     np.maximum(exec_time_n1, xfer_down_time_n1) + \
+                     residual_jobs*(out_gb_dl/down_gb_per_sec)
+
+    # Get total transfer down time
+    xfer_down_time = xfer_down_time_n1 + residual_jobs*(out_gb_dl/down_gb_per_sec)
+
+    ### Get EBS storage costs ###
+    ebs_ssd = lookup_prices('ebs_ssd', av_zone, price_time, catalog)
+    ebs_nfs_gb = num_jobs*(in_gb+out_gb)
+    master_gb_months = (ebs_nfs_gb+cpac_ami_gb)*\
+            (3600.0*np.ceil(master_up_time/3600.0)/secs_per_avg_month)
+    nodes_gb_months = num_nodes*cpac_ami_gb*\
+            (3600.0*np.ceil(run_time/3600.0)/secs_per_avg_month)
+    storage_cost = ebs_ssd*(master_gb_months + nodes_gb_months)
+
+    ### Get computation costs ###
+    master_on_demand = lookup_prices('ec2_master', av_zone, price_time, catalog)
+    master_cost = master_on_demand*np.ceil(master_up_time/3600.0)
+    nodes_cost = node_cost*num_nodes
+    instance_cost = master_cost + nodes_cost
+
+    ### Data transfer costs ###
+    ec2_xfer_out = lookup_prices('ec2_xfer', av_zone, price_time, catalog)
+    xfer_cost = ec2_xfer_out*(num_jobs*out_gb_dl)
+
+    ### Total cost ###
+    total_cost = instance_cost + storage_cost + xfer_cost
+    ### Total time ###
+    total_time = master_up_time
+
+    # Return data frame columns
+    return total_cost, instance_cost, storage_cost, xfer_cost, \
+           total_time, run_time, wait_time, \
+           xfer_up_time, xfer_down_time
+
+
 # Calculate cost over interval
-def calculate_cost(start_time, uptime_seconds, interp_history,
-                   interrupted=False):
+def calculate_cost(start_time, uptime_seconds, change_times, change_prices,
+                   interrupted=False, billing='hourly', billing_index=None):
     '''
     Function to calculate the runtime spot cost associated with an
-    instance's spot history
+    instance's spot history; the history is treated as a step function
+    so each hourly price is found by binary search over the change points
 
     Parameters
     ----------
-    start_time : datetime.datetime object
-        start time of the spot history to calculate from
+    start_time : integer
+        start time (in epoch seconds) of the spot history to calculate
+        from
     uptime_seconds : float
         the number of seconds that the instance was running for
-    interp_history : pandas.Series object
-        the interpolated (second-resolution) spot history series,
-        where the index is a timestamp and the values are prices
+    change_times : numpy.ndarray
+        sorted epoch-second timestamps where the spot price changed
+    change_prices : numpy.ndarray
+        the spot price set at each of the change_times
     interrupted : boolean (optional), default=False
         indicator of whether the instance was interrupted before
         terminating or not
+    billing : string (optional), default='hourly'
+        the billing mode, supported modes include:
+        'hourly' - pay the price at the start of each started hour, with
+        the last partial hour free if interrupted
+        'second' - pay for each second used at the price in effect
+    billing_index : dictionary (optional), default=None
+        the precomputed billing tables from build_billing_index; if not
+        given, the prices are looked up directly
 
     Returns
     -------
@@ -332,30 +557,245 @@ def calculate_cost(start_time, uptime_seconds, interp_history,
         the total amount of $ that the instance cost
     '''
 
+    # Get the cost as a batch of one interval
+    total_cost = calculate_cost_batch([start_time], [uptime_seconds],
+                                      change_times, change_prices,
+                                      interrupted=interrupted,
+                                      billing=billing,
+                                      billing_index=billing_index)[0]
+
+    # Return the total cost
+    return total_cost
+
+
+# Calculate costs over many intervals at once
+def calculate_cost_batch(start_times, uptime_seconds, change_times,
+                         change_prices, interrupted=False, billing='hourly',
+                         billing_index=None):
+    '''
+    Function to calculate the runtime spot cost of many instance uptime
+    intervals at once; this is the array version of calculate_cost
+
+    Parameters
+    ----------
+    start_times : numpy.ndarray
+        start times (in epoch seconds) of each interval
+    uptime_seconds : numpy.ndarray
+        the number of seconds that the instance was running for in each
+        interval
+    change_times : numpy.ndarray
+        sorted epoch-second timestamps where the spot price changed
+    change_prices : numpy.ndarray
+        the spot price set at each of the change_times
+    interrupted : boolean or numpy.ndarray (optional), default=False
+        indicator(s) of whether the instance was interrupted before
+        terminating or not
+    billing : string (optional), default='hourly'
+        the billing mode, supported modes include:
+        'hourly' - pay the price at the start of each started hour, with
+        the last partial hour free if interrupted
+        'second' - pay for each second used at the price in effect
+    billing_index : dictionary (optional), default=None
+        the precomputed billing tables from build_billing_index; if not
+        given, the prices are looked up directly
+
+    Returns
+    -------
+    total_costs : numpy.ndarray
+        the total amount of $ that the instance cost in each interval
+    '''
+
     # Import packages
     import numpy as np
-    import pandas as pd
-    import datetime
 
     # Init variables
-    pay_periods = np.ceil(uptime_seconds/3600.0)
-    end_time = start_time + datetime.timedelta(seconds=uptime_seconds)
-    hour_seq = pd.date_range(start_time, periods=pay_periods, freq='H')
-    hourly_series = interp_history[hour_seq]
+    start_times = np.asarray(start_times, dtype='int64')
+    uptime_seconds = np.asarray(uptime_seconds, dtype='float64')
+    num_segs = len(start_times)
+
+    # Per-second billing is the integral of the price over the uptime
+    if billing == 'second':
+        if billing_index is None:
+            billing_index = build_billing_index(change_times, change_prices)
+        cum_integral = billing_index['cum_integral']
+        seg_bounds = [start_times, start_times + uptime_seconds]
+        price_secs = []
+        for seg_time in seg_bounds:
+            change_idx = np.searchsorted(change_times, seg_time,
+                                         side='right') - 1
+            price_secs.append(cum_integral[change_idx] + \
+                              change_prices[change_idx]*\
+                              (seg_time - change_times[change_idx]))
+        total_costs = (price_secs[1] - price_secs[0])/3600.0
+        return total_costs
+    elif billing != 'hourly':
+        err_msg = 'billing argument does not support %s' % billing
+        raise Exception(err_msg)
 
-    # Sum up all but last hour price if interrupted
-    total_cost = hourly_series[:-1].sum()
+    # Interrupted intervals don't pay for their last partial hour
+    pay_periods = np.ceil(uptime_seconds/3600.0).astype('int64')
+    interrupted = np.broadcast_to(interrupted, pay_periods.shape)
+    num_hours = np.where(interrupted, np.maximum(pay_periods-1, 0),
+                         pay_periods)
+    total_costs = np.zeros(num_segs)
+    sampled = np.ones(num_segs, dtype='bool')
+
+    # Look up intervals covered by the precomputed billing tables
+    if billing_index is not None:
+        # Intervals restarting where the price came back under bid
+        restart_times = billing_index['restart_times']
+        restart_pos = np.minimum(np.searchsorted(restart_times, start_times),
+                                 max(len(restart_times)-1, 0))
+        if len(restart_times) > 0:
+            from_restart = (restart_times[restart_pos] == start_times) & \
+                           (num_hours <= billing_index['restart_lengths'][restart_pos])
+            restart_offsets = billing_index['restart_offsets'][restart_pos]
+            total_costs[from_restart] = \
+                billing_index['restart_cum'][restart_offsets[from_restart] + \
+                                             num_hours[from_restart]]
+            sampled &= ~from_restart
+
+        # Intervals starting on one of the tabled hour phases
+        phases = billing_index['phases']
+        phase_cum = billing_index['phase_cum']
+        hour_idx, phase = np.divmod(start_times-billing_index['first_time'],
+                                    3600)
+        phase_pos = np.minimum(np.searchsorted(phases, phase),
+                               max(len(phases)-1, 0))
+        if len(phases) > 0:
+            from_phase = sampled & (phases[phase_pos] == phase) & \
+                         (hour_idx >= 0) & \
+                         (hour_idx + num_hours < phase_cum.shape[1])
+            phase_rows = phase_pos[from_phase]
+            total_costs[from_phase] = \
+                phase_cum[phase_rows, hour_idx[from_phase] + \
+                                      num_hours[from_phase]] - \
+                phase_cum[phase_rows, hour_idx[from_phase]]
+            sampled &= ~from_phase
+
+    # Lay out every billed hour of the other intervals in one flat array
+    sampled = np.flatnonzero(sampled)
+    sampled_hours = num_hours[sampled]
+    seg_ids = np.repeat(np.arange(len(sampled)), sampled_hours)
+    hour_offsets = np.arange(sampled_hours.sum()) - \
+                   np.repeat(np.cumsum(sampled_hours)-sampled_hours,
+                             sampled_hours)
+    hour_seq = start_times[sampled][seg_ids] + 3600*hour_offsets
+    hourly_prices = price_at_time(hour_seq, change_times, change_prices)
+
+    # Sum up the hourly prices of each interval
+    total_costs[sampled] = np.bincount(seg_ids, weights=hourly_prices,
+                                       minlength=len(sampled))
+
+    # Return the total costs
+    return total_costs
+
+
+# Precompute hourly billing tables for a spot history
+def build_billing_index(change_times, change_prices, start_times=None,
+                        crossing_index=None):
+    '''
+    Function to precompute cumulative sums of the hourly spot price
+    samples so that an interval's hourly charge is a difference of two
+    array lookups; tables are built for every hour phase of the
+    simulation start times (spanning the whole history) and, given the
+    bid crossing index, for every point the price comes back under the
+    bid (spanning up to its next interrupt), so their total size is on
+    the order of the number of hours plus the number of price changes.
+    The cumulative price integral for per-second billing is also stored
 
-    # If the user ran residual time without interrupt after last hour
-    if not interrupted:
-        total_cost += hourly_series[-1]
+    Parameters
+    ----------
+    change_times : numpy.ndarray
+        sorted epoch-second timestamps where the spot price changed
+    change_prices : numpy.ndarray
+        the spot price set at each of the change_times
+    start_times : numpy.ndarray (optional), default=None
+        the simulation start times (in epoch seconds) whose hour phases
+        should be tabled
+    crossing_index : tuple (optional), default=None
+        the (next_above, next_below) arrays from build_crossing_index;
+        if given, the restart points for that bid are tabled
 
-    # Return the total cost
-    return total_cost
+    Returns
+    -------
+    billing_index : dictionary
+        the billing tables, keyed by 'first_time', 'cum_integral',
+        'phases', 'phase_cum', 'restart_times', 'restart_lengths',
+        'restart_offsets' and 'restart_cum'
+    '''
 
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    num_changes = len(change_times)
+    first_time = change_times[0]
+    num_hours = (change_times[-1]-first_time)//3600 + 1
 
-# Lookup tables for pricing for EBS
-def get_ec2_costs(av_zone, cost_type):
+    # Cumulative price-seconds at each change point
+    cum_integral = np.append(0, np.cumsum(change_prices[:-1]*\
+                                          np.diff(change_times)))
+
+    # Hourly samples across the whole history for each start phase
+    if start_times is None:
+        phases = np.array([], dtype='int64')
+    else:
+        phases = np.unique((np.asarray(start_times)-first_time) % 3600)
+    hour_seq = first_time + phases[:, np.newaxis] + \
+               3600*np.arange(num_hours)[np.newaxis, :]
+    hourly_prices = price_at_time(hour_seq, change_times, change_prices)
+    phase_cum = np.hstack([np.zeros((len(phases), 1)),
+                           np.cumsum(hourly_prices, axis=1)])
+
+    # Hourly samples from each restart point up to its next interrupt
+    if crossing_index is None:
+        restart_idx = np.array([], dtype='int64')
+        restart_end_idx = restart_idx
+    else:
+        next_above, next_below = crossing_index
+        change_idx = np.arange(num_changes)
+        was_above = np.append(True, next_above[:num_changes-1] == \
+                                    change_idx[:-1])
+        restart_idx = change_idx[(next_below[:num_changes] == change_idx) & \
+                                 was_above]
+        restart_end_idx = np.minimum(next_above[restart_idx], num_changes-1)
+    restart_times = change_times[restart_idx]
+    restart_ends = change_times[restart_end_idx]
+    restart_lengths = np.ceil((restart_ends-restart_times)/3600.0)
+    restart_lengths = restart_lengths.astype('int64')
+
+    # Lay the restart tables end to end, each led by a zero
+    restart_offsets = np.cumsum(restart_lengths+1) - (restart_lengths+1)
+    seg_ids = np.repeat(np.arange(len(restart_idx)), restart_lengths)
+    hour_offsets = np.arange(restart_lengths.sum()) - \
+                   np.repeat(np.cumsum(restart_lengths)-restart_lengths,
+                             restart_lengths)
+    hourly_prices = price_at_time(restart_times[seg_ids] + 3600*hour_offsets,
+                                  change_times, change_prices)
+    restart_cum = np.zeros(restart_lengths.sum() + len(restart_idx))
+    cum_prices = np.cumsum(hourly_prices)
+    seg_base = np.append(0, cum_prices)[np.cumsum(restart_lengths) - \
+                                        restart_lengths]
+    restart_cum[restart_offsets[seg_ids] + hour_offsets + 1] = \
+        cum_prices - seg_base[seg_ids]
+
+    # Populate the billing index
+    billing_index = {'first_time' : first_time,
+                     'cum_integral' : cum_integral,
+                     'phases' : phases,
+                     'phase_cum' : phase_cum,
+                     'restart_times' : restart_times,
+                     'restart_lengths' : restart_lengths,
+                     'restart_offsets' : restart_offsets,
+                     'restart_cum' : restart_cum}
+
+    # Return the billing index
+    return billing_index
+
+
+# Look up pricing for EC2 and EBS
+def get_ec2_costs(av_zone, cost_type, price_time=None, catalog=None):
     '''
     Function to retrieve costs associated with using EC2
 
@@ -388,6 +828,12 @@ def get_ec2_costs(av_zone, cost_type):
         'mag' - magnetic EC2 EBS storage
         'xfer' - download from EC2 transfer costs
         'master' - t2.small hourly on-demand cost
+    price_time : integer (optional), default=None
+        the time, in epoch seconds, to get the price at; if not
+        specified, the latest price in the catalog is used
+    catalog : dictionary (optional), default=None
+        the pricing catalog from pricing_catalog.load_catalog; the
+        default catalog (aws_prices.yml) is used if not specified
 
     Returns
     -------
@@ -395,72 +841,28 @@ def get_ec2_costs(av_zone, cost_type):
         the $ amount per unit of the cost type of interest
     '''
 
+    # Relative imports
+    from pricing_catalog import lookup_prices
+
     # Init variables
-    region = av_zone[:-1]
-
-    # EBS general purpose storage
-    ebs_gen_purp = {'us-east-1' : 0.1,
-                    'us-west-1' : 0.12,
-                    'us-west-2' : 0.1,
-                    'eu-west-1' : 0.11,
-                    'eu-central-1' : 0.119,
-                    'ap-southeast-1' : 0.12,
-                    'ap-southeast-2' : 0.12,
-                    'ap-northeast-1' : 0.12,
-                    'sa-east-1' : 0.19}
-
-    # EBS magnetic storage (plus same price per million I/O requests)
-    ebs_mag = {'us-east-1' : 0.05,
-               'us-west-1' : 0.08,
-               'us-west-2' : 0.05,
-               'eu-west-1' : 0.055,
-               'eu-central-1' : 0.059,
-               'ap-southeast-1' : 0.08,
-               'ap-southeast-2' : 0.08,
-               'ap-northeast-1' : 0.08,
-               'sa-east-1' : 0.12}
-
-    # Get costs for downloading data from EC2 (up to 10TB/month), in $/GB
-    ec2_xfer_out = {'us-east-1' : 0.09,
-                    'us-west-1' : 0.09,
-                    'us-west-2' : 0.09,
-                    'eu-west-1' : 0.09,
-                    'eu-central-1' : 0.09,
-                    'ap-southeast-1' : 0.12,
-                    'ap-southeast-2' : 0.14,
-                    'ap-northeast-1' : 0.14,
-                    'sa-east-1' : 0.25}
-
-    # Get $/hour costs of running t2.small master node
-    ec2_t2_small = {'us-east-1' : 0.026,
-                    'us-west-1' : 0.034,
-                    'us-west-2' : 0.026,
-                    'eu-west-1' : 0.028,
-                    'eu-central-1' : 0.030,
-                    'ap-southeast-1' : 0.040,
-                    'ap-southeast-2' : 0.040,
-                    'ap-northeast-1' : 0.040,
-                    'sa-east-1' : 0.054}
+    catalog_types = {'ssd' : 'ebs_ssd',
+                     'mag' : 'ebs_mag',
+                     'xfer' : 'ec2_xfer',
+                     'master' : 'ec2_master'}
 
     # Select costs type
-    if cost_type == 'ssd':
-        ec2_cost = ebs_gen_purp[region]
-    elif cost_type == 'mag':
-        ec2_cost = ebs_mag[region]
-    elif cost_type == 'xfer':
-        ec2_cost = ec2_xfer_out[region]
-    elif cost_type == 'master':
-        ec2_cost = ec2_t2_small[region]
-    else:
+    if cost_type not in catalog_types:
         err_msg = 'cost_type argument does not support %s' % cost_type
         raise Exception(err_msg)
+    ec2_cost = float(lookup_prices(catalog_types[cost_type], av_zone,
+                                   price_time, catalog))
 
     # Return the ec2 cost
     return ec2_cost
 
 
-# Lookup tables for pricing for EBS
-def get_s3_costs(av_zone, cost_type):
+# Look up pricing for S3
+def get_s3_costs(av_zone, cost_type, price_time=None, catalog=None):
     '''
     Data transfer to S3 from anywhere is free (all regions)
     Data transfer from S3 to EC2 in same region is free (all regions)
@@ -474,62 +876,41 @@ def get_s3_costs(av_zone, cost_type):
         'stor' - S3 standard storage per-GB-month
         'xfer' - download from S3 transfer costs
         'req' - bucket key requests cost
+    price_time : integer (optional), default=None
+        the time, in epoch seconds, to get the price at; if not
+        specified, the latest price in the catalog is used
+    catalog : dictionary (optional), default=None
+        the pricing catalog from pricing_catalog.load_catalog; the
+        default catalog (aws_prices.yml) is used if not specified
 
     Returns
     -------
-    s3_price : float
-        the $ amount per unit of the cost type of interest
+    s3_price : float or dictionary
+        the $ amount per unit of the cost type of interest; for 'req'
+        a dictionary of the 'put' ($/1,000) and 'get' ($/10,000)
+        request prices
 
     References
     ----------
     S3 pricing: http://aws.amazon.com/s3/pricing/
     '''
 
+    # Relative imports
+    from pricing_catalog import lookup_prices
+
     # Init variables
-    region = av_zone[:-1]
-
-    # S3 standard storage (up to 1TB/month), units of $/GB-month
-    s3_stor = {'us-east-1' : 0.03,
-               'us-west-1' : 0.033,
-               'us-west-2' : 0.03,
-               'eu-west-1' : 0.03,
-               'eu-central-1' : 0.0324,
-               'ap-southeast-1' : 0.03,
-               'ap-southeast-2' : 0.033,
-               'ap-northeast-1' : 0.033,
-               'sa-east-1' : 0.0408}
-
-    # Get costs for downloading data from S3 (up to 10TB/month), in $/GB
-    s3_xfer_out = {'us-east-1' : 0.09,
-                   'us-west-1' : 0.09,
-                   'us-west-2' : 0.09,
-                   'eu-west-1' : 0.09,
-                   'eu-central-1' : 0.09,
-                   'ap-southeast-1' : 0.12,
-                   'ap-southeast-2' : 0.14,
-                   'ap-northeast-1' : 0.14,
-                   'sa-east-1' : 0.25}
-
-    # Request pricing (put vs get on S3)
-    # Put - $/1,000 reqs (upload)
-    # Get - $/10,000 reqs (download)
-    s3_reqs = {'us-east-1' : {'put' : 0.005, 'get' : 0.004},
-               'us-west-1' : {'put' : 0.0055, 'get' : 0.0044},
-               'us-west-2' : {'put' : 0.005, 'get' : 0.004},
-               'eu-west-1' : {'put' : 0.005, 'get' : 0.004},
-               'eu-central-1' : {'put' : 0.0054, 'get' : 0.0043},
-               'ap-southeast-1' : {'put' : 0.005, 'get' : 0.004},
-               'ap-southeast-2' : {'put' : 0.0055, 'get' : 0.0044},
-               'ap-northeast-1' : {'put' : 0.0047, 'get' : 0.0037},
-               'sa-east-1' : {'put' : 0.007, 'get' : 0.0056}}
+    catalog_types = {'stor' : 's3_stor',
+                     'xfer' : 's3_xfer'}
 
     # Select costs type
-    if cost_type == 'stor':
-        s3_cost = s3_stor[region]
-    elif cost_type == 'xfer':
-        s3_cost = s3_xfer_out[region]
+    if cost_type in catalog_types:
+        s3_cost = float(lookup_prices(catalog_types[cost_type], av_zone,
+                                      price_time, catalog))
     elif cost_type == 'req':
-        s3_cost = s3_reqs[region]
+        s3_cost = {'put' : float(lookup_prices('s3_req_put', av_zone,
+                                               price_time, catalog)),
+                   'get' : float(lookup_prices('s3_req_get', av_zone,
+                                               price_time, catalog))}
     else:
         err_msg = 'cost_type argument does not support %s' % cost_type
         raise Exception(err_msg)
@@ -538,27 +919,211 @@ def get_s3_costs(av_zone, cost_type):
     return s3_cost
 
 
+# Convert a spot history series to its price change points
+def history_to_steps(spot_history):
+    '''
+    Function to convert a spot history series into sorted arrays of the
+    times the price changed and the prices it changed to; the history
+    is a step function, so these arrays fully describe the price at
+    any second without interpolating it to one-second resolution
+
+    Parameters
+    ----------
+    spot_history : pandas.Series
+        time series of spot history prices indexed by timestamp
+
+    Returns
+    -------
+    change_times : numpy.ndarray
+        int64 array of epoch seconds where the spot price changed
+    change_prices : numpy.ndarray
+        float64 array of the spot price set at each of the change_times
+    '''
+
+    # Import packages
+    import numpy as np
+    import pandas as pd
+
+    # Init variables
+    spot_history = spot_history.sort_index()
+    change_times = pd.DatetimeIndex(spot_history.index).asi8 // 10**9
+    change_prices = np.asarray(spot_history.values, dtype='float64')
+
+    # Return the change point arrays
+    return change_times.astype('int64'), change_prices
+
+
+# Look up the spot price at given times
+def price_at_time(times, change_times, change_prices):
+    '''
+    Function to return the spot price in effect at each of the given
+    times by binary searching the price change points
+
+    Parameters
+    ----------
+    times : integer or numpy.ndarray
+        the epoch-second time(s) to get the price at; these should not
+        be earlier than the first change time
+    change_times : numpy.ndarray
+        sorted epoch-second timestamps where the spot price changed
+    change_prices : numpy.ndarray
+        the spot price set at each of the change_times
+
+    Returns
+    -------
+    prices : float or numpy.ndarray
+        the spot price in effect at each of the times
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Find the last change point at or before each time
+    change_idx = np.searchsorted(change_times, times, side='right') - 1
+
+    # Return the prices
+    return change_prices[change_idx]
+
+
+# Get the time-weighted average price of a spot history
+def history_time_average(change_times, change_prices):
+    '''
+    Function to return the average spot price over every second between
+    the first and last change points, inclusive
+
+    Parameters
+    ----------
+    change_times : numpy.ndarray
+        sorted epoch-second timestamps where the spot price changed
+    change_prices : numpy.ndarray
+        the spot price set at each of the change_times
+
+    Returns
+    -------
+    history_avg : float
+        the time-weighted average spot price
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Each price holds until the next change; the last one for a second
+    durations = np.append(np.diff(change_times), 1)
+    history_avg = np.dot(change_prices, durations)/float(durations.sum())
+
+    # Return the average
+    return history_avg
+
+
+# Get the summary statistics of a spot history's prices
+def history_stats(change_prices):
+    '''
+    Function to return the mean, median, and standard deviation of the
+    prices a spot history changed to, without copying a memory-mapped
+    price array into a series
+
+    Parameters
+    ----------
+    change_prices : numpy.ndarray
+        the spot price set at each change point of the history
+
+    Returns
+    -------
+    mean_history : float
+        the mean of the change point prices
+    median_history : float
+        the median of the change point prices
+    stdev_history : float
+        the standard deviation of the change point prices
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    mean_history = float(np.mean(change_prices))
+    median_history = float(np.median(change_prices))
+    stdev_history = float(np.std(change_prices))
+
+    # Return the statistics
+    return mean_history, median_history, stdev_history
+
+
+# Build the bid crossing index for a spot history
+def build_crossing_index(change_prices, bid_price):
+    '''
+    Function to precompute, for every price change point, the index of
+    the next change point at or above the bid (an interrupt) and the
+    next one below the bid (a restart); interrupt and restart lookups
+    in simulate_market then take constant time after a binary search
+
+    Parameters
+    ----------
+    change_prices : numpy.ndarray
+        the spot price set at each price change point
+    bid_price : float
+        the spot bid price in dollars per hour
+
+    Returns
+    -------
+    next_above : numpy.ndarray
+        for each change point, the index of the first change point at or
+        after it whose price is at or above the bid; the array has one
+        extra trailing entry and len(change_prices) marks "never"
+    next_below : numpy.ndarray
+        for each change point, the index of the first change point at or
+        after it whose price is below the bid; same layout as next_above
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    num_changes = len(change_prices)
+    change_idx = np.arange(num_changes+1)
+    above_bid = np.append(change_prices >= bid_price, True)
+    below_bid = np.append(change_prices < bid_price, True)
+
+    # Carry the nearest qualifying index backwards through the history
+    next_above = np.where(above_bid, change_idx, num_changes)
+    next_above = np.minimum.accumulate(next_above[::-1])[::-1]
+    next_below = np.where(below_bid, change_idx, num_changes)
+    next_below = np.minimum.accumulate(next_below[::-1])[::-1]
+
+    # Return the crossing index
+    return next_above, next_below
+
+
 # Find how often a number of jobs fails and its total cost
-def simulate_market(start_time, spot_history, interp_history,
-                    proc_time, num_iter, bid_price):
+def simulate_market(start_time, change_times, change_prices,
+                    proc_time, num_iter, bid_price, crossing_index=None,
+                    billing='hourly', billing_index=None):
     '''
     Function to find the total execution time, cost, and number of interrupts
     for a given job submission and bid price
 
     Parameters
     ----------
-    start_time : pandas.tslib.Timestamp object
-        the time to start the simulation from
-    spot_history : pandas.core.series.Series object
-        timeseries of spot prices recorded from AWS
-    interp_history : pandas.core.series.Series object
-        interpolated spot price history to one second resolution
+    start_time : integer
+        the time (in epoch seconds) to start the simulation from
+    change_times : numpy.ndarray
+        sorted epoch-second timestamps where the spot price changed
+    change_prices : numpy.ndarray
+        the spot price set at each of the change_times
     proc_time : float
          the time to process one job iteration (in seconds)
     num_iter : integer
         the number of job iterations or waves to run
     bid_price : float
         the spot bid price in dollars per hour
+    crossing_index : tuple (optional), default=None
+        the (next_above, next_below) arrays from build_crossing_index
+        for this history and bid price; built on the fly if not given
+    billing : string (optional), default='hourly'
+        the billing mode to pass to calculate_cost, 'hourly' or 'second'
+    billing_index : dictionary (optional), default=None
+        the precomputed billing tables from build_billing_index;
+        if not given, the prices are looked up directly
 
     Returns
     -------
@@ -577,34 +1142,37 @@ def simulate_market(start_time, spot_history, interp_history,
     '''
 
     # Import packages
-    import datetime
     import numpy as np
 
+    # Import local packages
+    import profiling
+
     # Init variables
     total_runtime = 0
     total_wait = 0
     total_cost = 0
     num_interrupts = 0
+    num_changes = len(change_times)
+    last_idx = num_changes - 1
+
+    # Get the bid crossing index, if it wasn't precomputed
+    if crossing_index is None:
+        crossing_index = build_crossing_index(change_prices, bid_price)
+    next_above, next_below = crossing_index
 
-    # Get first spot history start time
-    # Note: np.argmax returns first occurence of True
-    start_idx = np.argmax(spot_history.index >= start_time)
-    spot_history_start = spot_history.index[start_idx]
+    # Get first spot history change point at or after the start time
+    start_idx = np.searchsorted(change_times, start_time, side='left')
 
     # Init remaining rumtime
     remaining_runtime = proc_time*num_iter
 
     # Init 1st iteration time
-    first_iter_flg = False
     first_iter_time = 0
 
     # While there is time left running
     while remaining_runtime > 0:
-        # Get only current spot history
-        curr_spot_history = spot_history[spot_history_start:]
-
         # Get instance-boot-up price (per hour price at start time)
-        start_price = interp_history[start_time]
+        start_price = price_at_time(start_time, change_times, change_prices)
 
         # If start price is greater than bid, interrupt immediately
         if start_price >= bid_price:
@@ -612,18 +1180,15 @@ def simulate_market(start_time, spot_history, interp_history,
             interrupt_time = start_time
         # Otherwise, start instances
         else:
-            # Find interrupts
-            interrupt_condition = curr_spot_history >= bid_price
-
             # Find timestamp where first interrupt occured
-            if np.any(interrupt_condition):
-                interrupt_time = min(curr_spot_history.index[interrupt_condition])
+            interrupt_idx = next_above[start_idx]
+            if interrupt_idx < num_changes:
+                interrupt_time = change_times[interrupt_idx]
             else:
-                interrupt_time = spot_history.index[-1]
+                interrupt_time = change_times[-1]
 
             # Calculate total up-and-running time
-            uptime = interrupt_time - start_time
-            uptime_seconds = uptime.total_seconds()
+            uptime_seconds = float(interrupt_time - start_time)
 
         # See if job completed
         if uptime_seconds > remaining_runtime:
@@ -632,7 +1197,10 @@ def simulate_market(start_time, spot_history, interp_history,
             total_runtime += remaining_runtime
 
             # Add remaining runtime costs
-            total_cost += calculate_cost(start_time, remaining_runtime, interp_history)
+            total_cost += calculate_cost(start_time, remaining_runtime,
+                                         change_times, change_prices,
+                                         billing=billing,
+                                         billing_index=billing_index)
 
             # Clear remaining run time
             remaining_runtime = 0
@@ -648,7 +1216,9 @@ def simulate_market(start_time, spot_history, interp_history,
 
             # Add to cost
             total_cost += calculate_cost(start_time, uptime_seconds,
-                                         interp_history, interrupted=True)
+                                         change_times, change_prices,
+                                         interrupted=True, billing=billing,
+                                         billing_index=billing_index)
 
             # Subtract uptime from remaining runtime
             # Add back remainder of time that was interrupted (need to re-do)
@@ -656,36 +1226,196 @@ def simulate_market(start_time, spot_history, interp_history,
                                 (uptime_seconds % proc_time)
 
             # Find next time the history dips below the bid price
-            curr_spot_history = spot_history[interrupt_time:]
-            start_condition = curr_spot_history < bid_price
-            start_times = curr_spot_history.index[start_condition]
+            interrupt_idx = np.searchsorted(change_times, interrupt_time,
+                                            side='left')
+            restart_idx = next_below[interrupt_idx]
 
             # If we've run out of processing time
-            if len(start_times) == 0 or \
-               start_times[0] == spot_history.index[-1]:
+            if restart_idx >= last_idx:
                 err_msg = 'Job submission could not complete due to too many ' \
                           'interrupts or starting too recently'
                 raise Exception(err_msg)
 
             # Get the next time we can start
-            spot_history_start = min(start_times)
+            start_idx = restart_idx
             # and set as the next spot time
-            start_time = spot_history_start
+            start_time = change_times[start_idx]
 
             # And increment wait time by (next start)-(this interrupt)
-            total_wait += (start_time - interrupt_time).total_seconds()
+            total_wait += float(start_time - interrupt_time)
 
-        # Check to see if we're setting first iter
-        if not first_iter_flg:
-            # If we were up for at least one amount of processing time
-            if total_runtime >= proc_time:
-                first_iter_time = proc_time + total_wait
-                first_iter_flag = True
+        # The first iteration time tracks the latest wait once we have
+        # been up for at least one amount of processing time
+        if total_runtime >= proc_time:
+            first_iter_time = proc_time + total_wait
+
+    # Count the simulation for the profile
+    profiling.add_count('sims_run')
+    profiling.add_count('interrupts_processed', num_interrupts)
 
     # Return results
     return total_runtime, total_wait, total_cost, num_interrupts, first_iter_time
 
 
+# Simulate the market from many start times at once
+def simulate_market_batch(start_times, change_times, change_prices,
+                          proc_time, num_iter, bid_price, crossing_index=None,
+                          billing='hourly', billing_index=None):
+    '''
+    Function to find the total execution time, cost, and number of
+    interrupts for a job submission and bid price started at each of
+    the start times; every start time's state is advanced together
+    until they have all finished or run out of spot history
+
+    Parameters
+    ----------
+    start_times : numpy.ndarray
+        the times (in epoch seconds) to start the simulations from
+    change_times : numpy.ndarray
+        sorted epoch-second timestamps where the spot price changed
+    change_prices : numpy.ndarray
+        the spot price set at each of the change_times
+    proc_time : float
+         the time to process one job iteration (in seconds)
+    num_iter : integer
+        the number of job iterations or waves to run
+    bid_price : float
+        the spot bid price in dollars per hour
+    crossing_index : tuple (optional), default=None
+        the (next_above, next_below) arrays from build_crossing_index
+        for this history and bid price; built on the fly if not given
+    billing : string (optional), default='hourly'
+        the billing mode to pass to calculate_cost, 'hourly' or 'second'
+    billing_index : dictionary (optional), default=None
+        the precomputed billing tables from build_billing_index;
+        built on the fly if not given
+
+    Returns
+    -------
+    total_runtime : numpy.ndarray
+        the total number of seconds all of the nodes were up running
+    total_wait : numpy.ndarray
+        the total number of seconds spent waiting for the spot price
+        to come down below bid
+    total_cost : numpy.ndarray
+        the per-node running, or instance, cost
+    num_interrupts : numpy.ndarray
+        the number of times the job submission was interrupted
+    first_iter_time : numpy.ndarray
+        the number of seconds the first job iteration took to complete;
+        this is used to model when outputs begin downloading from EC2
+    completed : numpy.ndarray
+        boolean mask of the start times whose job submission completed;
+        the other entries are where simulate_market would raise because
+        of too many interrupts or starting too recently
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Import local packages
+    import profiling
+
+    # Init variables
+    start_times = np.array(start_times, dtype='int64')
+    num_sims = len(start_times)
+    num_changes = len(change_times)
+    last_idx = num_changes - 1
+    total_runtime = np.zeros(num_sims)
+    total_wait = np.zeros(num_sims)
+    total_cost = np.zeros(num_sims)
+    num_interrupts = np.zeros(num_sims, dtype='int64')
+    first_iter_time = np.zeros(num_sims)
+    completed = np.zeros(num_sims, dtype='bool')
+
+    # Get the bid crossing index, if it wasn't precomputed
+    if crossing_index is None:
+        crossing_index = build_crossing_index(change_prices, bid_price)
+    next_above, next_below = crossing_index
+
+    # Get the billing tables, if they weren't precomputed
+    if billing_index is None:
+        billing_index = build_billing_index(change_times, change_prices,
+                                            start_times, crossing_index)
+
+    # Get first spot history change point at or after the start times
+    start_idx = np.searchsorted(change_times, start_times, side='left')
+
+    # Init remaining rumtimes and the simulations still running
+    remaining_runtime = np.repeat(float(proc_time*num_iter), num_sims)
+    active = np.arange(num_sims)
+
+    # While there are simulations with time left running
+    while len(active) > 0:
+        curr_start = start_times[active]
+        curr_remaining = remaining_runtime[active]
+
+        # Get instance-boot-up prices; interrupt immediately if over bid
+        start_price = price_at_time(curr_start, change_times, change_prices)
+        interrupt_idx = next_above[start_idx[active]]
+        interrupt_time = np.where(interrupt_idx < num_changes,
+                                  change_times[np.minimum(interrupt_idx,
+                                                          last_idx)],
+                                  change_times[-1])
+        interrupt_time = np.where(start_price >= bid_price,
+                                  curr_start, interrupt_time)
+        uptime_seconds = (interrupt_time - curr_start).astype('float64')
+
+        # See which jobs completed
+        done = uptime_seconds > curr_remaining
+        uptime_seconds = np.where(done, curr_remaining, uptime_seconds)
+
+        # Add up time and costs to execution time
+        total_runtime[active] += uptime_seconds
+        total_cost[active] += calculate_cost_batch(curr_start,
+                                                   uptime_seconds,
+                                                   change_times,
+                                                   change_prices,
+                                                   interrupted=~done,
+                                                   billing=billing,
+                                                   billing_index=billing_index)
+        num_interrupts[active] += (~done) & (uptime_seconds > 0)
+
+        # Subtract uptime from remaining runtime
+        # Add back remainder of time that was interrupted (need to re-do)
+        remaining_runtime[active] = np.where(done, 0,
+                                             (curr_remaining-uptime_seconds) + \
+                                             (uptime_seconds % proc_time))
+
+        # Find next time the history dips below the bid price
+        restart_idx = next_below[np.searchsorted(change_times, interrupt_time,
+                                                 side='left')]
+
+        # Drop the ones which have run out of processing time
+        failed = ~done & (restart_idx >= last_idx)
+        waiting = ~done & ~failed
+        completed[active[done]] = True
+
+        # Get the next time the waiting ones can start
+        wait_sims = active[waiting]
+        start_idx[wait_sims] = restart_idx[waiting]
+        start_times[wait_sims] = change_times[restart_idx[waiting]]
+        total_wait[wait_sims] += start_times[wait_sims] - \
+                                 interrupt_time[waiting]
+
+        # The first iteration time tracks the latest wait once we have
+        # been up for at least one amount of processing time
+        first_sims = active[~failed]
+        first_sims = first_sims[total_runtime[first_sims] >= proc_time]
+        first_iter_time[first_sims] = proc_time + total_wait[first_sims]
+
+        # Keep going with the ones still waiting
+        active = wait_sims
+
+    # Count the simulations for the profile
+    profiling.add_count('sims_run', len(start_times))
+    profiling.add_count('interrupts_processed', num_interrupts.sum())
+
+    # Return results
+    return total_runtime, total_wait, total_cost, num_interrupts, \
+           first_iter_time, completed
+
+
 # Return a time series from csv data frame
 def spothistory_from_dataframe(csv_file, instance_type, product, av_zone):
     '''
@@ -709,14 +1439,19 @@ def spothistory_from_dataframe(csv_file, instance_type, product, av_zone):
     '''
 
     # Import packages
-    import dateutil.parser
+    import os
     import pandas as pd
 
-    # Init variables
+    # Import local packages
+    from spot_history_store import parse_timestamps
+    import profiling
 
     # Load data frame
     print 'Loading dataframe %s...' % csv_file
+    timer = profiling.start_timer('csv_read')
     data_frame = pd.DataFrame.from_csv(csv_file)
+    profiling.stop_timer(timer)
+    profiling.add_count('bytes_read', os.path.getsize(csv_file))
 
     # Get only entries we care about
     df_bool = (data_frame['Instance type'] == instance_type) & \
@@ -724,22 +1459,357 @@ def spothistory_from_dataframe(csv_file, instance_type, product, av_zone):
               (data_frame['Availability zone'] == av_zone)
     df_subset = data_frame[df_bool]
 
-    # Get spot histories from data frame with str timestamps
-    spot_history = df_subset.set_index('Timestamp')['Spot price']
-    spot_history = spot_history.sort_index()
+    # Get spot histories with datetime timestamps
+    timer = profiling.start_timer('timestamp_parse')
+    datetimes = parse_timestamps(df_subset['Timestamp'].values)
+    profiling.stop_timer(timer)
+    spot_history = pd.Series(df_subset['Spot price'].values, datetimes)
 
-    # Get new histories with datetime timestamps
-    datetimes = [dateutil.parser.parse(ts) for ts in spot_history.index]
-    spot_history = pd.Series(spot_history.values, datetimes)
+    # Sort oldest -> newest, keeping the first of any duplicated timestamps
+    spot_history = spot_history.sort_index(kind='mergesort')
+    spot_history = spot_history[~spot_history.index.duplicated()]
 
     # Return time series
     return spot_history
 
 
+# Return the price change points from the binary spot history store
+def spothistory_from_store(store_dir, instance_type, product, av_zone):
+    '''
+    Function to return the price change points of a spot history from
+    the memory-mapped spot history store built by
+    spot_history_store.build_store; the arrays are returned as mapped,
+    so processes reading the same series share its pages
+
+    Parameters
+    ----------
+    store_dir : string
+        base directory of the spot history store
+    instance_type : string
+        the type of instance to gather spot history for
+    product : string
+        the type of OS product to gather spot history for
+    av_zone : string
+        the availability zone to get the pricing info for
+
+    Returns
+    -------
+    change_times : numpy.memmap
+        int64 array of epoch seconds where the spot price changed
+    change_prices : numpy.memmap
+        float64 array of the spot price set at each of the change_times
+    '''
+
+    # Import local packages
+    from spot_history_store import read_series
+    import profiling
+
+    # Open the stored series
+    print 'Loading stored series from %s...' % store_dir
+    timer = profiling.start_timer('store_read')
+    change_times, change_prices = read_series(store_dir, instance_type,
+                                              product, av_zone)
+    profiling.stop_timer(timer)
+    profiling.add_count('bytes_read',
+                        change_times.nbytes + change_prices.nbytes)
+
+    # Return the change points, stored sorted and without duplicates
+    return change_times, change_prices
+
+
+# Load the spot history and its price change points
+def load_spot_history(instance_type, product, av_zone, csv_file=None):
+    '''
+    Function to load the spot price history for a simulation, either
+    from a csv dataframe or the latest history from AWS, along with its
+    price change points
+
+    Parameters
+    ----------
+    instance_type : string
+        type of instance to get spot history for
+    product : string
+        the type of operating system product to get spot history for
+    av_zone : string
+        the AWS EC2 availability zone (sub-region) to get spot history
+        from
+    csv_file : string (optional), default is None
+        the filepath to a csv dataframe to get spot history from, or
+        to a spot history store directory built by spot_history_store;
+        if not specified, the function will just get the most recent 90
+        days worth of spot price history
+
+    Returns
+    -------
+    spot_history : pandas.Series or None
+        time series of spot history prices indexed by timestamp; None
+        if the history was read from a spot history store, whose change
+        points are returned memory mapped instead
+    change_times : numpy.ndarray
+        int64 array of epoch seconds where the spot price changed
+    change_prices : numpy.ndarray
+        float64 array of the spot price set at each of the change_times
+    '''
+
+    # Import packages
+    import os
+    import pandas as pd
+
+    # Import local packages
+    from record_spot_price import return_spot_history
+    from spot_history_store import parse_timestamps
+    import profiling
+
+    # Get the price change points, if we're getting them from the
+    # binary store; these are already sorted step arrays
+    if csv_file and os.path.isdir(csv_file):
+        change_times, change_prices = \
+            spothistory_from_store(csv_file, instance_type, product, av_zone)
+        return None, change_times, change_prices
+
+    # Or if we're getting it from a csv dataframe
+    elif csv_file:
+        # Parse dataframe to form history
+        spot_history = spothistory_from_dataframe(csv_file, instance_type,
+                                                  product, av_zone)
+
+    # Otherwise, just grab latest 90 days
+    else:
+        sh_list = return_spot_history(None, instance_type, product, av_zone)
+
+        # Convert history into just timepoints and prices list of tuples
+        timestamps = parse_timestamps([sh.timestamp for sh in sh_list])
+        prices = [sh.price for sh in sh_list]
+
+        # Use pandas timeseries and sort in oldest -> newest
+        spot_history = pd.Series(prices, timestamps)
+        spot_history = spot_history.sort_index()
+
+        # Write spot history to disk
+        sh_csv = os.path.join(os.getcwd(), 'spot_history.csv')
+        spot_history.to_csv(sh_csv)
+
+    # Get the price change points; the history is a step function so
+    # there is no need to interpolate it to one-second resolution
+    timer = profiling.start_timer('history_steps')
+    change_times, change_prices = history_to_steps(spot_history)
+    profiling.stop_timer(timer)
+
+    # Return the history and its change points
+    return spot_history, change_times, change_prices
+
+
+# Get the filepath prefix of a simulation's results
+def result_prefix(base_dir, params):
+    '''
+    Function to get the filepath prefix, '<info>', of the results of a
+    simulation; simulations on a cluster size other than the one the
+    20-node cap used to give are told apart with a '_<n>-nodes' suffix
+
+    Parameters
+    ----------
+    base_dir : string
+        the availability zone folder the results are saved in
+    params : dictionary
+        the simulation input parameters
+
+    Returns
+    -------
+    out_prefix : string
+        the filepath prefix of the simulation's results
+    '''
+
+    # Import packages
+    import os
+
+    # Import local packages
+    import utils
+
+    # Init variables
+    out_prefix = os.path.join(base_dir, '%s_%d-jobs_%.3f-bid' % \
+                              (params['instance_type'], params['num_jobs'],
+                               params['bid_ratio']))
+
+    # Tell apart cluster sizes the 20-node cap would not have given
+    num_nodes = params.get('num_nodes')
+    if num_nodes is not None and \
+       num_nodes != utils.cluster_size(params['num_jobs'],
+                                       params['jobs_per']):
+        out_prefix += '_%d-nodes' % num_nodes
+
+    # Return the prefix
+    return out_prefix
+
+
+# Find the market outcomes of an earlier run that a longer history keeps
+def reusable_outcomes(base_dir, params, change_times, change_prices,
+                      bid_price, sim_starts):
+    '''
+    Function to load the market outcomes of an earlier simulation with
+    the same parameters whose spot history is a prefix of this one, and
+    find which start times' outcomes can't change with the longer
+    history; these are the ones that completed, provided the bid price
+    is on the same side of every price in the earlier history (runs that
+    failed are the ones that reached the end of the earlier history)
+
+    Parameters
+    ----------
+    base_dir : string
+        the availability zone folder with the earlier results
+    params : dictionary
+        the simulation input parameters, including the history_start,
+        history_end, and history_fingerprint of this run's history
+    change_times : numpy.ndarray
+        sorted epoch-second timestamps where the spot price changed
+    change_prices : numpy.ndarray
+        the spot price set at each of the change_times
+    bid_price : float
+        the spot bid price in dollars per hour for this run's history
+    sim_starts : numpy.ndarray
+        the simulation start times (epoch seconds) of this run
+
+    Returns
+    -------
+    reuse : numpy.ndarray or None
+        boolean mask of the sim_starts whose earlier outcome holds, or
+        None if the earlier results can't be reused
+    outcomes : tuple or None
+        the compute time, wait time, per-node cost, number of interrupts
+        and first iteration time arrays, aligned with sim_starts and
+        filled in where reuse is True
+    reason : string
+        why the earlier results can or can't be reused
+    '''
+
+    # Import packages
+    import numpy as np
+    import os
+    import pandas as pd
+    import yaml
+
+    # Import local packages
+    import sim_cache
+    import utils
+
+    # Init variables
+    out_prefix = result_prefix(base_dir, params)
+    sim_csv = out_prefix + '_sim.csv'
+    params_yml = out_prefix + '_params.yml'
+    history_keys = ['history_start', 'history_end', 'history_fingerprint']
+
+    # Check the earlier run used the same inputs
+    if not (os.path.exists(sim_csv) and os.path.exists(params_yml)):
+        return None, None, 'No earlier results found'
+    old_params = yaml.load(open(params_yml, 'r'))
+    # Results from before cluster sizes were configurable used up to 20
+    if 'num_nodes' not in old_params:
+        old_params['num_nodes'] = \
+            int(utils.cluster_size(old_params['num_jobs'],
+                                   old_params['jobs_per']))
+    if any(key not in old_params for key in history_keys):
+        return None, None, 'Earlier results have no history fingerprint'
+    for key, val in params.items():
+        if key not in history_keys + ['csv_file'] and \
+           old_params.get(key) != val:
+            return None, None, 'Earlier results used a different %s' % key
+
+    # Check its history is a prefix of this one
+    num_old = np.searchsorted(change_times, old_params['history_end'],
+                              side='right')
+    old_times = change_times[:num_old]
+    old_prices = change_prices[:num_old]
+    if num_old == 0 or old_times[0] != old_params['history_start'] or \
+       old_times[-1] != old_params['history_end'] or \
+       sim_cache.fingerprint_arrays([old_times, old_prices]) != \
+       old_params['history_fingerprint']:
+        return None, None, 'Earlier history is not a prefix of this one'
+
+    # Check every bid comparison over the earlier history is unchanged
+    old_bid = params['bid_ratio']*history_time_average(old_times, old_prices)
+    low_bid, high_bid = min(old_bid, bid_price), max(old_bid, bid_price)
+    if np.any((old_prices >= low_bid) & (old_prices < high_bid)):
+        return None, None, 'Bid price moved from $%.3f to $%.3f across ' \
+                           'an earlier spot price' % (old_bid, bid_price)
+
+    # Line the earlier completed start times up with this run's
+    old_df = pd.read_csv(sim_csv, index_col=0, float_precision='round_trip')
+    old_starts = pd.to_datetime(old_df['start_time'], utc=True).values.\
+                 astype('datetime64[s]').astype('int64')
+    start_pos = np.searchsorted(sim_starts, old_starts)
+    start_pos = np.minimum(start_pos, len(sim_starts)-1)
+    if not np.all(sim_starts[start_pos] == old_starts):
+        return None, None, 'Earlier start times do not line up'
+
+    # Fill in the earlier outcomes
+    reuse = np.zeros(len(sim_starts), dtype='bool')
+    reuse[start_pos] = True
+    outcomes = []
+    for col, dtype in [('compute_time', 'float64'), ('wait_time', 'float64'),
+                       ('per_node_cost', 'float64'),
+                       ('num_interrupts', 'int64'),
+                       ('first_iter_time', 'float64')]:
+        outcome = np.zeros(len(sim_starts), dtype=dtype)
+        outcome[start_pos] = old_df[col].values
+        outcomes.append(outcome)
+
+    # Return the reusable outcomes
+    reason = 'Reusing %d of %d start times from earlier results' % \
+             (reuse.sum(), len(sim_starts))
+    return reuse, tuple(outcomes), reason
+
+
+# Save the results of a simulation
+def save_sim_results(base_dir, sim_df, stat_df, params):
+    '''
+    Function to write a simulation's market results, full run stats,
+    quantile sketches of the stats, and parameters to the availability
+    zone's results directory
+
+    Parameters
+    ----------
+    base_dir : string
+        the availability zone folder to save the results in
+    sim_df : pandas.DataFrame
+        the simulation market results dataframe
+    stat_df : pandas.DataFrame
+        the full run stats dataframe
+    params : dictionary
+        the simulation input parameters
+
+    Returns
+    -------
+    None
+        this function saves the results to disk
+    '''
+
+    # Import packages
+    import os
+    import yaml
+
+    # Relative imports
+    from aggregate_results import save_result_sketches
+
+    # Init variables
+    out_prefix = result_prefix(base_dir, params)
+
+    # Write simulation dataframe to disk
+    sim_df.to_csv(out_prefix + '_sim.csv')
+
+    # Write stats dataframe to disk, with its quantile sketches
+    stat_df.to_csv(out_prefix + '_stats.csv')
+    save_result_sketches(out_prefix + '_stats.csv', stat_df, sim_df)
+
+    # Write parameters yaml to disk
+    with open(out_prefix + '_params.yml', 'w') as y_file:
+        y_file.write(yaml.dump(params))
+
+
 # Main routine
 def main(sim_dir, proc_time, num_jobs, jobs_per, in_gb, out_gb, out_gb_dl,
          up_rate, down_rate, bid_ratio, instance_type, av_zone, product,
-         csv_file=None):
+         csv_file=None, history=None, billing='hourly', cache_dir=None,
+         cache_gb=None, incremental=False, profile=False, num_nodes=None,
+         max_nodes=20):
     '''
     Function to calculate spot instance run statistics based on job
     submission parameters; this function will save the statistics and
@@ -779,10 +1849,40 @@ def main(sim_dir, proc_time, num_jobs, jobs_per, in_gb, out_gb, out_gb_dl,
         the filepath to a csv dataframe to get spot history from;
         if not specified, the function will just get the most recent 90
         days worth of spot price history
+    history : tuple (optional), default is None
+        the (spot_history, change_times, change_prices) tuple returned
+        by load_spot_history; pass this in to share one loaded history
+        across several simulations, otherwise it is loaded here
+    billing : string (optional), default is 'hourly'
+        the instance billing mode, 'hourly' (hour-rounded, with the last
+        partial hour free if interrupted) or 'second' (per-second)
+    cache_dir : string (optional), default is None
+        base directory of a simulation result cache (see sim_cache.py);
+        if specified, results are reused whenever every input, the spot
+        history, and the AWS prices match an earlier simulation, instead
+        of whenever the sim csv file exists
+    cache_gb : float (optional), default is None
+        the most GB of results to keep in the cache, evicting the least
+        recently used; no limit if not specified
+    incremental : boolean (optional), default is False
+        flag to extend earlier results for these parameters when the
+        spot history has grown, re-simulating only the new start times
+        and the ones whose outcome the new history can change; the
+        results are the same as a full run
+    profile : boolean (optional), default is False
+        flag to time each stage of the simulation and count the
+        simulations, interrupts, rows written, and bytes read, saving
+        them as './<info>_profile.yml' next to the parameters yaml
+    num_nodes : integer (optional), default is None
+        the number of nodes to run the jobs on; as many as are needed to
+        run every job at once, up to max_nodes, if not specified
+    max_nodes : integer (optional), default is 20
+        the most nodes that may run at once in the availability zone
 
     Returns
     -------
-    spot_history : pd.DataFrame object
+    spot_history : pd.DataFrame object or None
+        None if the history was read from a spot history store;
         in addition to saving this as './spot_history.csv' the
         dataframe can also be returned as an object in memory
     stat_df : pd.DataFrame object
@@ -791,20 +1891,35 @@ def main(sim_dir, proc_time, num_jobs, jobs_per, in_gb, out_gb, out_gb_dl,
     '''
 
     # Import packages
-    import dateutil
     import logging
     import numpy as np
     import os
     import pandas as pd
-    import yaml
 
     # Import local packages
+    import market_outcomes
+    import profiling
+    import sim_cache
     import utils
-    from record_spot_price import return_spot_history
 
     # Init variables
     proc_time *= 60.0
-    num_nodes = min(np.ceil(float(num_jobs)/jobs_per), 20)
+    num_nodes = utils.cluster_size(num_jobs, jobs_per, max_nodes, num_nodes)
+    params = {'proc_time' : proc_time,
+              'num_jobs' : num_jobs,
+              'jobs_per' : jobs_per,
+              'in_gb' : in_gb,
+              'out_gb' : out_gb,
+              'out_gb_dl' : out_gb_dl,
+              'up_rate' : up_rate,
+              'down_rate' : down_rate,
+              'bid_ratio' : bid_ratio,
+              'instance_type' : instance_type,
+              'av_zone' : av_zone,
+              'product' : product,
+              'csv_file' : csv_file,
+              'billing' : billing,
+              'num_nodes' : int(num_nodes)}
 
     # Init simulation market results dataframe
     sim_df_cols = ['start_time', 'spot_hist_csv', 'proc_time', 'num_datasets',
@@ -812,13 +1927,11 @@ def main(sim_dir, proc_time, num_jobs, jobs_per, in_gb, out_gb, out_gb_dl,
                    'median_history', 'mean_history', 'stdev_history',
                    'compute_time', 'wait_time', 'per_node_cost',
                    'num_interrupts', 'first_iter_time']
-    sim_df = pd.DataFrame(columns=sim_df_cols)
 
     # Init full run stats data frame
     stat_df_cols = ['Total cost', 'Instance cost', 'Storage cost', 'Tranfer cost',
                     'Total time', 'Run time', 'Wait time',
                     'Upload time', 'Download time']
-    stat_df = pd.DataFrame(columns=stat_df_cols)
 
     # Set up logger
     base_dir = os.path.join(sim_dir, av_zone)
@@ -827,177 +1940,274 @@ def main(sim_dir, proc_time, num_jobs, jobs_per, in_gb, out_gb, out_gb_dl,
             os.makedirs(base_dir)
         except OSError as exc:
             print 'Found av zone directory %s, continuing...' % av_zone
-    log_path = os.path.join(base_dir, '%s_%d-jobs_%.3f-bid.log' % \
-                            (instance_type, num_jobs, bid_ratio))
+    out_prefix = result_prefix(base_dir, params)
+    log_path = out_prefix + '.log'
     stat_log = utils.setup_logger('stat_log', log_path, logging.INFO, to_screen=True)
 
-    # Check to see if simulation was already run (sim csv file exists)
-    sim_csv = os.path.join(base_dir, '%s_%d-jobs_%.3f-bid_sim.csv' % \
-                           (instance_type, num_jobs, bid_ratio))
-    if os.path.exists(sim_csv):
+    # Check to see if simulation was already run (sim csv file exists),
+    # the result cache is checked instead once the history is loaded
+    sim_csv = out_prefix + '_sim.csv'
+    if cache_dir is None and not incremental and os.path.exists(sim_csv):
         stat_log.info('Simulation file %s already exists, skipping...' % sim_csv)
         return
 
-    # Calculate number of iterations given run configuration
-    # Round up and assume that we're waiting for all jobs to finish
-    # before terminating nodes
-    num_iter = np.ceil(num_jobs/float((jobs_per*num_nodes)))
-    stat_log.info('With %d jobs, %d nodes, and %d jobs running per node...\n' \
-                  'job iterations: %d' % (num_jobs, num_nodes, jobs_per, num_iter))
-
-    # Get spot price history, if we're getting it from a csv dataframe
-    if csv_file:
-        # Parse dataframe to form history
-        spot_history = spothistory_from_dataframe(csv_file, instance_type,
-                                                  product, av_zone)
-        # Get rid of any duplicated timestamps
-        spot_history = spot_history.groupby(spot_history.index).first()
-
-    # Otherwise, just grab latest 90 days
-    else:
-        sh_list = return_spot_history(None, instance_type, product, av_zone)
-
-        # Convert history into just timepoints and prices list of tuples
-        timestamps = [dateutil.parser.parse(sh.timestamp) for sh in sh_list]
-        prices = [sh.price for sh in sh_list]
-
-        # Use pandas timeseries and sort in oldest -> newest
-        spot_history = pd.Series(prices, timestamps)
-        spot_history = spot_history.sort_index()
-
-        # Write spot history to disk
-        sh_csv = os.path.join(os.getcwd(), 'spot_history.csv')
-        spot_history.to_csv(sh_csv)
-
-    # Get interpolated times per second (forward fill)
-    interp_seq = pd.date_range(spot_history.index[0], spot_history.index[-1],
-                               freq='S')
-    interp_history = spot_history.reindex(interp_seq)
-    interp_history = interp_history.fillna(method='ffill')
-
-    # Init simulation time series
-    sim_seq = pd.date_range(interp_seq[0], interp_seq[-1], freq='20T')
-    sim_series = interp_history[sim_seq]
-
-    # Init loop variables
-    sim_idx = 0
-    sim_length = len(sim_series)
-    beg_time = spot_history.index[0]
-    end_time = spot_history.index[-1]
-    time_needed = num_iter*(proc_time)
-
-    # Get bid price
-    spot_history_avg = interp_history.mean()
-    bid_price = bid_ratio*spot_history_avg
-    stat_log.info('Spot history average is $%.3f, bid ratio of %.3fx sets ' \
-                  'bid to $%.3f' % (spot_history_avg, bid_ratio, bid_price))
-
-    # Iterate through the interpolated timeseries
-    for start_time, start_price in sim_series.iteritems():
-        # First see if there's enough time to run jobs
-        time_window = (end_time-start_time).total_seconds()
-        if time_needed > time_window:
-            stat_log.info('Total runtime exceeds time window, ending simulation...')
-
-        # Simulate running job and get stats from that start time
-        try:
-            run_time, wait_time, pernode_cost, num_interrupts, first_iter_time = \
-                    simulate_market(start_time, spot_history, interp_history,
-                                    proc_time, num_iter, bid_price)
-        except Exception as exc:
-            stat_log.info('Could not run full simulation because of:\n%s' % exc)
-            continue
-
-        # Write simulate market output to dataframe
-        sim_df.loc[sim_idx] = [start_time, csv_file, proc_time, num_jobs,
-                               jobs_per, num_iter, bid_ratio, bid_price,
-                               np.mean(spot_history), np.median(spot_history),
-                               np.std(spot_history), run_time, wait_time,
-                               pernode_cost, num_interrupts, first_iter_time]
-
-        # Get complete time and costs from spot market simulation parameters
-        total_cost, instance_cost, stor_cost, xfer_cost, \
-        total_time, run_time, wait_time, \
-        xfer_up_time, xfer_down_time = \
-                calc_ebs_model_costs(run_time, wait_time, pernode_cost,
-                                     first_iter_time, num_jobs, num_nodes,
-                                     jobs_per, av_zone, in_gb, out_gb,
-                                     out_gb_dl, up_rate, down_rate)
-
-        # Add to output dataframe
-        stat_df.loc[sim_idx] = [total_cost, instance_cost, stor_cost, xfer_cost,
-                                total_time/60.0, run_time/60.0, wait_time/60.0,
-                                xfer_up_time/60.0, xfer_down_time/60.0]
-
-        # Print stats
-        stat_log.info('Total cost: $%.3f' % total_cost)
-        stat_log.info('Total time (minutes): %.3f' % (total_time/60.0))
-        stat_log.info('run time (minutes): %.3f' % (run_time/60.0))
-        stat_log.info('per-node cost: $%.3f' % pernode_cost)
-        stat_log.info('number of interrupts: %d' % num_interrupts)
-        stat_log.info('wait time (minutes): %.3f' % (wait_time/60.0))
-
-        sim_idx += 1
-        utils.print_loop_status(sim_idx, sim_length)
-
-    # Add configuration parameters to dataframe
-    sim_df['av_zone'] = av_zone
-    sim_df['in_gb'] = in_gb
-    sim_df['out_gb'] = out_gb
-    sim_df['out_gb_dl'] = out_gb_dl
-    sim_df['up_rate'] = up_rate
-    sim_df['down_rate'] = down_rate
-
-    # Write simulation dataframe to disk
-    sim_df.to_csv(sim_csv)
-
-    # Write stats dataframe to disk
-    stat_csv = os.path.join(base_dir, '%s_%d-jobs_%.3f-bid_stats.csv' % \
-                           (instance_type, num_jobs, bid_ratio))
-    stat_df.to_csv(stat_csv)
+    # Start profiling the simulation, if asked
+    profile_yml = sim_csv[:-len('_sim.csv')] + '_profile.yml'
+    if profile:
+        profiling.enable_profiling()
+    main_timer = profiling.start_timer('main')
 
-    # Write parameters yaml to disk
-    params_yml = os.path.join(base_dir, '%s_%d-jobs_%.3f-bid_params.yml' % \
-                              (instance_type, num_jobs, bid_ratio))
-
-    params = {'proc_time' : proc_time,
-              'num_jobs' : num_jobs,
-              'jobs_per' : jobs_per,
-              'in_gb' : in_gb,
-              'out_gb' : out_gb,
-              'out_gb_dl' : out_gb_dl,
-              'up_rate' : up_rate,
-              'down_rate' : down_rate,
-              'bid_ratio' : bid_ratio,
-              'instance_type' : instance_type,
-              'av_zone' : av_zone,
-              'product' : product,
-              'csv_file' : csv_file}
-
-    with open(params_yml, 'w') as y_file:
-        y_file.write(yaml.dump(params))
-
-    # Give simulation-wide statistics
-    interrupt_avg = sim_df['num_interrupts'].mean()
-    time_avg = stat_df['Total time'].mean()
-    cost_avg = stat_df['Total cost'].mean()
-
-    # Print simulation statistics
-    stat_log.info('\n' + 72*'-')
-    stat_log.info('Submission of %d job iterations, ' \
-                  'each takes %.3f mins to run:' % (num_iter, proc_time/60.0))
-    stat_log.info('Average spot history price for %s in %s\n' \
-                  'between %s and %s is: $%.3f' % \
-                  (instance_type, av_zone, beg_time, end_time, spot_history_avg))
-    stat_log.info('Spot ratio of %.3fx the average price set bid to $%.3f' % \
-                  (bid_ratio, bid_price))
-    stat_log.info('Average total time (mins): %f' % time_avg)
-    stat_log.info('Average total cost: $%.3f' % cost_avg)
-    stat_log.info('Average number of interruptions: %.3f' % interrupt_avg)
-    stat_log.info(72*'-' + '\n')
-
-    # Return dataframes
-    return spot_history, sim_df, stat_df
+    try:
+        # Calculate number of iterations given run configuration
+        # Round up and assume that we're waiting for all jobs to finish
+        # before terminating nodes
+        num_iter = np.ceil(num_jobs/float((jobs_per*num_nodes)))
+        stat_log.info('With %d jobs, %d nodes, and %d jobs running per ' \
+                      'node...\njob iterations: %d' % \
+                      (num_jobs, num_nodes, jobs_per, num_iter))
+
+        # Load the spot history, unless it was already loaded by the caller
+        if history is None:
+            timer = profiling.start_timer('load_history')
+            history = load_spot_history(instance_type, product, av_zone,
+                                        csv_file)
+            profiling.stop_timer(timer)
+        spot_history, change_times, change_prices = history
+        params['history_start'] = int(change_times[0])
+        params['history_end'] = int(change_times[-1])
+        params['history_fingerprint'] = \
+            sim_cache.fingerprint_arrays([change_times, change_prices])
+
+        # Reuse the results of an identical simulation, if cached
+        if cache_dir is not None:
+            sim_key = sim_cache.cache_key(params, change_times, change_prices)
+            cached = sim_cache.cache_get(cache_dir, sim_key)
+            if cached is not None:
+                stat_log.info('Found cached simulation %s, skipping...' % \
+                              sim_key)
+                sim_df, stat_df = cached
+                sim_df['spot_hist_csv'] = csv_file
+                timer = profiling.start_timer('csv_write')
+                save_sim_results(base_dir, sim_df, stat_df, params)
+                profiling.stop_timer(timer)
+                profiling.add_count('rows_written', len(sim_df) + len(stat_df))
+                return spot_history, sim_df, stat_df
+
+        # Init simulation start times every 20 minutes
+        sim_starts = np.arange(change_times[0], change_times[-1]+1, 20*60)
+
+        # Init loop variables
+        sim_idx = 0
+        sim_length = len(sim_starts)
+        beg_time = pd.to_datetime(int(change_times[0]), unit='s', utc=True)
+        end_time = pd.to_datetime(int(change_times[-1]), unit='s', utc=True)
+        time_needed = num_iter*(proc_time)
+
+        # History statistics are the same for every start time
+        mean_history, median_history, stdev_history = \
+            history_stats(change_prices)
+
+        # Get bid price
+        spot_history_avg = history_time_average(change_times, change_prices)
+        bid_price = bid_ratio*spot_history_avg
+        stat_log.info('Spot history average is $%.3f, bid ratio of %.3fx ' \
+                      'sets bid to $%.3f' % \
+                      (spot_history_avg, bid_ratio, bid_price))
+
+        # Precompute when the history crosses the bid
+        crossing_index = build_crossing_index(change_prices, bid_price)
+
+        # Reuse the market outcomes of a simulation with the same number of
+        # job iterations over the same history, if there is one
+        outcome_npz = market_outcomes.outcome_path(base_dir, instance_type,
+                                                   num_iter, proc_time,
+                                                   bid_ratio, billing)
+        timer = profiling.start_timer('outcome_read')
+        outcome_dict = \
+            market_outcomes.load_outcomes(outcome_npz,
+                                          params['history_fingerprint'],
+                                          product)
+        profiling.stop_timer(timer)
+        if outcome_dict is not None:
+            stat_log.info('Found market outcomes %s, skipping market ' \
+                          'simulation...' % outcome_npz)
+            run_times, wait_times, pernode_costs, interrupts, \
+            first_iter_times, completed = [outcome_dict[key] for key in \
+                         ['compute_time', 'wait_time', 'per_node_cost',
+                          'num_interrupts', 'first_iter_time', 'completed']]
+        else:
+            # Reuse earlier outcomes that the longer history can't change
+            timer = profiling.start_timer('simulate_market')
+            reuse = None
+            if incremental:
+                reuse, outcomes, reason = \
+                    reusable_outcomes(base_dir, params, change_times,
+                                      change_prices, bid_price, sim_starts)
+                stat_log.info(reason)
+
+            # Simulate running jobs from every start time at once
+            if reuse is None:
+                run_times, wait_times, pernode_costs, interrupts, \
+                first_iter_times, completed = \
+                    simulate_market_batch(sim_starts, change_times,
+                                          change_prices, proc_time,
+                                          num_iter, bid_price,
+                                          crossing_index=crossing_index,
+                                          billing=billing)
+            # Or only from the start times that weren't reused
+            else:
+                run_times, wait_times, pernode_costs, interrupts, \
+                first_iter_times = outcomes
+                completed = reuse.copy()
+                new_idx = np.flatnonzero(~reuse)
+                new_outcomes = \
+                    simulate_market_batch(sim_starts[new_idx], change_times,
+                                          change_prices, proc_time,
+                                          num_iter, bid_price,
+                                          crossing_index=crossing_index,
+                                          billing=billing)
+                for outcome, new_outcome in zip(outcomes + (completed,),
+                                                new_outcomes):
+                    outcome[new_idx] = new_outcome
+            profiling.stop_timer(timer)
+
+            # Save the market outcomes to re-use or re-cost later
+            timer = profiling.start_timer('outcome_write')
+            market_outcomes.save_outcomes(outcome_npz, sim_starts,
+                                          (run_times, wait_times,
+                                           pernode_costs, interrupts,
+                                           first_iter_times, completed),
+                                          bid_price,
+                                          (mean_history, median_history,
+                                           stdev_history), params)
+            profiling.stop_timer(timer)
+
+        # Get the start time stamps
+        start_times = beg_time + pd.to_timedelta(sim_starts-change_times[0],
+                                                 unit='s')
+
+        # Get complete times and costs from spot market simulation parameters
+        timer = profiling.start_timer('cost_model')
+        total_costs, instance_costs, stor_costs, xfer_costs, \
+        total_times, run_times, wait_times, \
+        xfer_up_times, xfer_down_times = \
+                calc_ebs_model_costs_batch(run_times, wait_times,
+                                           pernode_costs, first_iter_times,
+                                           num_jobs, num_nodes,
+                                           jobs_per, av_zone, in_gb, out_gb,
+                                           out_gb_dl, up_rate, down_rate,
+                                           price_time=sim_starts)
+        profiling.stop_timer(timer)
+
+        # Iterate through the simulation start times
+        timer = profiling.start_timer('logging')
+        for sim_num, start_time in enumerate(start_times):
+            # First see if there's enough time to run jobs
+            time_window = (end_time-start_time).total_seconds()
+            if time_needed > time_window:
+                stat_log.info('Total runtime exceeds time window, ending ' \
+                              'simulation...')
+
+            # Get stats from that start time
+            if not completed[sim_num]:
+                stat_log.info('Could not run full simulation because of:\n' \
+                              'Job submission could not complete due to ' \
+                              'too many interrupts or starting too ' \
+                              'recently')
+                continue
+
+            # Print stats
+            stat_log.info('Total cost: $%.3f' % total_costs[sim_num])
+            stat_log.info('Total time (minutes): %.3f' % \
+                          (total_times[sim_num]/60.0))
+            stat_log.info('run time (minutes): %.3f' % \
+                          (run_times[sim_num]/60.0))
+            stat_log.info('per-node cost: $%.3f' % pernode_costs[sim_num])
+            stat_log.info('number of interrupts: %d' % interrupts[sim_num])
+            stat_log.info('wait time (minutes): %.3f' % \
+                          (wait_times[sim_num]/60.0))
+
+            sim_idx += 1
+            utils.print_loop_status(sim_idx, sim_length)
+        profiling.stop_timer(timer)
+
+        # Build the simulation market results dataframe once
+        timer = profiling.start_timer('build_dataframes')
+        sim_df = pd.DataFrame({'start_time' : start_times[completed],
+                               'spot_hist_csv' : csv_file,
+                               'proc_time' : proc_time,
+                               'num_datasets' : num_jobs,
+                               'jobs_per_node' : jobs_per,
+                               'num_jobs_iter' : num_iter,
+                               'bid_ratio' : bid_ratio,
+                               'bid_price' : bid_price,
+                               'median_history' : median_history,
+                               'mean_history' : mean_history,
+                               'stdev_history' : stdev_history,
+                               'compute_time' : run_times[completed],
+                               'wait_time' : wait_times[completed],
+                               'per_node_cost' : pernode_costs[completed],
+                               'num_interrupts' : interrupts[completed],
+                               'first_iter_time' : \
+                                   first_iter_times[completed]},
+                              columns=sim_df_cols)
+
+        # Build the full run stats dataframe once
+        stat_cols = [total_costs, instance_costs, stor_costs, xfer_costs,
+                     total_times/60.0, run_times/60.0, wait_times/60.0,
+                     xfer_up_times/60.0, xfer_down_times/60.0]
+        stat_df = pd.DataFrame(np.column_stack(stat_cols)[completed],
+                               columns=stat_df_cols)
+
+        # Add configuration parameters to dataframe
+        sim_df['av_zone'] = av_zone
+        sim_df['in_gb'] = in_gb
+        sim_df['out_gb'] = out_gb
+        sim_df['out_gb_dl'] = out_gb_dl
+        sim_df['up_rate'] = up_rate
+        sim_df['down_rate'] = down_rate
+        sim_df['num_nodes'] = num_nodes
+        profiling.stop_timer(timer)
+
+        # Write the simulation, stats, and parameters to disk
+        timer = profiling.start_timer('csv_write')
+        save_sim_results(base_dir, sim_df, stat_df, params)
+        if cache_dir is not None:
+            sim_cache.cache_put(cache_dir, sim_key, sim_df, stat_df,
+                                max_gb=cache_gb)
+        profiling.stop_timer(timer)
+        profiling.add_count('rows_written', len(sim_df) + len(stat_df))
+
+        # Give simulation-wide statistics
+        interrupt_avg = sim_df['num_interrupts'].mean()
+        time_avg = stat_df['Total time'].mean()
+        cost_avg = stat_df['Total cost'].mean()
+
+        # Print simulation statistics
+        stat_log.info('\n' + 72*'-')
+        stat_log.info('Submission of %d job iterations, ' \
+                      'each takes %.3f mins to run:' % \
+                      (num_iter, proc_time/60.0))
+        stat_log.info('Average spot history price for %s in %s\n' \
+                      'between %s and %s is: $%.3f' % \
+                      (instance_type, av_zone, beg_time, end_time,
+                       spot_history_avg))
+        stat_log.info('Spot ratio of %.3fx the average price set bid to ' \
+                      '$%.3f' % (bid_ratio, bid_price))
+        stat_log.info('Average total time (mins): %f' % time_avg)
+        stat_log.info('Average total cost: $%.3f' % cost_avg)
+        stat_log.info('Average number of interruptions: %.3f' % interrupt_avg)
+        stat_log.info(72*'-' + '\n')
+
+        # Return dataframes
+        return spot_history, sim_df, stat_df
+    finally:
+        # Save the profile next to the parameters, even if the
+        # simulation failed
+        profiling.stop_timer(main_timer)
+        if profile:
+            profiling.save_profile(profile_yml,
+                                   profiling.disable_profiling())
 
 
 # Make executable
@@ -1005,6 +2215,7 @@ if __name__ == '__main__':
 
     # Import packages
     import argparse
+    import os
 
     # Init argparser
     parser = argparse.ArgumentParser(description=__doc__)
@@ -1041,6 +2252,19 @@ if __name__ == '__main__':
                              'default is \'Linux/Unix\'')
     parser.add_argument('-c', '--csv_file', nargs=1, required=False, type=str,
                         help='Specify csv dataframe to parse histories')
+    parser.add_argument('-s', '--sim_dir', nargs=1, required=False, type=str,
+                        help='Base directory to store the results in; ' \
+                             'default is the current directory')
+    parser.add_argument('-n', '--num_nodes', nargs=1, required=False,
+                        type=int, help='Number of nodes to run on; default ' \
+                                       'is as many as are needed, up to ' \
+                                       'max_nodes')
+    parser.add_argument('-x', '--max_nodes', nargs=1, required=False,
+                        type=int, help='Most nodes that may run at once; ' \
+                                       'default is 20')
+    parser.add_argument('-bl', '--billing', nargs=1, required=False,
+                        type=str, help='Instance billing mode, \'hourly\' ' \
+                                       '(default) or \'second\'')
 
     # Parse arguments
     args = parser.parse_args()
@@ -1078,8 +2302,16 @@ if __name__ == '__main__':
     except TypeError as exc:
         csv_file = None
         print 'No csv dataframe specified, only using latest history...'
+    try:
+        sim_dir = args.sim_dir[0]
+    except TypeError as exc:
+        sim_dir = os.getcwd()
+        print 'No simulation directory specified, using %s...' % sim_dir
+    num_nodes = args.num_nodes[0] if args.num_nodes else None
+    max_nodes = args.max_nodes[0] if args.max_nodes else 20
+    billing = args.billing[0] if args.billing else 'hourly'
 
     # Call main routine
-    main(proc_time, num_jobs, jobs_per, in_gb, out_gb, out_gb_dl,
+    main(sim_dir, proc_time, num_jobs, jobs_per, in_gb, out_gb, out_gb_dl,
          up_rate, down_rate, bid_ratio, instance_type, av_zone, product,
-         csv_file)
+         csv_file, billing=billing, num_nodes=num_nodes, max_nodes=max_nodes)
@@ -0,0 +1,496 @@
+# synthetic_history.py
+
+'''
+This module generates synthetic spot price histories for an
+availability zone with a block bootstrap of its recorded history, and
+runs the spot market simulation over thousands of them to put Monte
+Carlo confidence intervals on the mean costs and times; the synthetic
+histories can be longer than the recorded one, so long job
+submissions finish instead of running off the end of the data
+
+Usage:
+    python synthetic_history.py -c <config_file> -o <out_dir>
+                                -s <spot_csv> -z <av_zone>
+                                -b <bid_ratio> -j <num_jobs>
+                                [-p <num_paths>] [-d <path_days>]
+                                [-l <block_hours>] [-r <seed>]
+'''
+
+# Fit a block bootstrap model to a spot history
+def fit_block_bootstrap(change_times, change_prices, block_hours=24,
+                        step_hours=None):
+    '''
+    Function to cut a recorded spot history into blocks of price
+    changes that synthetic histories are resampled from
+
+    Parameters
+    ----------
+    change_times : numpy.ndarray
+        sorted epoch-second timestamps where the spot price changed
+    change_prices : numpy.ndarray
+        the spot price set at each of the change_times
+    block_hours : integer (optional), default=24
+        the length of each block; a day keeps the daily price cycle
+        and the price dynamics within a day intact
+    step_hours : integer (optional), default=None
+        the hours between the starts of consecutive blocks; blocks
+        overlap if this is less than block_hours. Defaults to
+        block_hours, so every block starts at the same time of day
+
+    Returns
+    -------
+    model : dictionary
+        the block bootstrap model, with the recorded 'change_times' and
+        'change_prices', the 'block_starts' of each block and the
+        'block_lo' and 'block_hi' indices of the changes inside it,
+        'block_seconds', and the recorded 'origin' and 'span' seconds
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    if step_hours is None:
+        step_hours = block_hours
+    block_seconds = int(block_hours*3600)
+    origin = int(change_times[0])
+    span = int(change_times[-1]) - origin
+    block_starts = np.arange(origin, change_times[-1] - block_seconds + 1,
+                             int(step_hours*3600), dtype='int64')
+    if len(block_starts) == 0:
+        err_msg = 'Spot history is shorter than one %d hour block' % \
+                  block_hours
+        raise Exception(err_msg)
+
+    # Index the changes strictly inside each block; the one before them
+    # sets the price at the start of the block
+    block_lo = np.searchsorted(change_times, block_starts, side='right')
+    block_hi = np.searchsorted(change_times, block_starts + block_seconds,
+                               side='left')
+
+    # Populate the model
+    model = {'change_times' : change_times,
+             'change_prices' : change_prices,
+             'block_starts' : block_starts,
+             'block_lo' : block_lo,
+             'block_hi' : block_hi,
+             'block_seconds' : block_seconds,
+             'origin' : origin,
+             'span' : span}
+
+    # Return the model
+    return model
+
+
+# Generate a batch of synthetic spot histories
+def generate_histories(model, num_paths, path_days, rand_state=None):
+    '''
+    Function to generate a batch of synthetic spot histories by
+    stringing together randomly drawn blocks of the recorded history;
+    the histories are laid end to end on one time axis, each followed
+    by an hour-long barrier priced at infinity, so the whole batch can
+    be passed to the simulation engine at once
+
+    Parameters
+    ----------
+    model : dictionary
+        the block bootstrap model, from fit_block_bootstrap
+    num_paths : integer
+        the number of synthetic histories to generate
+    path_days : float
+        the length of each synthetic history in days, rounded up to a
+        whole number of blocks
+    rand_state : numpy.random.RandomState (optional), default=None
+        the random number generator to draw blocks with; a new unseeded
+        one if None
+
+    Returns
+    -------
+    paths : dictionary
+        the batch, with the 'change_times' and 'change_prices' of every
+        history and barrier, the 'path_starts' and 'path_ends' times
+        of each history on that axis, and the 'path_seconds' of each
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    if rand_state is None:
+        rand_state = np.random.RandomState()
+    block_seconds = model['block_seconds']
+    num_slots = int(np.ceil(path_days*86400.0/block_seconds))
+    path_seconds = num_slots*block_seconds
+    path_starts = model['origin'] + \
+                  np.arange(num_paths, dtype='int64')*(path_seconds + 3600)
+    path_ends = path_starts + path_seconds
+
+    # Draw the blocks of every history
+    choices = rand_state.randint(len(model['block_starts']),
+                                 size=(num_paths, num_slots)).ravel()
+    block_starts = model['block_starts'][choices]
+    block_lo = model['block_lo'][choices]
+    slot_starts = np.repeat(path_starts, num_slots) + \
+                  block_seconds*np.tile(np.arange(num_slots), num_paths)
+
+    # Lay out each block's opening price and changes in one flat array
+    num_points = model['block_hi'][choices] - block_lo + 1
+    point_offsets = np.arange(num_points.sum()) - \
+                    np.repeat(np.cumsum(num_points)-num_points, num_points)
+    src_idx = np.repeat(block_lo - 1, num_points) + point_offsets
+    time_offsets = np.where(point_offsets == 0, 0,
+                            model['change_times'][src_idx] - \
+                            np.repeat(block_starts, num_points))
+    change_times = np.repeat(slot_starts, num_points) + time_offsets
+    change_prices = model['change_prices'][src_idx]
+
+    # Close each history with its barrier
+    path_bounds = np.cumsum(num_points.reshape(num_paths, num_slots).sum(1))
+    change_times = np.insert(change_times, path_bounds, path_ends)
+    change_prices = np.insert(change_prices, path_bounds, np.inf)
+
+    # Populate the batch
+    paths = {'change_times' : change_times.astype('int64'),
+             'change_prices' : change_prices,
+             'path_starts' : path_starts,
+             'path_ends' : path_ends,
+             'path_seconds' : path_seconds}
+
+    # Return the batch
+    return paths
+
+
+# Simulate the market over a batch of synthetic histories
+def simulate_paths(paths, proc_time, num_iter, bid_price, start_seconds,
+                   start_interval=20*60, billing='hourly'):
+    '''
+    Function to simulate a job submission from evenly spaced start
+    times over every history of a batch, in one call to
+    spot_price_model.simulate_market_batch
+
+    Parameters
+    ----------
+    paths : dictionary
+        the batch of synthetic histories, from generate_histories
+    proc_time : float
+        the time to process one job iteration (in seconds)
+    num_iter : integer
+        the number of job iterations or waves to run
+    bid_price : float
+        the spot bid price in dollars per hour
+    start_seconds : integer
+        the length of the window at the beginning of each history to
+        start simulations in
+    start_interval : integer (optional), default=1200
+        the seconds between simulation start times
+    billing : string (optional), default='hourly'
+        the instance billing mode, 'hourly' or 'second'
+
+    Returns
+    -------
+    path_idx : numpy.ndarray
+        the history each simulation was started in
+    start_offsets : numpy.ndarray
+        the seconds from the start of its history each simulation was
+        started at
+    outcomes : tuple
+        the compute time, wait time, per-node cost, number of
+        interrupts, first iteration time, and completed arrays, as from
+        simulate_market_batch; a simulation only completes if it
+        finishes before the end of its own history
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Relative imports
+    from spot_price_model import simulate_market_batch
+
+    # Init variables
+    num_paths = len(paths['path_starts'])
+    start_offsets = np.arange(0, min(start_seconds, paths['path_seconds']),
+                              start_interval, dtype='int64')
+    path_idx = np.repeat(np.arange(num_paths), len(start_offsets))
+    start_offsets = np.tile(start_offsets, num_paths)
+    sim_starts = paths['path_starts'][path_idx] + start_offsets
+
+    # Price the barriers over the bid, so every history is cut off there
+    change_prices = paths['change_prices'].copy()
+    barriers = np.isinf(change_prices)
+    change_prices[barriers] = 2*max(bid_price,
+                                    change_prices[~barriers].max())
+
+    # Simulate every start time of every history at once
+    run_times, wait_times, pernode_costs, interrupts, first_iter_times, \
+    completed = simulate_market_batch(sim_starts, paths['change_times'],
+                                      change_prices, proc_time, num_iter,
+                                      bid_price, billing=billing)
+
+    # Submissions that ran on into the next history didn't complete
+    finish_times = sim_starts + run_times + wait_times
+    completed &= finish_times <= paths['path_ends'][path_idx]
+
+    # Return the outcomes
+    return path_idx, start_offsets, (run_times, wait_times, pernode_costs,
+                                     interrupts, first_iter_times, completed)
+
+
+# Main routine
+def main(sim_dir, proc_time, num_jobs, jobs_per, in_gb, out_gb, out_gb_dl,
+         up_rate, down_rate, bid_ratio, instance_type, av_zone, product,
+         csv_file=None, num_paths=1000, path_days=None, block_hours=24,
+         seed=None, billing='hourly', confidence=0.95, batch_paths=50,
+         history=None, max_nodes=20, num_nodes=None):
+    '''
+    Function to estimate the mean spot instance run statistics of a
+    job submission over many synthetic spot histories, with confidence
+    intervals; this function saves each history's means and the
+    intervals to csvs in the availability zone folder
+
+    Parameters
+    ----------
+    sim_dir : string
+        base directory where to create the availability zone folders
+        for storing the simulation results
+    proc_time : float
+        the number of minutes a single job of interest takes to run
+    num_jobs : integer
+        total number of jobs to run to complete job submission
+    jobs_per : integer
+        the number of jobs to run per node
+    in_gb : float
+        the total amount of input data for a particular job (in GB)
+    out_gb : float
+        the total amount of output data from a particular job (in GB)
+    out_gb_dl : float
+        the total amount of output data to download from EC2 (in GB)
+    up_rate : float
+        the average upload rate to transfer data to EC2 (in Mb/s)
+    down_rate : float
+        the average download rate to transfer data from EC2 (in Mb/s)
+    bid_ratio : float
+        the ratio to average spot history price to set the bid price to
+    instance_type : string
+        type of instance to run the jobs on and to get spot history for
+    av_zone : string
+        the AWS EC2 availability zone (sub-region) to get spot history
+        from
+    product : string
+        the type of operating system product to get spot history for
+    csv_file : string (optional), default=None
+        the filepath to a csv dataframe or history store to get the
+        recorded spot history from
+    num_paths : integer (optional), default=1000
+        the number of synthetic histories to simulate over
+    path_days : float (optional), default=None
+        the length of each synthetic history in days; simulations start
+        over the first (recorded history length) of each, so the rest
+        gives long submissions time to finish. Defaults to twice the
+        recorded history length
+    block_hours : integer (optional), default=24
+        the length of the bootstrapped blocks of recorded history
+    seed : integer (optional), default=None
+        the random seed, for repeatable histories
+    billing : string (optional), default='hourly'
+        the instance billing mode, 'hourly' or 'second'
+    confidence : float (optional), default=0.95
+        the confidence level of the intervals
+    batch_paths : integer (optional), default=50
+        the number of histories to generate and simulate at once
+    history : tuple (optional), default=None
+        the (spot_history, change_times, change_prices) tuple returned
+        by spot_price_model.load_spot_history; loaded here if None
+    max_nodes : integer (optional), default=20
+        the most nodes that may run at once in the availability zone
+    num_nodes : integer (optional), default=None
+        the number of nodes to run on; as many as are needed, up to
+        max_nodes, if None
+
+    Returns
+    -------
+    path_df : pandas.DataFrame
+        the number of completed submissions and the mean costs, times,
+        and interrupts over each synthetic history
+    ci_df : pandas.DataFrame
+        the mean of each statistic over the histories with its
+        confidence interval
+    '''
+
+    # Import packages
+    import numpy as np
+    import os
+    import pandas as pd
+
+    # Relative imports
+    from spot_price_model import calc_ebs_model_costs_batch, \
+                                 history_time_average, load_spot_history, \
+                                 result_prefix
+    import utils
+
+    # Init variables
+    proc_time *= 60.0
+    num_nodes = utils.cluster_size(num_jobs, jobs_per, max_nodes, num_nodes)
+    num_iter = np.ceil(num_jobs/float((jobs_per*num_nodes)))
+    base_dir = os.path.join(sim_dir, av_zone)
+    if not os.path.exists(base_dir):
+        try:
+            os.makedirs(base_dir)
+        except OSError as exc:
+            print 'Found av zone directory %s, continuing...' % av_zone
+    out_prefix = result_prefix(base_dir, {'instance_type' : instance_type,
+                                          'num_jobs' : num_jobs,
+                                          'jobs_per' : jobs_per,
+                                          'bid_ratio' : bid_ratio,
+                                          'num_nodes' : num_nodes})
+    rand_state = np.random.RandomState(seed)
+    path_cols = ['path', 'num_starts', 'num_completed', 'mean_total_cost',
+                 'mean_instance_cost', 'mean_total_time', 'mean_run_time',
+                 'mean_wait_time', 'mean_num_interr']
+    path_rows = []
+
+    # Load the recorded history and fit the bootstrap to it
+    if history is None:
+        history = load_spot_history(instance_type, product, av_zone, csv_file)
+    spot_history, change_times, change_prices = history
+    model = fit_block_bootstrap(change_times, change_prices, block_hours)
+    if path_days is None:
+        path_days = 2*model['span']/86400.0
+    bid_price = bid_ratio*history_time_average(change_times, change_prices)
+
+    # Simulate and cost each batch of histories
+    for batch_start in range(0, num_paths, batch_paths):
+        batch_size = min(batch_paths, num_paths-batch_start)
+        paths = generate_histories(model, batch_size, path_days, rand_state)
+        path_idx, start_offsets, outcomes = \
+            simulate_paths(paths, proc_time, num_iter, bid_price,
+                           model['span'], billing=billing)
+        run_times, wait_times, pernode_costs, interrupts, first_iter_times, \
+        completed = outcomes
+
+        # Cost with the AWS prices of the recorded start times
+        total_costs, instance_costs, stor_costs, xfer_costs, \
+        total_times, run_times, wait_times, \
+        xfer_up_times, xfer_down_times = \
+            calc_ebs_model_costs_batch(run_times, wait_times, pernode_costs,
+                                       first_iter_times, num_jobs, num_nodes,
+                                       jobs_per, av_zone, in_gb, out_gb,
+                                       out_gb_dl, up_rate, down_rate,
+                                       price_time=model['origin'] + \
+                                                  start_offsets)
+
+        # Average the completed submissions of each history
+        path_done = path_idx[completed]
+        num_done = np.bincount(path_done, minlength=batch_size)
+        num_starts = np.bincount(path_idx, minlength=batch_size)
+        path_dict = {'path' : batch_start + np.arange(batch_size),
+                     'num_starts' : num_starts,
+                     'num_completed' : num_done}
+        for stat_name, stat_vals in [('total_cost', total_costs),
+                                     ('instance_cost', instance_costs),
+                                     ('total_time', total_times),
+                                     ('run_time', run_times),
+                                     ('wait_time', wait_times),
+                                     ('num_interr', interrupts)]:
+            stat_sums = np.bincount(path_done, weights=stat_vals[completed],
+                                    minlength=batch_size)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                path_dict['mean_%s' % stat_name] = stat_sums/num_done
+        path_rows.append(pd.DataFrame(path_dict, columns=path_cols))
+        print 'Simulated %d/%d synthetic histories...' % \
+              (batch_start + batch_size, num_paths)
+
+    # Get the confidence intervals of the means over the histories
+    path_df = pd.concat(path_rows, ignore_index=True)
+    path_df['completed_ratio'] = path_df['num_completed'] / \
+                                 path_df['num_starts'].astype('float64')
+    tail_pct = 50.0*(1 - confidence)
+    ci_rows = []
+    for stat_col in [col for col in path_df.columns \
+                     if col.startswith('mean_') or col == 'completed_ratio']:
+        stat_vals = path_df[stat_col].dropna().values
+        if len(stat_vals) == 0:
+            stat_mean, ci_low, ci_high = np.nan, np.nan, np.nan
+        else:
+            stat_mean = np.mean(stat_vals)
+            ci_low, ci_high = np.percentile(stat_vals,
+                                            [tail_pct, 100-tail_pct])
+        ci_rows.append({'statistic' : stat_col, 'mean' : stat_mean,
+                        'ci_low' : ci_low, 'ci_high' : ci_high,
+                        'num_paths' : len(stat_vals)})
+    ci_df = pd.DataFrame(ci_rows, columns=['statistic', 'mean', 'ci_low',
+                                           'ci_high', 'num_paths'])
+    ci_df['confidence'] = confidence
+
+    # Write to disk
+    path_df.to_csv(out_prefix + '_mc-paths.csv')
+    ci_df.to_csv(out_prefix + '_mc-ci.csv')
+    cost_ci = ci_df.set_index('statistic').loc['mean_total_cost']
+    print 'Mean total cost over %d synthetic histories: $%.3f ' \
+          '(%.0f%% CI $%.3f - $%.3f)' % (num_paths, cost_ci['mean'],
+                                          100*confidence, cost_ci['ci_low'],
+                                          cost_ci['ci_high'])
+
+    # Return the dataframes
+    return path_df, ci_df
+
+
+# Make executable
+if __name__ == '__main__':
+
+    # Import packages
+    import argparse
+    import yaml
+
+    # Import local modules
+    import utils
+
+    # Init argparser
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    # Required arguments
+    parser.add_argument('-c', '--config_file', nargs=1, required=True,
+                        type=str, help='Path to AWS sim configuration file')
+    parser.add_argument('-o', '--out_dir', nargs=1, required=True,
+                        type=str, help='Output base directory to store results')
+    parser.add_argument('-s', '--spot_csv', nargs=1, required=True,
+                        type=str, help='Path to spot history csv or store')
+    parser.add_argument('-z', '--av_zone', nargs=1, required=True,
+                        type=str, help='Availability zone to simulate')
+    parser.add_argument('-b', '--bid_ratio', nargs=1, required=True,
+                        type=float, help='Bid ratio to simulate')
+    parser.add_argument('-j', '--num_jobs', nargs=1, required=True,
+                        type=int, help='Number of datasets to simulate')
+
+    # Optional arguments
+    parser.add_argument('-p', '--num_paths', nargs=1, required=False,
+                        type=int, help='Number of synthetic histories; '\
+                                       'default is 1000')
+    parser.add_argument('-d', '--path_days', nargs=1, required=False,
+                        type=float, help='Days in each synthetic history; '\
+                                         'default is twice the recorded')
+    parser.add_argument('-l', '--block_hours', nargs=1, required=False,
+                        type=int, help='Hours in each bootstrapped block; '\
+                                       'default is 24')
+    parser.add_argument('-r', '--seed', nargs=1, required=False,
+                        type=int, help='Random seed')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    # Init variables
+    config_dict = yaml.load(open(args.config_file[0], 'r'))
+    num_paths = args.num_paths[0] if args.num_paths else 1000
+    path_days = args.path_days[0] if args.path_days else None
+    block_hours = args.block_hours[0] if args.block_hours else 24
+    seed = args.seed[0] if args.seed else None
+
+    # Run the Monte Carlo simulation
+    main(args.out_dir[0], config_dict['proc_time'], args.num_jobs[0],
+         config_dict['jobs_per'], config_dict['in_gb'], config_dict['out_gb'],
+         config_dict['out_gb_dl'], config_dict['up_rate'],
+         config_dict['down_rate'], args.bid_ratio[0],
+         config_dict['instance_type'], args.av_zone[0],
+         config_dict['product'], args.spot_csv[0], num_paths, path_days,
+         block_hours, seed,
+         max_nodes=utils.zone_max_nodes(config_dict, args.av_zone[0]),
+         num_nodes=utils.zone_num_nodes(config_dict, args.av_zone[0]))
@@ -0,0 +1,146 @@
+# conftest.py
+
+'''
+This module holds the shared fixtures of the spot model tests: a small
+synthetic spot history, written to a csv dataframe, and a sim config
+for it
+
+Usage:
+    python -m pytest -q tests
+'''
+
+# Import packages
+import os
+import sys
+
+import pytest
+
+# Run the tests against the modules in the folder above
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TEST_DIR))
+
+# Job submission parameters of the test history and config
+PARAMS = {'proc_time' : 45, 'num_jobs' : [20, 60], 'jobs_per' : 3,
+          'in_gb' : 0.05, 'out_gb' : 2.3, 'out_gb_dl' : 2.3, 'up_rate' : 18,
+          'down_rate' : 20, 'bid_ratio' : [0.9, 1.2],
+          'av_zone' : ['us-east-1a'],
+          'instance_type' : 'c3.8xlarge', 'product' : 'Linux/UNIX'}
+
+
+# Write a synthetic spot history csv
+def write_history(csv_file, days, seed):
+    '''
+    Function to write a synthetic spot history in the test zone, with
+    price changes arriving at random and log prices wandering around
+    $0.30 per hour, to a csv dataframe
+
+    Parameters
+    ----------
+    csv_file : string
+        filepath to write the history to
+    days : float
+        the length of the history (in days)
+    seed : integer
+        the random seed of the history
+
+    Returns
+    -------
+    history_df : pandas.DataFrame
+        the synthetic history, one row per price change
+    '''
+
+    # Import packages
+    import numpy as np
+    import pandas as pd
+
+    # Init variables
+    rand_state = np.random.RandomState(seed)
+    start_time = 1420070400 # 2015-01-01 UTC
+    num_changes = max(int(days*24*2.0), 2)
+
+    # Draw the change times as a Poisson process, two an hour
+    gaps = rand_state.exponential(1800.0, num_changes)
+    change_times = start_time + np.floor(np.cumsum(gaps)).astype('int64')
+    change_times = np.unique(change_times)
+
+    # Wander the log price, pulled back towards the base price
+    steps = 0.1*rand_state.standard_normal(len(change_times))
+    log_prices = np.zeros(len(change_times))
+    for change_idx in range(1, len(change_times)):
+        log_prices[change_idx] = 0.95*log_prices[change_idx-1] + \
+                                 steps[change_idx]
+    prices = np.maximum(np.round(0.3*np.exp(log_prices), 4), 0.0001)
+
+    # Format like the recorded histories and write them
+    timestamps = pd.to_datetime(change_times, unit='s')\
+                   .strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    history_df = pd.DataFrame({'Instance type' : PARAMS['instance_type'],
+                               'Product' : PARAMS['product'],
+                               'Region' : PARAMS['av_zone'][0][:-1],
+                               'Availability zone' : PARAMS['av_zone'][0],
+                               'Spot price' : prices,
+                               'Timestamp' : timestamps},
+                              columns=['Instance type', 'Product', 'Region',
+                                       'Availability zone', 'Spot price',
+                                       'Timestamp'])
+    history_df.to_csv(csv_file)
+
+    # Return the history
+    return history_df
+
+
+# Three days of synthetic spot history
+@pytest.fixture(scope='session')
+def history_csv(tmpdir_factory):
+    '''
+    Fixture of the filepath to a three day synthetic history csv
+    '''
+
+    # Write the history once per session
+    csv_file = str(tmpdir_factory.mktemp('history').join('spot_history.csv'))
+    write_history(csv_file, 3, 0)
+
+    # Return the filepath
+    return csv_file
+
+
+# The loaded synthetic spot history
+@pytest.fixture(scope='session')
+def history(history_csv):
+    '''
+    Fixture of the (spot_history, change_times, change_prices) tuple
+    of the synthetic history, as spot_price_model loads it from a csv
+    '''
+
+    # Relative imports
+    from spot_price_model import history_to_steps, \
+                                 spothistory_from_dataframe
+
+    # Load the history
+    spot_history = spothistory_from_dataframe(history_csv,
+                                              PARAMS['instance_type'],
+                                              PARAMS['product'],
+                                              PARAMS['av_zone'][0])
+    change_times, change_prices = history_to_steps(spot_history)
+
+    # Return the history and its price changes
+    return spot_history, change_times, change_prices
+
+
+# A sim config for the synthetic history
+@pytest.fixture
+def config_file(tmpdir):
+    '''
+    Fixture of the filepath to a sim config of the test parameters
+    '''
+
+    # Import packages
+    import yaml
+
+    # Write the config
+    config_file = str(tmpdir.join('test_config.yml'))
+    with open(config_file, 'w') as cfg_file:
+        yaml.dump(PARAMS, cfg_file)
+
+    # Return the filepath
+    return config_file
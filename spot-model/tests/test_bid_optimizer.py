@@ -0,0 +1,132 @@
+# test_bid_optimizer.py
+
+'''
+This module tests the bid search of bid_optimizer against evaluating
+every candidate bid of the spot history
+'''
+
+# Import packages
+import numpy as np
+import pytest
+
+# Relative imports
+from bid_optimizer import candidate_bids, evaluate_bid, optimize_bid
+from conftest import PARAMS
+from spot_price_model import simulate_market_batch
+import utils
+
+
+# Evaluate every candidate bid
+def all_bid_stats(history, num_jobs, time_quantile):
+    '''
+    Function to evaluate every candidate bid over the start times that
+    complete at the highest bid, like optimize_bid does
+    '''
+
+    # Init variables
+    _, change_times, change_prices = history
+    proc_time = PARAMS['proc_time']*60.0
+    num_nodes = utils.cluster_size(num_jobs, PARAMS['jobs_per'])
+    num_iter = np.ceil(num_jobs/float(PARAMS['jobs_per']*num_nodes))
+    cost_args = (num_jobs, num_nodes, PARAMS['jobs_per'],
+                 PARAMS['av_zone'][0], PARAMS['in_gb'], PARAMS['out_gb'],
+                 PARAMS['out_gb_dl'], PARAMS['up_rate'], PARAMS['down_rate'])
+    bids = candidate_bids(change_prices)
+
+    # Keep the start times that complete at the highest bid
+    sim_starts = np.arange(change_times[0], change_times[-1]+1, 20*60)
+    sim_starts = sim_starts[simulate_market_batch(sim_starts, change_times,
+                                                  change_prices, proc_time,
+                                                  num_iter, bids[-1])[-1]]
+
+    # Return the stats of every bid
+    return [evaluate_bid(bid_price, sim_starts, change_times, change_prices,
+                         proc_time, num_iter, cost_args, time_quantile)
+            for bid_price in bids]
+
+
+# Check a bid's stats meet the constraints
+def is_feasible(bid_stats, time_ceiling, min_completed):
+    '''
+    Function to check a bid completes enough submissions within the
+    time ceiling
+    '''
+
+    # Return the check
+    return bid_stats['completed_ratio'] >= min_completed and \
+           (time_ceiling is None or \
+            bid_stats['time_stat'] <= time_ceiling*3600.0)
+
+
+# Search for the best bid
+def search_bid(history, num_jobs, time_ceiling, time_quantile,
+               min_completed):
+    '''
+    Function to run optimize_bid with the test parameters
+    '''
+
+    # Return the best bid and evaluations
+    return optimize_bid(PARAMS['proc_time'], num_jobs, PARAMS['jobs_per'],
+                        PARAMS['in_gb'], PARAMS['out_gb'],
+                        PARAMS['out_gb_dl'], PARAMS['up_rate'],
+                        PARAMS['down_rate'], PARAMS['instance_type'],
+                        PARAMS['av_zone'][0], PARAMS['product'],
+                        time_ceiling=time_ceiling,
+                        time_quantile=time_quantile,
+                        min_completed=min_completed, history=history)
+
+
+# Test the bid search against evaluating every bid
+@pytest.mark.parametrize('num_jobs, time_ceiling, time_quantile, '
+                         'min_completed',
+                         [(20, None, None, 1.0), (60, None, None, 0.9),
+                          (20, 6.0, None, 1.0), (20, 8.0, 0.5, 0.9),
+                          (20, 10.0, 0.5, 0.9)])
+def test_matches_brute_force(history, num_jobs, time_ceiling, time_quantile,
+                             min_completed):
+    '''
+    Test that the bisection finds the lowest bid meeting the time
+    ceiling and that the best bid is the cheapest one evaluated, and,
+    without a ceiling, the cheapest of all of the bids
+    '''
+
+    # Search for the best bid
+    best, eval_df = search_bid(history, num_jobs, time_ceiling,
+                               time_quantile, min_completed)
+
+    # Evaluate every bid
+    bid_stats = all_bid_stats(history, num_jobs, time_quantile)
+    feasible = [stats for stats in bid_stats \
+                if is_feasible(stats, time_ceiling, min_completed)]
+    assert len(feasible) > 0
+
+    # The lowest feasible bid was found
+    eval_feasible = [is_feasible(row, time_ceiling, min_completed) \
+                     for _, row in eval_df.iterrows()]
+    assert eval_df['bid_price'][eval_feasible].min() == \
+           min(stats['bid_price'] for stats in feasible)
+
+    # The best bid is feasible and the cheapest one evaluated
+    assert is_feasible(best, time_ceiling, min_completed)
+    assert best['mean_cost'] == eval_df['mean_cost'][eval_feasible].min()
+    assert np.isclose(best['bid_ratio']*eval_df['bid_price'][0],
+                      best['bid_price']*eval_df['bid_ratio'][0])
+
+    # Without a ceiling, it's the cheapest of every bid
+    if time_ceiling is None:
+        assert best['mean_cost'] == min(stats['mean_cost'] \
+                                        for stats in feasible)
+
+
+# Test a time ceiling no bid can meet
+def test_infeasible_ceiling(history):
+    '''
+    Test that no best bid is returned when no bid meets the ceiling
+    '''
+
+    # Search with too short a time ceiling
+    best, eval_df = search_bid(history, 20, 3.0, 0.5, 0.5)
+
+    # Only the highest bid was evaluated
+    assert best is None
+    assert len(eval_df) == 1
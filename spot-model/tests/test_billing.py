@@ -0,0 +1,177 @@
+# test_billing.py
+
+'''
+This module tests the spot billing of spot_price_model, with and
+without the precomputed billing tables, against billing each interval
+hour by hour and second by second
+'''
+
+# Import packages
+import numpy as np
+import pytest
+
+# Relative imports
+from spot_price_model import build_billing_index, build_crossing_index, \
+                             calculate_cost, calculate_cost_batch
+
+# Bid price to table the restart points for
+BID_PRICE = 0.3
+
+
+# Random uptime intervals over the history
+def random_intervals(change_times, rand_state):
+    '''
+    Function to return start times, uptimes, and interrupted flags of
+    intervals starting on the sim start grid and at the price changes,
+    all ending within the history
+    '''
+
+    # Start on the 20 minute grid and at every price change
+    start_times = np.append(np.arange(change_times[0], change_times[-1],
+                                      1200), change_times[:-1])
+    start_times = start_times.astype('int64')
+
+    # Run for up to a day, within the history
+    max_uptimes = change_times[-1] - start_times
+    uptime_seconds = np.floor(rand_state.uniform(0, 1, len(start_times))*\
+                              np.minimum(max_uptimes, 86400))
+    interrupted = rand_state.uniform(0, 1, len(start_times)) < 0.5
+
+    # Return the intervals
+    return start_times, uptime_seconds, interrupted
+
+
+# Bill an interval hour by hour
+def hourly_cost(start_time, uptime_seconds, change_times, change_prices,
+                interrupted):
+    '''
+    Function to pay the price at the start of each started hour of an
+    interval, with the last partial hour free if interrupted
+    '''
+
+    # Count the billed hours
+    num_hours = int(np.ceil(uptime_seconds/3600.0))
+    if interrupted:
+        num_hours = max(num_hours-1, 0)
+
+    # Add up the price at the start of each hour
+    total_cost = 0.0
+    for hour_idx in range(num_hours):
+        hour_time = start_time + 3600*hour_idx
+        change_idx = np.searchsorted(change_times, hour_time, side='right')
+        total_cost += change_prices[change_idx-1]
+
+    # Return the total cost
+    return total_cost
+
+
+# Bill an interval second by second
+def second_cost(start_time, uptime_seconds, change_times, change_prices):
+    '''
+    Function to pay the price in effect for each second of an interval
+    '''
+
+    # Add up the price of each second
+    sec_seq = np.arange(start_time, start_time + int(uptime_seconds))
+    change_idx = np.searchsorted(change_times, sec_seq, side='right')
+
+    # Return the total cost
+    return change_prices[change_idx-1].sum()/3600.0
+
+
+# Test the hourly billing
+@pytest.mark.parametrize('tabled', [False, True])
+def test_hourly_billing(history, tabled):
+    '''
+    Test that the hourly batch billing, with or without the billing
+    tables, matches billing each interval hour by hour
+    '''
+
+    # Init variables
+    _, change_times, change_prices = history
+    start_times, uptime_seconds, interrupted = \
+        random_intervals(change_times, np.random.RandomState(1))
+    billing_index = None
+    if tabled:
+        billing_index = \
+            build_billing_index(change_times, change_prices, start_times,
+                                build_crossing_index(change_prices,
+                                                     BID_PRICE))
+
+    # Bill all of the intervals at once
+    total_costs = calculate_cost_batch(start_times, uptime_seconds,
+                                       change_times, change_prices,
+                                       interrupted=interrupted,
+                                       billing_index=billing_index)
+
+    # Bill each interval on its own
+    expected = [hourly_cost(start_time, uptime, change_times, change_prices,
+                            interrupt)
+                for start_time, uptime, interrupt in \
+                zip(start_times, uptime_seconds, interrupted)]
+    np.testing.assert_allclose(total_costs, expected, rtol=1e-12)
+
+
+# Test the per-second billing
+@pytest.mark.parametrize('tabled', [False, True])
+def test_second_billing(history, tabled):
+    '''
+    Test that the per-second batch billing, with or without the billing
+    tables, matches billing each interval second by second, whether or
+    not it was interrupted
+    '''
+
+    # Init variables
+    _, change_times, change_prices = history
+    start_times, uptime_seconds, interrupted = \
+        random_intervals(change_times, np.random.RandomState(2))
+    billing_index = None
+    if tabled:
+        billing_index = build_billing_index(change_times, change_prices,
+                                            start_times)
+
+    # Bill all of the intervals at once
+    total_costs = calculate_cost_batch(start_times, uptime_seconds,
+                                       change_times, change_prices,
+                                       interrupted=interrupted,
+                                       billing='second',
+                                       billing_index=billing_index)
+
+    # Bill each interval on its own
+    expected = [second_cost(start_time, uptime, change_times, change_prices)
+                for start_time, uptime in zip(start_times, uptime_seconds)]
+    np.testing.assert_allclose(total_costs, expected, rtol=1e-9)
+
+
+# Test the single interval billing
+def test_single_interval(history):
+    '''
+    Test that calculate_cost bills one interval like the batch does
+    '''
+
+    # Init variables
+    _, change_times, change_prices = history
+    start_time = change_times[3]
+    uptime = 5*3600 + 17
+
+    # Bill it both ways
+    for interrupted in [False, True]:
+        assert calculate_cost(start_time, uptime, change_times,
+                              change_prices, interrupted=interrupted) == \
+               hourly_cost(start_time, uptime, change_times, change_prices,
+                           interrupted)
+
+
+# Test an unknown billing mode
+def test_unknown_billing(history):
+    '''
+    Test that an unsupported billing mode raises
+    '''
+
+    # Init variables
+    _, change_times, change_prices = history
+
+    # Bill in minutes
+    with pytest.raises(Exception):
+        calculate_cost(change_times[0], 60, change_times, change_prices,
+                       billing='minute')
@@ -0,0 +1,167 @@
+# test_break_even.py
+
+'''
+This module tests the spot vs. on-demand break-even search of
+break_even against computing the margin of every candidate bid and
+number of datasets
+'''
+
+# Import packages
+import numpy as np
+import pytest
+
+# Relative imports
+from bid_optimizer import candidate_bids
+from break_even import spot_margin, zone_break_even
+from conftest import PARAMS
+from pricing_catalog import load_catalog
+from run_static_model import static_costs
+from spot_price_model import history_time_average, simulate_market_batch
+import utils
+
+# Sizes and bid ratios to search
+NUM_JOBS = [3, 20, 40, 60]
+BID_RATIOS = [0.8, 1.0, 1.2, 1.5]
+
+
+# Compute the margin of every candidate bid at a size
+def all_margins(history, cfg_dict, num_jobs, price_hr, time_value,
+                bid_prices):
+    '''
+    Function to compute the spot minus on-demand margin of each bid at
+    a number of datasets, over the start times that complete at the
+    highest candidate bid; NaN if none do
+    '''
+
+    # Init variables
+    _, change_times, change_prices = history
+    av_zone = PARAMS['av_zone'][0]
+    catalog = load_catalog()
+    num_nodes = utils.cluster_size(num_jobs, cfg_dict['jobs_per'])
+    num_iter = np.ceil(num_jobs/float(cfg_dict['jobs_per']*num_nodes))
+    od_df = static_costs(cfg_dict, av_zone, price_hr, num_jobs,
+                         cfg_dict['jobs_per'], 20, catalog)
+
+    # Keep the start times that complete at the highest bid
+    sim_starts = np.arange(change_times[0], change_times[-1]+1, 20*60)
+    completed = simulate_market_batch(sim_starts, change_times,
+                                      change_prices,
+                                      cfg_dict['proc_time']*60.0, num_iter,
+                                      candidate_bids(change_prices)[-1])[-1]
+    sim_starts = sim_starts[completed]
+    if len(sim_starts) == 0:
+        return np.repeat(np.nan, len(bid_prices))
+
+    # Return the margin of each bid
+    return np.array([spot_margin(bid_price, sim_starts, change_times,
+                                 change_prices, cfg_dict, av_zone, num_jobs,
+                                 od_df['static_total_cost'].iloc[0],
+                                 od_df['static_total_time'].iloc[0],
+                                 time_value, 'hourly', catalog)
+                     for bid_price in bid_prices])
+
+
+# Test the break-even bids against every candidate bid
+@pytest.mark.parametrize('price_hr, time_value', [(0.3, 0.0), (0.4, 1.0),
+                                                  (1.68, 2.0)])
+def test_bids_match_brute_force(history, history_csv, price_hr, time_value):
+    '''
+    Test that the break-even bid ratios of each size are where the
+    margin of the candidate bids changes sign
+    '''
+
+    # Init variables
+    _, change_times, change_prices = history
+    cfg_dict = dict(PARAMS, num_jobs=NUM_JOBS, bid_ratio=BID_RATIOS)
+    spot_history_avg = history_time_average(change_times, change_prices)
+    bids = candidate_bids(change_prices)
+    prices = np.unique(change_prices)
+
+    # Search for the break-even curves
+    bid_df, size_df = zone_break_even(PARAMS['av_zone'][0], cfg_dict,
+                                      price_hr, history_csv, time_value)
+
+    # Check each size against the margin of every bid
+    for _, row in bid_df.iterrows():
+        margins = all_margins(history, cfg_dict, row['num_datasets'],
+                              price_hr, time_value, bids)
+        win_idx = np.flatnonzero(margins < 0)
+        assert len(win_idx) > 0
+        assert win_idx[-1] - win_idx[0] + 1 == len(win_idx)
+        low_bid = 0.0 if win_idx[0] == 0 else prices[win_idx[0]]
+        high_bid = np.inf if win_idx[-1] == len(bids)-1 \
+                   else prices[win_idx[-1]+1]
+        np.testing.assert_allclose([row['low_bid_ratio'],
+                                    row['high_bid_ratio']],
+                                   [low_bid/spot_history_avg,
+                                    high_bid/spot_history_avg])
+        assert margins.min() <= row['best_margin'] < 0
+
+
+# Test the break-even sizes against every size
+@pytest.mark.parametrize('price_hr, time_value', [(0.3, 0.0), (1.68, 2.0)])
+def test_sizes_match_brute_force(history, history_csv, price_hr,
+                                 time_value):
+    '''
+    Test that the break-even size of each bid ratio is the first size
+    whose cheaper option differs from the smallest size's
+    '''
+
+    # Init variables
+    _, change_times, change_prices = history
+    cfg_dict = dict(PARAMS, num_jobs=NUM_JOBS, bid_ratio=BID_RATIOS)
+    spot_history_avg = history_time_average(change_times, change_prices)
+    all_sizes = range(NUM_JOBS[0], NUM_JOBS[-1]+1)
+
+    # Search for the break-even curves
+    bid_df, size_df = zone_break_even(PARAMS['av_zone'][0], cfg_dict,
+                                      price_hr, history_csv, time_value)
+
+    # Check each bid ratio against the margin of every size
+    num_switched = 0
+    for _, row in size_df.iterrows():
+        bid_price = row['bid_ratio']*spot_history_avg
+        spot_wins = np.array([all_margins(history, cfg_dict, num_jobs,
+                                          price_hr, time_value,
+                                          [bid_price])[0] < 0
+                              for num_jobs in all_sizes])
+        switched = np.flatnonzero(spot_wins != spot_wins[0])
+        if len(switched) == 0:
+            assert np.isnan(row['break_even_datasets'])
+            assert row['wins_below'] is None
+        else:
+            assert row['break_even_datasets'] == all_sizes[switched[0]]
+            assert row['wins_below'] == \
+                   ('spot' if spot_wins[0] else 'on_demand')
+            num_switched += 1
+
+    # Make sure some bid switched
+    assert num_switched > 0
+
+
+# Test sizes that no start time completes at
+def test_sizes_without_completions(history_csv):
+    '''
+    Test that a size too large for the history to complete has no
+    margin or break-even bids and doesn't change the break-even sizes
+    '''
+
+    # Init variables
+    cfg_dict = dict(PARAMS, num_jobs=NUM_JOBS, bid_ratio=BID_RATIOS)
+    big_dict = dict(cfg_dict, num_jobs=NUM_JOBS + [100000])
+
+    # Search with and without the large size
+    bid_df, size_df = zone_break_even(PARAMS['av_zone'][0], cfg_dict, 0.3,
+                                      history_csv)
+    big_bid_df, big_size_df = zone_break_even(PARAMS['av_zone'][0],
+                                              big_dict, 0.3, history_csv)
+
+    # The large size has no margin
+    big_row = big_bid_df.iloc[-1]
+    assert big_row['num_datasets'] == 100000
+    assert np.isnan(big_row[['best_margin', 'low_bid_ratio',
+                             'high_bid_ratio']].astype('float64')).all()
+
+    # And the other results are unchanged
+    assert big_bid_df.iloc[:-1].equals(bid_df)
+    assert big_size_df.equals(size_df)
@@ -0,0 +1,84 @@
+# test_incremental.py
+
+'''
+This module tests that simulating incrementally, reusing the results
+simulated over an earlier part of the spot history, gives the same
+results as simulating the whole history from scratch
+'''
+
+# Import packages
+import os
+
+import pandas as pd
+import pytest
+
+# Relative imports
+from conftest import PARAMS
+from spot_price_model import main, result_prefix
+
+# Number of price changes in the earlier part of the history
+NUM_EARLY = 100
+
+
+# Simulate a bid ratio over a history csv
+def run_sim(sim_dir, csv_file, bid_ratio, num_jobs, incremental=False):
+    '''
+    Function to run spot_price_model.main with the test parameters and
+    return the filepath prefix of its results
+    '''
+
+    # Run the simulation
+    main(str(sim_dir), PARAMS['proc_time'], num_jobs, PARAMS['jobs_per'],
+         PARAMS['in_gb'], PARAMS['out_gb'], PARAMS['out_gb_dl'],
+         PARAMS['up_rate'], PARAMS['down_rate'], bid_ratio,
+         PARAMS['instance_type'], PARAMS['av_zone'][0], PARAMS['product'],
+         csv_file, incremental=incremental)
+
+    # Return the results prefix
+    params = {'instance_type' : PARAMS['instance_type'],
+              'num_jobs' : num_jobs, 'jobs_per' : PARAMS['jobs_per'],
+              'bid_ratio' : bid_ratio}
+    return result_prefix(os.path.join(str(sim_dir), PARAMS['av_zone'][0]),
+                         params)
+
+
+# Test incremental results match a full simulation
+@pytest.mark.parametrize('bid_ratio, reused', [(0.8, True), (1.0, False),
+                                                (3.0, True)])
+def test_incremental_matches_full(tmpdir, history_csv, bid_ratio, reused):
+    '''
+    Test that simulating the full history incrementally, after the
+    earlier part of it, gives the same sim and stats results as
+    simulating the full history from scratch, and that the earlier
+    results are reused when the bid stays on the same side of every
+    earlier price
+    '''
+
+    # Write the earlier part of the history, copying the csv lines so
+    # the prices are parsed the same way
+    early_csv = tmpdir.join('early_history.csv')
+    early_csv.write(''.join(open(history_csv, 'r').readlines()[:NUM_EARLY+1]))
+    early_csv = str(early_csv)
+    num_jobs = PARAMS['num_jobs'][1]
+
+    # Simulate the earlier history, then the full one incrementally
+    inc_dir = tmpdir.join('incremental')
+    run_sim(inc_dir, early_csv, bid_ratio, num_jobs)
+    inc_prefix = run_sim(inc_dir, history_csv, bid_ratio, num_jobs,
+                         incremental=True)
+
+    # Simulate the full history from scratch
+    full_prefix = run_sim(tmpdir.join('full'), history_csv, bid_ratio,
+                          num_jobs)
+
+    # Compare the results
+    for suffix in ['_sim.csv', '_stats.csv']:
+        inc_df = pd.read_csv(inc_prefix + suffix, index_col=0,
+                             float_precision='round_trip')
+        full_df = pd.read_csv(full_prefix + suffix, index_col=0,
+                              float_precision='round_trip')
+        pd.testing.assert_frame_equal(inc_df, full_df)
+
+    # Check the earlier results were reused when they should be
+    if reused:
+        assert 'Reusing' in open(inc_prefix + '.log', 'r').read()
@@ -0,0 +1,59 @@
+# test_market_outcomes.py
+
+'''
+This module tests re-costing the market outcomes that
+spot_price_model.main saves against the stats main wrote for them
+'''
+
+# Import packages
+import os
+
+import pandas as pd
+import pytest
+import yaml
+
+# Relative imports
+from conftest import PARAMS
+from market_outcomes import recost
+import spot_price_model
+
+
+# Test re-costing against the simulated stats
+@pytest.mark.parametrize('num_nodes', [None, 4])
+def test_recost_matches_main(tmpdir, history, num_nodes):
+    '''
+    Test that re-costing the outcomes of a sweep with its own config,
+    on the default or a configured cluster size, finds the outcomes
+    main saved and writes the same stats as main did
+    '''
+
+    # Init variables
+    sim_dir = str(tmpdir.join('sim'))
+    out_dir = str(tmpdir.join('recost'))
+    config_file = str(tmpdir.join('recost.yml'))
+    cfg_dict = dict(PARAMS, num_jobs=[60], bid_ratio=[1.2])
+    if num_nodes is not None:
+        cfg_dict['num_nodes'] = num_nodes
+    with open(config_file, 'w') as cfg_file:
+        yaml.dump(cfg_dict, cfg_file)
+
+    # Simulate the sweep
+    spot_price_model.main(sim_dir, PARAMS['proc_time'], 60,
+                          PARAMS['jobs_per'], PARAMS['in_gb'],
+                          PARAMS['out_gb'], PARAMS['out_gb_dl'],
+                          PARAMS['up_rate'], PARAMS['down_rate'], 1.2,
+                          PARAMS['instance_type'], PARAMS['av_zone'][0],
+                          PARAMS['product'], history=history,
+                          num_nodes=num_nodes)
+
+    # Re-cost it with the same config
+    out_csvs = recost(config_file, sim_dir, out_dir)
+    assert len(out_csvs) == 1
+
+    # The stats match main's, under the same name
+    sim_csv = os.path.join(sim_dir, os.path.relpath(out_csvs[0], out_dir))
+    if num_nodes is not None:
+        assert sim_csv.endswith('_%d-nodes_stats.csv' % num_nodes)
+    pd.testing.assert_frame_equal(pd.read_csv(out_csvs[0], index_col=0),
+                                  pd.read_csv(sim_csv, index_col=0),
+                                  check_less_precise=True)
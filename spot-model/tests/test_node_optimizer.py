@@ -0,0 +1,140 @@
+# test_node_optimizer.py
+
+'''
+This module tests the cluster size search of node_optimizer against
+simulating each number of nodes with spot_price_model.main
+'''
+
+# Import packages
+import numpy as np
+import pandas as pd
+import pytest
+
+# Relative imports
+from conftest import PARAMS
+from node_optimizer import optimize_nodes
+import spot_price_model
+
+
+# Search for the best number of nodes
+def search_nodes(history, bid_ratio, num_jobs, sim_dir=None, **opt_args):
+    '''
+    Function to run optimize_nodes with the test parameters
+    '''
+
+    # Return the best number of nodes and evaluations
+    return optimize_nodes(PARAMS['proc_time'], num_jobs, PARAMS['jobs_per'],
+                          PARAMS['in_gb'], PARAMS['out_gb'],
+                          PARAMS['out_gb_dl'], PARAMS['up_rate'],
+                          PARAMS['down_rate'], bid_ratio,
+                          PARAMS['instance_type'], PARAMS['av_zone'][0],
+                          PARAMS['product'], sim_dir=sim_dir,
+                          history=history, **opt_args)
+
+
+# Simulate a number of nodes
+def run_main(sim_dir, history, bid_ratio, num_jobs, num_nodes):
+    '''
+    Function to run spot_price_model.main on a number of nodes and
+    return its sim and stats dataframes
+    '''
+
+    # Run the simulation
+    _, sim_df, stat_df = \
+        spot_price_model.main(str(sim_dir), PARAMS['proc_time'], num_jobs,
+                              PARAMS['jobs_per'], PARAMS['in_gb'],
+                              PARAMS['out_gb'], PARAMS['out_gb_dl'],
+                              PARAMS['up_rate'], PARAMS['down_rate'],
+                              bid_ratio, PARAMS['instance_type'],
+                              PARAMS['av_zone'][0], PARAMS['product'],
+                              history=history, num_nodes=num_nodes)
+
+    # Return the results
+    return sim_df, stat_df
+
+
+# Test each number of nodes against a full simulation
+@pytest.mark.parametrize('bid_ratio, num_jobs', [(0.9, 20), (1.2, 20),
+                                                 (1.2, 60)])
+def test_matches_main(tmpdir, capsys, history, bid_ratio, num_jobs):
+    '''
+    Test that the mean cost, time, and completed ratio of each number
+    of nodes match simulating it on its own, over the start times that
+    complete on the most nodes, and that the sim_dir outcomes they save
+    give the same evaluations
+    '''
+
+    # Search every number of nodes
+    best, eval_df = search_nodes(history, bid_ratio, num_jobs)
+    max_nodes = eval_df['num_nodes'].max()
+
+    # Simulate each number of nodes, most first
+    top_starts = None
+    for num_nodes in range(max_nodes, 0, -1):
+        sim_df, stat_df = run_main(tmpdir, history, bid_ratio, num_jobs,
+                                   num_nodes)
+        if top_starts is None:
+            top_starts = set(sim_df['start_time'])
+        done = sim_df['start_time'].isin(top_starts).values
+        row = eval_df[eval_df['num_nodes'] == num_nodes].iloc[0]
+        assert row['completed_ratio'] == done.sum()/float(len(top_starts))
+        np.testing.assert_allclose([row['mean_cost'], row['mean_time']],
+                                   [stat_df['Total cost'][done].mean(),
+                                    60*stat_df['Total time'][done].mean()],
+                                   rtol=1e-9)
+        assert row['mean_interrupts'] == sim_df['num_interrupts'][done].mean()
+
+    # The best number of nodes is the cheapest, ties going to the fewest
+    finite_df = eval_df[eval_df['completed_ratio'] >= 1.0]
+    assert best['num_nodes'] == \
+           finite_df['num_nodes'][finite_df['mean_cost'] == \
+                                  finite_df['mean_cost'].min()].min()
+
+    # Reading the outcomes main saved gives the same evaluations
+    num_sims = eval_df['num_iter'].nunique()
+    capsys.readouterr()
+    loaded_best, loaded_df = search_nodes(history, bid_ratio, num_jobs,
+                                          str(tmpdir))
+    assert '%d market simulations (%d loaded)' % (num_sims, num_sims) in \
+           capsys.readouterr()[0]
+    pd.testing.assert_frame_equal(loaded_df, eval_df)
+    assert loaded_best == best
+
+
+# Test the objectives and limits
+def test_objectives(tmpdir, history):
+    '''
+    Test that the time and weighted objectives score the evaluations,
+    that node counts completing too few submissions are ruled out, and
+    that the node limit caps the search
+    '''
+
+    # Search for the fastest and the weighted best, over every node
+    # count, and the cheapest that completes every submission
+    cost_best, cost_df = search_nodes(history, 1.2, 60, str(tmpdir),
+                                      max_nodes=10)
+    time_best, time_df = search_nodes(history, 1.2, 60, objective='time',
+                                      max_nodes=10, min_completed=0.0)
+    weight_best, weight_df = search_nodes(history, 1.2, 60,
+                                          objective='weighted',
+                                          time_value=5.0, max_nodes=10,
+                                          min_completed=0.0)
+
+    # Check the node limit and the scores
+    assert cost_df['num_nodes'].tolist() == range(1, 11)
+    pd.testing.assert_frame_equal(time_df.drop('objective', axis=1),
+                                  cost_df.drop('objective', axis=1))
+    np.testing.assert_allclose(weight_df['objective'],
+                               cost_df['mean_cost'] + \
+                               5.0*cost_df['mean_time']/3600.0)
+    assert time_best['mean_time'] == time_df['mean_time'].min()
+    assert weight_best['objective'] == weight_df['objective'].min()
+
+    # Node counts completing too few submissions are never the best
+    incomplete = cost_df['completed_ratio'] < 1.0
+    assert np.isinf(cost_df['objective'][incomplete]).all()
+    assert cost_best['completed_ratio'] == 1.0
+
+    # An unknown objective raises
+    with pytest.raises(Exception):
+        search_nodes(history, 1.2, 60, objective='interrupts')
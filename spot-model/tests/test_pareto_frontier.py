@@ -0,0 +1,106 @@
+# test_pareto_frontier.py
+
+'''
+This module tests the cost vs. time Pareto frontier of pareto_frontier
+against comparing every pair of rows
+'''
+
+# Import packages
+import numpy as np
+import pandas as pd
+import pytest
+
+# Relative imports
+from pareto_frontier import pareto_mask
+
+
+# Random table of configurations
+def random_table(rand_state, num_rows):
+    '''
+    Function to return a table of coarse, so often tied, costs and times
+    in a few groups, with some of them missing
+    '''
+
+    # Draw the groups, costs, and times
+    data_frame = pd.DataFrame({'av_zone' : rand_state.choice(['a', 'b'],
+                                                             num_rows),
+                               'num_datasets' : rand_state.choice([10, 20],
+                                                                  num_rows),
+                               'cost' : rand_state.randint(0, 8, num_rows)*1.,
+                               'time' : rand_state.randint(0, 8, num_rows)*1.})
+
+    # Knock out some costs and times
+    data_frame.loc[rand_state.uniform(0, 1, num_rows) < 0.1, 'cost'] = np.nan
+    data_frame.loc[rand_state.uniform(0, 1, num_rows) < 0.1, 'time'] = np.nan
+
+    # Return the table
+    return data_frame
+
+
+# Compare every pair of rows
+def brute_force_mask(data_frame, group_by):
+    '''
+    Function to flag the rows that no row of the same group beats on
+    both cost and time, keeping the first of equal rows
+    '''
+
+    # Init variables
+    costs = data_frame['cost'].values
+    times = data_frame['time'].values
+    groups = [tuple(row) for row in data_frame[group_by].values]
+    on_front = np.zeros(len(data_frame), dtype='bool')
+
+    # Check each row against every other
+    for row_idx in range(len(data_frame)):
+        if np.isnan(costs[row_idx]) or np.isnan(times[row_idx]):
+            continue
+        beaten = False
+        for other_idx in range(len(data_frame)):
+            if other_idx == row_idx or groups[other_idx] != groups[row_idx]:
+                continue
+            no_worse = costs[other_idx] <= costs[row_idx] and \
+                       times[other_idx] <= times[row_idx]
+            better = costs[other_idx] < costs[row_idx] or \
+                     times[other_idx] < times[row_idx]
+            if no_worse and (better or other_idx < row_idx):
+                beaten = True
+                break
+        on_front[row_idx] = not beaten
+
+    # Return the mask
+    return on_front
+
+
+# Test the frontier against comparing every pair
+@pytest.mark.parametrize('group_by', [[], ['num_datasets'],
+                                      ['av_zone', 'num_datasets']])
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_brute_force(group_by, seed):
+    '''
+    Test that pareto_mask flags the same rows as comparing every pair of
+    rows in each group
+    '''
+
+    # Init variables
+    data_frame = random_table(np.random.RandomState(seed), 60)
+
+    # Compare the masks
+    np.testing.assert_array_equal(pareto_mask(data_frame, 'cost', 'time',
+                                              group_by),
+                                  brute_force_mask(data_frame, group_by))
+
+
+# Test the mask follows the table rows
+def test_unsorted_index():
+    '''
+    Test that the mask lines up with the table rows whatever its index
+    '''
+
+    # Init variables
+    data_frame = pd.DataFrame({'cost' : [3., 1., 2., 1., np.nan],
+                               'time' : [1., 3., 2., 3., 0.]},
+                              index=[9, 4, 7, 1, 0])
+
+    # Check the frontier
+    np.testing.assert_array_equal(pareto_mask(data_frame, 'cost', 'time'),
+                                  [True, True, True, False, False])
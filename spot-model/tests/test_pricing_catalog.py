@@ -0,0 +1,146 @@
+# test_pricing_catalog.py
+
+'''
+This module tests the AWS price lookups of spot_price_model and
+pricing_catalog against the price tables the cost models used before
+the prices moved to aws_prices.yml
+'''
+
+# Import packages
+import numpy as np
+import pytest
+
+# Relative imports
+from pricing_catalog import load_catalog, lookup_prices
+from spot_price_model import get_ec2_costs, get_s3_costs
+
+# Regions, in the order of the price lists below
+REGIONS = ['us-east-1', 'us-west-1', 'us-west-2', 'eu-west-1',
+           'eu-central-1', 'ap-southeast-1', 'ap-southeast-2',
+           'ap-northeast-1', 'sa-east-1']
+
+# Original EC2 prices, by cost type
+EC2_PRICES = {'ssd' : [0.1, 0.12, 0.1, 0.11, 0.119, 0.12, 0.12, 0.12, 0.19],
+              'mag' : [0.05, 0.08, 0.05, 0.055, 0.059, 0.08, 0.08, 0.08,
+                       0.12],
+              'xfer' : [0.09, 0.09, 0.09, 0.09, 0.09, 0.12, 0.14, 0.14,
+                        0.25],
+              'master' : [0.026, 0.034, 0.026, 0.028, 0.030, 0.040, 0.040,
+                          0.040, 0.054]}
+
+# Original S3 prices, by cost type
+S3_PRICES = {'stor' : [0.03, 0.033, 0.03, 0.03, 0.0324, 0.03, 0.033, 0.033,
+                       0.0408],
+             'xfer' : EC2_PRICES['xfer'],
+             'put' : [0.005, 0.0055, 0.005, 0.005, 0.0054, 0.005, 0.0055,
+                      0.0047, 0.007],
+             'get' : [0.004, 0.0044, 0.004, 0.004, 0.0043, 0.004, 0.0044,
+                      0.0037, 0.0056]}
+
+# Pricing file with two pricing periods
+VERSIONED_YML = '''
+ebs_ssd:
+  - effective: 2015-06-01
+    expires: null
+    prices:
+      us-east-1: 0.08
+  - effective: 2015-01-01
+    expires: 2015-06-01
+    prices:
+      us-east-1: 0.1
+      us-west-1: 0.12
+'''
+
+# Epoch seconds of dates around the pricing periods
+JAN_2014 = 1388534400
+JAN_2015 = 1420070400
+MAR_2015 = 1425168000
+JUN_2015 = 1433116800
+
+
+# Test the EC2 prices
+@pytest.mark.parametrize('cost_type', sorted(EC2_PRICES))
+def test_ec2_prices(cost_type):
+    '''
+    Test that get_ec2_costs returns the original prices in every region
+    '''
+
+    # Check each region
+    for region, price in zip(REGIONS, EC2_PRICES[cost_type]):
+        assert get_ec2_costs(region + 'a', cost_type) == price
+
+
+# Test the S3 prices
+@pytest.mark.parametrize('cost_type', ['stor', 'xfer'])
+def test_s3_prices(cost_type):
+    '''
+    Test that get_s3_costs returns the original prices in every region
+    '''
+
+    # Check each region
+    for region, price in zip(REGIONS, S3_PRICES[cost_type]):
+        assert get_s3_costs(region + 'b', cost_type) == price
+
+
+# Test the S3 request prices
+def test_s3_request_prices():
+    '''
+    Test that get_s3_costs returns the original put and get request
+    prices in every region
+    '''
+
+    # Check each region
+    for region_idx, region in enumerate(REGIONS):
+        assert get_s3_costs(region + 'c', 'req') == \
+               {'put' : S3_PRICES['put'][region_idx],
+                'get' : S3_PRICES['get'][region_idx]}
+
+
+# Test the array lookups
+def test_lookup_arrays():
+    '''
+    Test that lookup_prices prices arrays of zones like one at a time
+    '''
+
+    # Init variables
+    av_zones = np.array([region + 'a' for region in REGIONS]*2)
+
+    # Look them all up at once
+    np.testing.assert_array_equal(lookup_prices('ebs_ssd', av_zones),
+                                  EC2_PRICES['ssd']*2)
+
+
+# Test the pricing periods
+def test_pricing_periods(tmpdir):
+    '''
+    Test that prices are looked up from the period in effect at each
+    time and that times or regions without a price raise
+    '''
+
+    # Init variables
+    pricing_yml = tmpdir.join('prices.yml')
+    pricing_yml.write(VERSIONED_YML)
+    catalog = load_catalog(str(pricing_yml))
+
+    # The latest period is used by default
+    assert get_ec2_costs('us-east-1a', 'ssd', catalog=catalog) == 0.08
+
+    # Each time gets its own period
+    np.testing.assert_array_equal(lookup_prices('ebs_ssd', 'us-east-1a',
+                                                [JAN_2015, MAR_2015,
+                                                 JUN_2015],
+                                                catalog),
+                                  [0.1, 0.1, 0.08])
+    assert get_ec2_costs('us-west-1a', 'ssd', MAR_2015, catalog) == 0.12
+
+    # Before the first period, or in a period without the region
+    with pytest.raises(Exception):
+        get_ec2_costs('us-east-1a', 'ssd', JAN_2014, catalog)
+    with pytest.raises(Exception):
+        get_ec2_costs('us-west-1a', 'ssd', JUN_2015, catalog)
+
+    # Regions and cost types not in the catalog
+    with pytest.raises(Exception):
+        get_ec2_costs('eu-west-1a', 'ssd', catalog=catalog)
+    with pytest.raises(Exception):
+        get_ec2_costs('us-east-1a', 'mag', catalog=catalog)
@@ -0,0 +1,117 @@
+# test_run_static_model.py
+
+'''
+This module tests the vectorized static model grid of run_static_model
+against running the static model one zone, price, and configuration at
+a time
+'''
+
+# Import packages
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+# Relative imports
+from conftest import PARAMS
+from run_static_model import load_and_run, run_grid
+
+# Availability zones, and their prices by zone or region
+AV_ZONES = ['us-east-1a', 'eu-west-1b']
+PRICE_TABLE = {'us-east-1' : [1.68, 2.0], 'eu-west-1b' : 1.9,
+               'eu-west-1' : 5.0}
+NUM_JOBS = [20, 60, 200]
+
+
+# Write a config of the test parameters
+def write_config(config_file, **cfg_args):
+    '''
+    Function to write the test parameters, over both zones and
+    updated with any keyword arguments, to a config file
+    '''
+
+    # Update and write the parameters
+    cfg_dict = dict(PARAMS, av_zone=AV_ZONES, num_jobs=NUM_JOBS)
+    cfg_dict.update(cfg_args)
+    with open(config_file, 'w') as cfg_file:
+        yaml.dump(cfg_dict, cfg_file)
+
+    # Return the config file
+    return config_file
+
+
+# Test the grid against the one at a time static model
+@pytest.mark.parametrize('jobs_per_list, max_nodes_list, num_nodes',
+                         [(None, None, None), ([2, 3], [5, 20], None),
+                          (None, None, {'us-east-1' : 4})])
+def test_grid_matches_load_and_run(tmpdir, monkeypatch, jobs_per_list,
+                                   max_nodes_list, num_nodes):
+    '''
+    Test that every row of run_grid matches the load_and_run result of
+    the same zone, price, number of datasets, jobs per node, and node
+    limit, and that both run on the configured number of nodes
+    '''
+
+    # Init variables
+    monkeypatch.chdir(tmpdir)
+    price_table = str(tmpdir.join('prices.yml'))
+    with open(price_table, 'w') as price_file:
+        yaml.dump(PRICE_TABLE, price_file)
+
+    # Run the whole grid
+    grid_df = run_grid(write_config(str(tmpdir.join('grid.yml')),
+                                    num_nodes=num_nodes),
+                       price_table, jobs_per_list, max_nodes_list,
+                       out_csv=str(tmpdir.join('grid.csv')))
+    num_prices = 3
+    assert len(grid_df) == num_prices*len(NUM_JOBS)*\
+                           len(jobs_per_list or [1])*\
+                           len(max_nodes_list or [1])
+
+    # Run each configuration on its own
+    for jobs_per in jobs_per_list or [PARAMS['jobs_per']]:
+        for max_nodes in max_nodes_list or [20]:
+            config = write_config(str(tmpdir.join('single.yml')),
+                                  jobs_per=jobs_per, max_nodes=max_nodes,
+                                  num_nodes=num_nodes)
+            for av_zone, price_hr in [('us-east-1a', 1.68),
+                                      ('us-east-1a', 2.0),
+                                      ('eu-west-1b', 1.9)]:
+                single_df = load_and_run(config, av_zone, price_hr)
+                rows = (grid_df['av_zone'] == av_zone) & \
+                       (grid_df['price_hr'] == price_hr) & \
+                       (grid_df['jobs_per'] == jobs_per) & \
+                       (grid_df['max_nodes'] == max_nodes)
+                match_df = grid_df.loc[rows, single_df.columns]
+                match_df = match_df.sort_values('num_datasets')
+                pd.testing.assert_frame_equal(match_df.reset_index(drop=True),
+                                              single_df, check_dtype=False)
+
+    # A configured number of nodes is run where jobs need that many
+    if num_nodes is not None:
+        is_east = grid_df['av_zone'] == 'us-east-1a'
+        np.testing.assert_array_equal(grid_df['num_nodes'][is_east],
+                                      np.minimum(np.ceil(grid_df\
+                                          ['num_datasets'][is_east]/3.0), 4))
+
+    # The written table is the returned one
+    np.testing.assert_allclose(pd.read_csv(str(tmpdir.join('grid.csv')))\
+                               ['static_total_cost'],
+                               grid_df['static_total_cost'])
+
+
+# Test a zone missing from the price table
+def test_missing_price(tmpdir):
+    '''
+    Test that a zone with no price raises
+    '''
+
+    # Init variables
+    price_table = str(tmpdir.join('prices.yml'))
+    with open(price_table, 'w') as price_file:
+        yaml.dump({'us-east-1' : 1.68}, price_file)
+
+    # Run the grid
+    with pytest.raises(Exception):
+        run_grid(write_config(str(tmpdir.join('grid.yml'))), price_table,
+                 out_csv=str(tmpdir.join('grid.csv')))
@@ -0,0 +1,211 @@
+# test_simulate_market.py
+
+'''
+This module tests the change-point market simulation of
+spot_price_model against a port of the original simulation, which
+stepped through the spot history interpolated to one second
+resolution
+'''
+
+# Import packages
+import numpy as np
+import pytest
+
+# Relative imports
+from spot_price_model import simulate_market, simulate_market_batch
+
+# Job submission parameters to simulate
+PROC_TIME = 2700
+NUM_ITERS = [1, 4]
+BIDS = [0.28, 0.3, 0.35]
+
+
+# Original per-second hourly billing
+def reference_cost(start_time, uptime_seconds, first_time, interp_prices,
+                   interrupted=False):
+    '''
+    Function to bill an uptime interval by sampling the per-second
+    history at the start of each started hour, the way the original
+    calculate_cost did; raises IndexError past the end of the history,
+    where the original raised a KeyError
+    '''
+
+    # Sample the price at the start of each hour
+    pay_periods = int(np.ceil(uptime_seconds/3600.0))
+    hour_idx = start_time - first_time + 3600*np.arange(pay_periods)
+    if pay_periods > 0 and hour_idx[-1] >= len(interp_prices):
+        raise IndexError('Billed hour is past the end of the history')
+    hourly_prices = interp_prices[hour_idx]
+
+    # The last, partial, hour is free if interrupted
+    total_cost = hourly_prices[:-1].sum()
+    if not interrupted:
+        total_cost += hourly_prices[-1]
+
+    # Return the total cost
+    return total_cost
+
+
+# Original per-second market simulation
+def reference_market(start_time, change_times, change_prices, proc_time,
+                     num_iter, bid_price):
+    '''
+    Function to simulate a job submission the way the original
+    simulate_market did, scanning the remaining history for bid
+    crossings and reading prices from a per-second interpolation
+    '''
+
+    # Interpolate the history to one second resolution
+    first_time = change_times[0]
+    interp_seq = np.arange(first_time, change_times[-1]+1)
+    interp_prices = change_prices[np.searchsorted(change_times, interp_seq,
+                                                  side='right') - 1]
+
+    # Init variables
+    total_runtime = 0
+    total_wait = 0
+    total_cost = 0
+    num_interrupts = 0
+    first_iter_time = 0
+    start_idx = np.argmax(change_times >= start_time)
+    remaining_runtime = proc_time*num_iter
+
+    # While there is time left running
+    while remaining_runtime > 0:
+        # Interrupt immediately if the start price is over bid
+        if interp_prices[start_time - first_time] >= bid_price:
+            uptime_seconds = 0
+            interrupt_time = start_time
+        # Otherwise run until the first price at or over bid
+        else:
+            over_bid = np.flatnonzero(change_prices[start_idx:] >= bid_price)
+            if len(over_bid) > 0:
+                interrupt_time = change_times[start_idx + over_bid[0]]
+            else:
+                interrupt_time = change_times[-1]
+            uptime_seconds = float(interrupt_time - start_time)
+
+        # See if job completed
+        if uptime_seconds > remaining_runtime:
+            total_runtime += remaining_runtime
+            total_cost += reference_cost(start_time, remaining_runtime,
+                                         first_time, interp_prices)
+            remaining_runtime = 0
+        # Job suspended until price returns below bid
+        else:
+            if uptime_seconds > 0:
+                num_interrupts += 1
+            total_runtime += uptime_seconds
+            total_cost += reference_cost(start_time, uptime_seconds,
+                                         first_time, interp_prices,
+                                         interrupted=True)
+            remaining_runtime = (remaining_runtime-uptime_seconds) + \
+                                (uptime_seconds % proc_time)
+
+            # Restart at the next price under bid
+            interrupt_idx = np.searchsorted(change_times, interrupt_time)
+            under_bid = np.flatnonzero(change_prices[interrupt_idx:] < \
+                                       bid_price)
+            if len(under_bid) == 0 or \
+               interrupt_idx + under_bid[0] == len(change_times) - 1:
+                err_msg = 'Job submission could not complete due to too ' \
+                          'many interrupts or starting too recently'
+                raise Exception(err_msg)
+            start_idx = interrupt_idx + under_bid[0]
+            start_time = change_times[start_idx]
+            total_wait += float(start_time - interrupt_time)
+
+        # Set the first iteration time once up for a processing time
+        if total_runtime >= proc_time:
+            first_iter_time = proc_time + total_wait
+
+    # Return results
+    return total_runtime, total_wait, total_cost, num_interrupts, \
+           first_iter_time
+
+
+# Simulation starts every 20 minutes over the history
+def sim_starts(change_times):
+    '''
+    Function to return the start times the sims are run from
+    '''
+
+    # Return the start times
+    return np.arange(change_times[0], change_times[-1], 1200)
+
+
+# Test the change-point simulation against the original
+@pytest.mark.parametrize('num_iter', NUM_ITERS)
+@pytest.mark.parametrize('bid_price', BIDS)
+def test_matches_reference(history, num_iter, bid_price):
+    '''
+    Test that simulate_market gives the same outcomes as the original
+    per-second simulation for every start time, and fails on the same
+    start times
+    '''
+
+    # Init variables
+    _, change_times, change_prices = history
+    num_checked = 0
+
+    # Simulate from each start time
+    for start_time in sim_starts(change_times):
+        try:
+            expected = reference_market(start_time, change_times,
+                                        change_prices, PROC_TIME, num_iter,
+                                        bid_price)
+        # The original can't bill hours past the end of the history
+        except IndexError:
+            continue
+        except Exception:
+            with pytest.raises(Exception):
+                simulate_market(start_time, change_times, change_prices,
+                                PROC_TIME, num_iter, bid_price)
+            continue
+        result = simulate_market(start_time, change_times, change_prices,
+                                 PROC_TIME, num_iter, bid_price)
+        np.testing.assert_allclose(result, expected, rtol=1e-12)
+        num_checked += 1
+
+    # Make sure the history exercised the comparison
+    assert num_checked > 0
+
+
+# Test the batch simulation against the one-at-a-time simulation
+@pytest.mark.parametrize('billing', ['hourly', 'second'])
+@pytest.mark.parametrize('num_iter', NUM_ITERS)
+@pytest.mark.parametrize('bid_price', BIDS)
+def test_batch_matches_scalar(history, num_iter, bid_price, billing):
+    '''
+    Test that simulate_market_batch gives the same outcomes as
+    simulate_market for every start time and flags the start times
+    where simulate_market raises as not completed
+    '''
+
+    # Init variables
+    _, change_times, change_prices = history
+    start_times = sim_starts(change_times)
+
+    # Simulate all of the start times at once
+    batch = simulate_market_batch(start_times, change_times, change_prices,
+                                  PROC_TIME, num_iter, bid_price,
+                                  billing=billing)
+    completed = batch[-1]
+
+    # Simulate each start time on its own
+    for sim_idx, start_time in enumerate(start_times):
+        if not completed[sim_idx]:
+            with pytest.raises(Exception):
+                simulate_market(start_time, change_times, change_prices,
+                                PROC_TIME, num_iter, bid_price,
+                                billing=billing)
+            continue
+        result = simulate_market(start_time, change_times, change_prices,
+                                 PROC_TIME, num_iter, bid_price,
+                                 billing=billing)
+        np.testing.assert_allclose([outcome[sim_idx] \
+                                    for outcome in batch[:-1]],
+                                   result, rtol=1e-9)
+
+    # Make sure the history has both outcomes
+    assert completed.any() and not completed.all()
@@ -0,0 +1,100 @@
+# test_spot_history_store.py
+
+'''
+This module tests building the spot history store from merged spot
+history csvs against sorting and de-duplicating them with pandas
+'''
+
+# Import packages
+import numpy as np
+import pandas as pd
+import pytest
+
+# Relative imports
+from conftest import PARAMS, write_history
+from spot_history_store import build_store, parse_timestamps, read_series
+
+
+# Write merged csvs of shuffled rows from a few series
+def write_merged(tmpdir):
+    '''
+    Function to write two merged spot history csvs of shuffled rows
+    from a few zones, the second overlapping the first and both
+    repeating some timestamps at other prices
+
+    Parameters
+    ----------
+    tmpdir : py.path.local
+        the directory to write the csvs to
+
+    Returns
+    -------
+    csv_files : list
+        the filepaths of the merged csvs
+    merged_df : pandas.DataFrame
+        the rows of both csvs, as read back in file order
+    '''
+
+    # Init variables
+    rand_state = np.random.RandomState(0)
+    history_dfs = []
+
+    # Gather a few series
+    for seed, av_zone in enumerate(['us-east-1a', 'us-east-1b',
+                                    'eu-west-1a']):
+        history_df = write_history(str(tmpdir.join('%s.csv' % av_zone)),
+                                   2, seed)
+        history_df['Availability zone'] = av_zone
+        history_dfs.append(history_df)
+
+    # Shuffle them together and repeat some timestamps
+    merged_df = pd.concat(history_dfs, ignore_index=True)
+    merged_df = merged_df.iloc[rand_state.permutation(len(merged_df))]
+    repeat_df = merged_df.iloc[:50].copy()
+    repeat_df['Spot price'] += 1.0
+    merged_df = pd.concat([merged_df, repeat_df], ignore_index=True)
+
+    # Write the rows across two overlapping csvs
+    csv_files = [str(tmpdir.join('merged_a.csv')),
+                 str(tmpdir.join('merged_b.csv'))]
+    merged_df.iloc[:len(merged_df)*2//3].to_csv(csv_files[0])
+    merged_df.iloc[len(merged_df)//3:].to_csv(csv_files[1])
+    merged_df = pd.concat([pd.read_csv(csv_file) for csv_file in csv_files],
+                          ignore_index=True)
+
+    # Return the csvs and their rows
+    return csv_files, merged_df
+
+
+# Test the store against pandas
+@pytest.mark.parametrize('num_cores, chunksize', [(1, 500000), (1, 97),
+                                                  (2, 1), (3, 97)])
+def test_matches_pandas(tmpdir, num_cores, chunksize):
+    '''
+    Test that each stored series holds the first price recorded at each
+    timestamp of its rows, sorted by time, whatever the chunks, and that
+    no chunk stores are left in the store
+    '''
+
+    # Init variables
+    csv_files, merged_df = write_merged(tmpdir)
+    store_dir = tmpdir.join('store')
+    merged_df['epoch_secs'] = \
+        parse_timestamps(merged_df['Timestamp'].values).asi8 // 10**9
+
+    # Build the store
+    build_store(csv_files, str(store_dir), num_cores, chunksize)
+
+    # Check each series
+    for av_zone, zone_df in merged_df.groupby('Availability zone'):
+        zone_df = zone_df.drop_duplicates('epoch_secs')
+        zone_df = zone_df.sort_values('epoch_secs')
+        change_times, change_prices = \
+            read_series(str(store_dir), PARAMS['instance_type'],
+                        PARAMS['product'], av_zone)
+        np.testing.assert_array_equal(change_times, zone_df['epoch_secs'])
+        np.testing.assert_array_equal(change_prices, zone_df['Spot price'])
+
+    # Only the series are left
+    assert [path.basename for path in store_dir.listdir()] == \
+           [PARAMS['instance_type']]
@@ -0,0 +1,106 @@
+# test_utils.py
+
+'''
+This module tests the parallel task runner of utils, including tasks
+that raise, whose worker process dies, or that run past the timeout
+'''
+
+# Import packages
+import os
+import time
+
+# Relative imports
+from utils import run_in_parallel
+
+
+# Task that squares its argument
+def square_task(value):
+    '''
+    Task function returning the square of its argument
+    '''
+
+    # Return the square
+    return value**2
+
+
+# Task that raises
+def raise_task(value):
+    '''
+    Task function that always raises
+    '''
+
+    # Raise an exception
+    raise Exception('Task %d failed' % value)
+
+
+# Task whose worker process dies
+def exit_task(value):
+    '''
+    Task function that kills its worker process without returning, like
+    being killed for running out of memory
+    '''
+
+    # Exit the worker process
+    os._exit(value)
+
+
+# Task that runs too long
+def sleep_task(value):
+    '''
+    Task function that sleeps for a number of seconds
+    '''
+
+    # Sleep
+    time.sleep(value)
+
+
+# Test the results are returned in task order
+def test_results_in_order():
+    '''
+    Test that run_in_parallel returns every task's result in task order
+    '''
+
+    # Run the tasks
+    task_list = [(square_task, (value,)) for value in range(6)]
+    results, errors = run_in_parallel(task_list, 3)
+
+    # Check the results
+    assert results == [value**2 for value in range(6)]
+    assert errors == {}
+
+
+# Test failed tasks are reported instead of hanging
+def test_failed_tasks():
+    '''
+    Test that tasks that raise or whose worker dies are retried, then
+    reported as errors without holding up the other tasks
+    '''
+
+    # Run the tasks
+    task_list = [(square_task, (2,)), (raise_task, (1,)), (exit_task, (3,))]
+    results, errors = run_in_parallel(task_list, 3, max_retries=1)
+
+    # Check the results and errors
+    assert results == [4, None, None]
+    assert sorted(errors) == [1, 2]
+    assert 'Task 1 failed' in errors[1]
+    assert 'exited before returning' in errors[2]
+
+
+# Test tasks running past the timeout are killed
+def test_task_timeout():
+    '''
+    Test that a task running past the timeout is killed and reported as
+    an error
+    '''
+
+    # Run the tasks
+    task_list = [(sleep_task, (30,)), (square_task, (3,))]
+    start_time = time.time()
+    results, errors = run_in_parallel(task_list, 2, max_retries=0,
+                                      task_timeout=1.0)
+
+    # Check the results and errors
+    assert results == [None, 9]
+    assert 'Timed out' in errors[0]
+    assert time.time() - start_time < 30
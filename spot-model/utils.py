@@ -7,66 +7,209 @@ This module contains various utilities for the modules and scripts in
 this folder or package
 '''
 
+# Look up the cluster size limit of an availability zone
+def zone_max_nodes(config_dict, av_zone):
+    '''
+    Function to get the most nodes a configuration may run on in an
+    availability zone, from the optional 'max_nodes' entry of the spot
+    model configuration
+
+    Parameters
+    ----------
+    config_dict : dictionary
+        the spot model configuration; its 'max_nodes' may be a single
+        integer for every zone, or map availability zones or regions
+        (and optionally 'default') to integers
+    av_zone : string
+        the AWS EC2 availability zone (sub-region) to get the limit of
+
+    Returns
+    -------
+    max_nodes : integer
+        the most nodes to run on in the zone; 20 if not configured
+    '''
+
+    # Init variables
+    limits = config_dict.get('max_nodes', 20)
+
+    # A single limit applies to every zone
+    if not isinstance(limits, dict):
+        return int(limits)
+
+    # Otherwise look up the zone, then its region, then the default
+    for key in [av_zone, av_zone[:-1], 'default']:
+        if key in limits:
+            return int(limits[key])
+
+    # Return the default limit
+    return 20
+
+
+# Look up the cluster size asked for in an availability zone
+def zone_num_nodes(config_dict, av_zone):
+    '''
+    Function to get the number of nodes a configuration asks to run on
+    in an availability zone, from the optional 'num_nodes' entry of the
+    spot model configuration
+
+    Parameters
+    ----------
+    config_dict : dictionary
+        the spot model configuration; its 'num_nodes' may be a single
+        integer for every zone, or map availability zones or regions
+        (and optionally 'default') to integers
+    av_zone : string
+        the AWS EC2 availability zone (sub-region) to get the size of
+
+    Returns
+    -------
+    num_nodes : integer or None
+        the nodes to run on in the zone; None if not configured, to run
+        on as many as are needed up to the zone's limit
+    '''
+
+    # Init variables
+    sizes = config_dict.get('num_nodes')
+
+    # A single size applies to every zone
+    if sizes is None or not isinstance(sizes, dict):
+        return None if sizes is None else int(sizes)
+
+    # Otherwise look up the zone, then its region, then the default
+    for key in [av_zone, av_zone[:-1], 'default']:
+        if key in sizes:
+            return int(sizes[key])
+
+    # Return no size
+    return None
+
+
+# Get the number of nodes a configuration runs on
+def cluster_size(num_jobs, jobs_per, max_nodes=20, num_nodes=None):
+    '''
+    Function to get the number of nodes to run a job submission on; no
+    more nodes are used than it takes to run every job at once
+
+    Parameters
+    ----------
+    num_jobs : integer or numpy.ndarray
+        total number of jobs to run to complete job submission
+    jobs_per : integer or numpy.ndarray
+        the number of jobs to run per node
+    max_nodes : integer or numpy.ndarray (optional), default=20
+        the most nodes that may be run at once
+    num_nodes : integer or numpy.ndarray (optional), default=None
+        the number of nodes asked for; as many as are needed, up to
+        max_nodes, if None
+
+    Returns
+    -------
+    num_nodes : float or numpy.ndarray
+        the number of nodes the submission runs on
+    '''
+
+    # Import packages
+    import numpy as np
+
+    # Init variables
+    nodes_needed = np.ceil(np.asarray(num_jobs, dtype='float64')/jobs_per)
+
+    # Use as many nodes as are needed, within the limit
+    if num_nodes is None:
+        return np.minimum(nodes_needed, max_nodes)
+
+    # Or the nodes asked for, if the limit allows
+    if np.any(np.asarray(num_nodes) > max_nodes):
+        err_msg = 'Asked for %s nodes, but at most %s may run at once' % \
+                  (num_nodes, max_nodes)
+        raise Exception(err_msg)
+    if np.any(np.asarray(num_nodes) < 1):
+        err_msg = 'Asked for %s nodes, at least 1 must run' % num_nodes
+        raise Exception(err_msg)
+
+    # Return the number of nodes
+    return np.minimum(nodes_needed, np.asarray(num_nodes, dtype='float64'))
+
+
 # Apply simulation dataframe
-def apply_cost_model(sim_df_row):
+def apply_cost_model(sim_df, catalog=None):
     '''
-    Apply cost model to the simulation results dataframe by row
+    Apply cost model to the simulation results dataframe; the whole
+    dataframe is costed at once with the vectorized S3 cost model
 
     Parameters
     ----------
-    sim_df_row : pandas.Series
-        dataframe row from AWS simulation result dataframe
+    sim_df : pandas.DataFrame or pandas.Series
+        AWS simulation result dataframe, or a single row of it (as when
+        called through DataFrame.apply)
+    catalog : dictionary (optional), default=None
+        the pricing catalog from pricing_catalog.load_catalog; the
+        default catalog is used if not specified
 
     Returns
     -------
-    stat_series : pandas.Series
-        dataframe series with the configuration, simulation run, and
-        costs
+    stat_df : pandas.DataFrame or pandas.Series
+        dataframe with the configuration, simulation run, and costs;
+        a series is returned if a single row was given
     '''
 
     # Import packages
     import numpy as np
     import pandas as pd
-    from spot_price_model import calc_s3_model_costs
+    from spot_price_model import calc_s3_model_costs_batch
+
+    # Cost a single row as a one-row dataframe
+    is_row = isinstance(sim_df, pd.Series)
+    if is_row:
+        sim_df = sim_df.to_frame().T
 
     # Init variables
-    run_time = sim_df_row['compute_time']
-    wait_time = sim_df_row['wait_time']
-    node_cost = sim_df_row['per_node_cost']
-    first_iter_time = sim_df_row['first_iter_time']
-    num_jobs = sim_df_row['num_datasets']
-    jobs_per = sim_df_row['jobs_per_node']
-    num_nodes = min(np.ceil(float(num_jobs)/jobs_per), 20)
-    av_zone = sim_df_row['av_zone']
-    in_gb = sim_df_row['in_gb']
-    out_gb = sim_df_row['out_gb']
-    up_rate = sim_df_row['up_rate']
-    down_rate = sim_df_row['down_rate']
+    run_time = sim_df['compute_time'].values.astype('float64')
+    wait_time = sim_df['wait_time'].values.astype('float64')
+    node_cost = sim_df['per_node_cost'].values.astype('float64')
+    first_iter_time = sim_df['first_iter_time'].values.astype('float64')
+    num_jobs = sim_df['num_datasets'].values.astype('float64')
+    jobs_per = sim_df['jobs_per_node'].values.astype('float64')
+    # Results from before cluster sizes were configurable used up to 20
+    if 'num_nodes' in sim_df.columns:
+        num_nodes = sim_df['num_nodes'].values.astype('float64')
+    else:
+        num_nodes = cluster_size(num_jobs, jobs_per)
+    av_zone = sim_df['av_zone'].values
+    in_gb = sim_df['in_gb'].values.astype('float64')
+    out_gb = sim_df['out_gb'].values.astype('float64')
+    up_rate = sim_df['up_rate'].values.astype('float64')
+    down_rate = sim_df['down_rate'].values.astype('float64')
+    # Price each simulation with the AWS prices in effect at its start
+    price_time = pd.to_datetime(sim_df['start_time']).values.\
+                 astype('datetime64[s]').astype('int64')
 
     # Grab costs from s3 model
     total_cost, instance_cost, ebs_storage_cost, s3_cost, \
     s3_storage_cost, s3_req_cost, s3_xfer_cost, \
     total_time, run_time, wait_time, \
     xfer_up_time, s3_upl_time, s3_download_time = \
-        calc_s3_model_costs(run_time, wait_time, node_cost, first_iter_time,
-                             num_jobs, num_nodes, jobs_per, av_zone,
-                             in_gb, out_gb, up_rate, down_rate)
+        calc_s3_model_costs_batch(run_time, wait_time, node_cost,
+                                  first_iter_time, num_jobs, num_nodes,
+                                  jobs_per, av_zone, in_gb, out_gb,
+                                  up_rate, down_rate, price_time=price_time,
+                                  catalog=catalog)
 
     # Create dictionary
-    stat_dict = {'start_time' : sim_df_row['start_time'],
-                 'proc_time' : sim_df_row['proc_time'],
-                 'num_datasets' : num_jobs,
-                 'jobs_per_node' : jobs_per,
-                 'num_jobs_iter' : sim_df_row['num_jobs_iter'],
-                 'bid_ratio' : sim_df_row['bid_ratio'],
-                 'bid_price' : sim_df_row['bid_price'],
-                 'median_history' : sim_df_row['median_history'],
-                 'mean_history' : sim_df_row['mean_history'],
-                 'stdev_history' : sim_df_row['stdev_history'],
+    stat_dict = {'start_time' : sim_df['start_time'],
+                 'proc_time' : sim_df['proc_time'],
+                 'num_datasets' : sim_df['num_datasets'],
+                 'jobs_per_node' : sim_df['jobs_per_node'],
+                 'num_jobs_iter' : sim_df['num_jobs_iter'],
+                 'bid_ratio' : sim_df['bid_ratio'],
+                 'bid_price' : sim_df['bid_price'],
+                 'median_history' : sim_df['median_history'],
+                 'mean_history' : sim_df['mean_history'],
+                 'stdev_history' : sim_df['stdev_history'],
                  'run_time' : run_time,
                  'wait_time' : wait_time,
                  'per_node_cost' : node_cost,
-                 'num_interrupts' : sim_df_row['num_interrupts'],
+                 'num_interrupts' : sim_df['num_interrupts'],
                  'first_iter_time' : first_iter_time,
                  'num_nodes' : num_nodes,
                  'av_zone' : av_zone,
@@ -86,11 +229,14 @@ def apply_cost_model(sim_df_row):
                  's3_upl_time' : s3_upl_time,
                  's3_download_time' : s3_download_time}
 
-    # Convert dict to pandas Series
-    stat_series = pd.Series(stat_dict)
+    # Convert dict to pandas DataFrame
+    stat_df = pd.DataFrame(stat_dict, index=sim_df.index)
 
-    # Return new dataframe row
-    return stat_series
+    # Return the new dataframe, or row
+    if is_row:
+        return stat_df.iloc[0]
+    else:
+        return stat_df
 
 
 # Add comfig columns to simulation dataframe
@@ -160,132 +306,6 @@ def add_config_columns(sim_df_csv, cfg_yaml, out_dir):
     return new_df
 
 
-# Build data frame
-def build_big_df(av_zone_dir):
-    '''
-    Function to parse and merge the simulation results from the
-    *_sim and *_stats files into one big data frame based on the
-    availability zone directory provided; it saves this to a csv
-
-    Parameters
-    ----------
-    av_zone_dir : string
-        file path to the directory containing the simulation results
-
-    Returns
-    -------
-    big_df : pandas.DatFrame object
-        a merged dataframe with all of the stats for the simulation
-    '''
-
-    # Import packages
-    from spot_price_model import spothistory_from_dataframe
-    import glob
-    import numpy as np
-    import os
-    import pandas as pd
-
-    # Init variables
-    df_list = []
-    av_zone = av_zone_dir.split('/')[-1]
-    csvs = glob.glob(os.path.join(av_zone_dir, '*_stats.csv'))
-
-    # Print av zone of interest being created
-    print av_zone
-    spot_history = spothistory_from_dataframe('spot_history/merged_dfs.csv', 'c3.8xlarge', 'Linux/UNIX', av_zone)
-
-    # Iterate through csvs
-    for stat_csv in csvs:
-        # Get pattern to find sim dataframe
-        csv_pattern = stat_csv.split('_stats.csv')[0]
-        sim_csv = csv_pattern + '_sim.csv'
-        stat_df = pd.DataFrame.from_csv(stat_csv)
-        sim_df = pd.DataFrame.from_csv(sim_csv)
-
-        # Extract params from filename
-        fp_split = csv_pattern.split('-jobs')
-        bid_ratio = float(fp_split[1][1:].split('-bid')[0])
-        bid_price = bid_ratio*spot_history.mean()
-
-        ### Download time fix ###
-        # *Note the CPAC, ANTs, and Freesurfer csv outputs need this
-        # CPAC pipeline params
-        jobs_per = 3
-        down_rate = 20
-        out_gb_dl = 2.3
-        down_gb_per_sec = down_rate/8.0/1024.0
-        # Variables for download time fix
-        num_ds = int(fp_split[0].split('/')[-1].split('_')[-1])
-        num_nodes = min(np.ceil(float(num_ds)/jobs_per), 20)
-        num_iter = np.ceil(num_ds/float((jobs_per*num_nodes)))
-        num_jobs_n1 = ((num_iter-1)*num_nodes*jobs_per)
-        res_xfer_out = (num_ds-num_jobs_n1)*(out_gb_dl/down_gb_per_sec)
-        # Fix download time
-        #stat_df['Download time'] += res_xfer_out/60.0 
-
-        # Add to stat df
-        len_df = len(stat_df)
-        stat_df['Sim index'] = sim_df.index
-        stat_df['Av zone'] = pd.Series([av_zone]*len_df, index=stat_df.index)
-        stat_df['Bid ratio'] = pd.Series([bid_ratio]*len_df, index=stat_df.index)
-        stat_df['Bid price'] = pd.Series([bid_price]*len_df, index=stat_df.index)
-        stat_df['Num datasets'] = pd.Series([num_ds]*len_df, index=stat_df.index)
-        stat_df['Start time'] = sim_df['Start time']
-        stat_df['Interrupts'] = sim_df['Interrupts']
-        stat_df['First Iter Time'] = sim_df['First Iter Time']
-
-        # Add to dataframe list
-        df_list.append(stat_df)
-
-    # Status update
-    print 'done making df list, now concat to big df...'
-    big_df = pd.concat(df_list, ignore_index=True)
-
-    # Write to disk as csv
-    print 'Saving to disk...'
-    big_df.to_csv('./%s.csv' % av_zone)
-    print 'done writing!'
-
-    # Return dataframe
-    return big_df
-
-
-# Build list of processes to use in multi-proc
-def build_proc_list(zones_basedir):
-    '''
-    Function to build a list of build_big_df processes from a directory
-    of availability zones folders
-
-    Parameters
-    ----------
-    zones_basedir : string
-        base directory where the availability zone folders are residing
-
-    Returns
-    -------
-    proc_list : list
-        a list of multiprocessing.Process objects to run the
-        build_big_df function
-    '''
-
-    # Import packages
-    import glob
-    import os
-    import pandas as pd
-    from multiprocessing import Process
-
-    # Init variables
-    av_zone_fp = os.path.join(zones_basedir, '*')
-    av_zones_dirs = glob.glob(av_zone_fp)
-
-    # Build big dictionary
-    proc_list = [Process(target=build_big_df, args=(av_zone_dir,)) \
-                 for av_zone_dir in av_zones_dirs]
-
-    # Return the process list
-    return proc_list
-
-
 # Convert spot history list to dataframe csv
 def pklz_to_df(out_dir, pklz_file):
     '''
@@ -351,53 +371,267 @@ def pklz_to_df(out_dir, pklz_file):
     merged_df.to_csv(out_csv)
 
 
+# The queue pool workers report the tasks they start on, set per worker
+_start_queue = None
+
+
+# Set up a pool worker
+def init_worker(start_queue):
+    '''
+    Function to give a run_in_parallel pool worker the queue to report
+    the tasks it starts on
+
+    Parameters
+    ----------
+    start_queue : multiprocessing.queues.SimpleQueue
+        the queue to put a (task index, attempt, process id) tuple on as
+        each task starts; it is written straight to the pipe, so the
+        message gets through even if the worker dies right after
+
+    Returns
+    -------
+    None
+        the queue is kept for run_task
+    '''
+
+    # Keep the queue for this process
+    global _start_queue
+    _start_queue = start_queue
+
+
+# Run one task and capture its result or error
+def run_task(task_func, task_args, return_result=True, task_id=None):
+    '''
+    Function to call a task's function in a worker process, catching
+    any exception so it can be reported back to run_in_parallel
+
+    Parameters
+    ----------
+    task_func : function
+        the (module-level) function to run
+    task_args : tuple
+        the positional arguments to call task_func with
+    return_result : boolean (optional), default=True
+        flag to send the return value of task_func back; if False, None
+        is returned in its place
+    task_id : tuple (optional), default=None
+        the (task index, attempt) to report on the worker's start queue
+        before running, so the parent can tell if the worker dies
+
+    Returns
+    -------
+    result : object
+        the return value of task_func, or None if it raised
+    err_msg : string
+        the formatted traceback if task_func raised, otherwise None
+    '''
+
+    # Import packages
+    import os
+    import traceback
+
+    # Report which process is running the task
+    if task_id is not None and _start_queue is not None:
+        _start_queue.put(tuple(task_id) + (os.getpid(),))
+
+    # Run the task
+    try:
+        result = task_func(*task_args)
+    except Exception:
+        return None, traceback.format_exc()
+
+    # Return the result
+    if return_result:
+        return result, None
+    else:
+        return None, None
+
+
+# Check whether a process is still running
+def process_alive(pid):
+    '''
+    Function to check whether a process id is still running
+
+    Parameters
+    ----------
+    pid : integer
+        the process id to check
+
+    Returns
+    -------
+    alive : boolean
+        True if the process exists
+    '''
+
+    # Import packages
+    import errno
+    import os
+
+    # Signal 0 only checks the process exists
+    try:
+        os.kill(pid, 0)
+    except OSError as exc:
+        return exc.errno == errno.EPERM
+
+    # Return that it is running
+    return True
+
+
 # Run jobs in parallel
-def run_in_parallel(proc_list, num_cores):
+def run_in_parallel(task_list, num_cores, max_retries=1,
+                    collect_results=True, task_timeout=None):
     '''
-    Function to kick off a list of processes in parallel, guaranteeing
-    that a fixed number of cores or less is running at all times
+    Function to run a list of tasks in parallel on a fixed number of
+    cores; the next task starts as soon as a core frees up, failed
+    tasks are retried up to max_retries times, and a summary is printed
+    once every task has finished. A task whose worker process dies
+    (e.g. killed for running out of memory) or that runs past the
+    timeout counts as a failed attempt instead of waiting forever
 
     Parameters
     ----------
-    proc_list : list
-        a list of multiprocessing.Process objects
+    task_list : list
+        a list of (function, args) tuples, where function is a
+        module-level function and args is its tuple of arguments
     num_cores : integer
         the number of cores or processes to run at once
+    max_retries : integer (optional), default=1
+        the number of times to re-run a task that failed
+    collect_results : boolean (optional), default=True
+        flag to send each task's return value back from its worker; set
+        to False for tasks that save their outputs to disk
+    task_timeout : float (optional), default=None
+        the most seconds an attempt may run before its worker is killed
+        and the attempt failed; no limit if None
 
     Returns
     -------
-    None
-        there is no return value for this function
+    results : list
+        the return value of each task, in task_list order; None for
+        tasks that failed every attempt or if collect_results is False
+    errors : dictionary
+        maps the index of each task that failed every attempt to the
+        traceback or reason of its last attempt
     '''
 
     # Import packages
+    import os
+    import signal
     import time
+    from multiprocessing import Pool
+    from multiprocessing.queues import SimpleQueue
 
     # Init variables
-    idx = 0
-    job_queue = []
-
-    # While loop for when jobs are still running
-    while idx < len(proc_list):
-        if len(job_queue) == 0 and idx == 0:
-            idc = idx
-            for p in proc_list[idc:idc+num_cores]:
-                p.start()
-                job_queue.append(p)
-                idx += 1
-        else:
-            for job in job_queue:
-                if not job.is_alive():
-                    print 'found dead job', job
-                    loc = job_queue.index(job)
-                    del job_queue[loc]
-                    if idx < len(proc_list):
-                        proc_list[idx].start()
-                    else:
-                        break
-                    job_queue.append(proc_list[idx])
-                    idx += 1
-            time.sleep(2)
+    num_tasks = len(task_list)
+    results = [None]*num_tasks
+    errors = {}
+    attempts = [0]*num_tasks
+    handles = {}
+    workers = {}
+    dead_since = {}
+    num_lost = 0
+    # Seconds to wait for the result of a worker found dead, in case it
+    # exited right after sending it
+    grace_secs = 5.0
+    start_queue = SimpleQueue()
+    # A fresh process per task, like running each one as a Process
+    pool = Pool(processes=max(num_cores, 1), maxtasksperchild=1,
+                initializer=init_worker, initargs=(start_queue,))
+
+    # Submit a task, keeping its result handle to poll
+    def submit(task_idx):
+        task_func, task_args = task_list[task_idx]
+        attempts[task_idx] += 1
+        workers.pop(task_idx, None)
+        dead_since.pop(task_idx, None)
+        handles[task_idx] = \
+            pool.apply_async(run_task,
+                             (task_func, task_args, collect_results,
+                              (task_idx, attempts[task_idx])))
+
+    # Queue every task up front; the pool starts each as a core frees up
+    for task_idx in range(num_tasks):
+        submit(task_idx)
+
+    # Handle each task as it finishes
+    while handles:
+        # Note the worker process and start time of each started task
+        while not start_queue.empty():
+            task_idx, attempt, pid = start_queue.get()
+            if task_idx in handles and attempt == attempts[task_idx]:
+                workers[task_idx] = (pid, time.time())
+
+        # Check on every unfinished task
+        num_finished = 0
+        for task_idx in sorted(handles):
+            handle = handles[task_idx]
+            err_msg = None
+            if handle.ready():
+                try:
+                    result, err_msg = handle.get()
+                except Exception as exc:
+                    result = None
+                    err_msg = 'Could not return the result: %s' % exc
+            elif task_idx in workers:
+                pid, start_time = workers[task_idx]
+                now = time.time()
+                if task_timeout is not None and \
+                   now - start_time > task_timeout:
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except OSError:
+                        pass
+                    err_msg = 'Timed out after %.1f seconds' % task_timeout
+                elif process_alive(pid):
+                    continue
+                elif now - dead_since.setdefault(task_idx, now) < grace_secs:
+                    continue
+                else:
+                    err_msg = 'Worker process %d exited before returning ' \
+                              'a result' % pid
+                num_lost += 1
+            else:
+                continue
+
+            # Record the result, or retry or give up on the task
+            num_finished += 1
+            del handles[task_idx]
+            task_name = getattr(task_list[task_idx][0], '__name__', 'task')
+            if err_msg is None:
+                results[task_idx] = result
+                errors.pop(task_idx, None)
+            elif attempts[task_idx] <= max_retries:
+                print 'Task %d (%s) failed on attempt %d, retrying...\n%s' % \
+                      (task_idx, task_name, attempts[task_idx], err_msg)
+                submit(task_idx)
+            else:
+                print 'Task %d (%s) failed on attempt %d, giving up\n%s' % \
+                      (task_idx, task_name, attempts[task_idx], err_msg)
+                errors[task_idx] = err_msg
+
+        # Wait a little before polling again
+        if not num_finished:
+            time.sleep(0.1)
+
+    # Shut down the pool; lost tasks never report back, so the pool's
+    # result handler would wait on them forever if closed normally
+    if num_lost:
+        pool.terminate()
+    else:
+        pool.close()
+    pool.join()
+
+    # Print a summary
+    num_retried = sum(1 for num_attempts in attempts if num_attempts > 1)
+    print 'Finished %d tasks: %d succeeded, %d failed, %d needed retries' % \
+          (num_tasks, num_tasks-len(errors), len(errors), num_retried)
+    for task_idx in sorted(errors):
+        print 'Failed task %d: %s%s' % \
+              (task_idx, getattr(task_list[task_idx][0], '__name__', 'task'),
+               str(task_list[task_idx][1]))
+
+    # Return the results and errors
+    return results, errors
 
 
 # Print status of file progression in loop
@@ -453,6 +687,11 @@ def setup_logger(logger_name, log_file, level, to_screen=False):
     # Init logger, formatter, filehandler, streamhandler
     logger = logging.getLogger(logger_name)
     logger.setLevel(level)
+
+    # Remove handlers from any previous setup in this process
+    for handler in list(logger.handlers):
+        handler.close()
+        logger.removeHandler(handler)
     formatter = logging.Formatter('%(asctime)s : %(message)s')
 
     # Write logs to file
@@ -468,20 +707,3 @@ def setup_logger(logger_name, log_file, level, to_screen=False):
 
     # Return the logger
     return logger
-
-
-# Make executable
-if __name__ == '__main__':
-
-    # Import packages
-    import sys
-
-    # Grab az_zone folders base
-    zones_basedir = str(sys.argv[1])
-
-    # Call main
-    proc_list = build_proc_list(zones_basedir)
-
-    #build_big_df('~/Documents/projects/Clark2015_AWS/spot-model/out/us-east-1a')
-    # Run in parallel
-    run_in_parallel(proc_list, 6)